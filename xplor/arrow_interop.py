@@ -0,0 +1,494 @@
+"""arrow_interop module is a module to exchange data with Apache Arrow without
+copying it.
+
+The pipelines that acquire or preprocess the data often give Arrow arrays.
+Going through pandas DataFrames to build the headers copies the values, and
+checks them one by one. This module converts:
+    - a Xdata to an Arrow tensor (the data, with the labels of the dimensions)
+      or to an Arrow record batch (one row per element of the first
+      dimension, with the columns of its header and a column of the data),
+      and back,
+    - a CategoricalHeader to an Arrow record batch (one Arrow array per
+      column), and back.
+
+The numeric arrays share their buffers with the numpy arrays (the data of a
+Xdata read from Arrow is read-only, the changes giving new instances as
+usual). The numeric columns of a header are shared from pandas 1.5: the
+older versions gather the columns of a DataFrame in blocks, which copies
+them. The string columns are dictionary arrays: their codes are the ones of
+the hash index of the column (module column_index), and a header read from a
+dictionary array gets its hash index from the codes, each distinct string
+being converted once. The DimensionDescription of each column, the
+MeasureHeaders (start, scale, unit) and the other headers of a Xdata are
+stored in the metadata of the schema.
+
+pyarrow is optional: it is only needed by the functions of this module.
+
+
+This module uses:
+    - json
+    - numpy as np
+    - pandas as pd
+    - pyarrow as pa (optional)
+
+    - column_index
+    - xdata
+
+
+There are 6 functions in this module:
+
+    - **header_to_arrow**:
+        gives the record batch of the columns of a categorical header
+    - **header_from_arrow**:
+        gives the categorical header whose columns are the arrays of a record
+        batch
+    - **xdata_to_arrow**:
+        gives the record batch of a Xdata
+    - **xdata_from_arrow**:
+        gives the Xdata of a record batch
+    - **xdata_to_tensor**:
+        gives the Arrow tensor of the data of a Xdata
+    - **xdata_from_tensor**:
+        gives the Xdata of an Arrow tensor
+"""
+
+# Authors: Elodie Ikkache CNRS <elodie.ikkache@student.ecp.fr>
+#          Thomas Deneux CNRS <thomas.deneux@unic.cnrs-gif.fr>
+#
+# version 1.0
+# -*- coding: utf-8 -*-
+
+import json
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+import column_index
+import xdata
+
+
+# key of the xplor metadata, in the schema and in the fields
+_KEY = b'xplor'
+
+
+def _check_pyarrow():
+    if pa is None:
+        raise Exception("pyarrow must be installed to convert to and from "
+                        "Arrow")
+
+
+def _unit_list(descriptor):
+    """gives the unit of a DimensionDescription, as the list of the units and
+    their conversion values"""
+    if descriptor.all_units is None:
+        return None
+    unit = []
+    for conversion in descriptor.all_units:
+        unit += [conversion['unit'], conversion['value']]
+    return unit
+
+
+def _metadata(schema):
+    """gives the xplor metadata of a schema or a field (dict)"""
+    if schema.metadata is None or _KEY not in schema.metadata:
+        return {}
+    return json.loads(schema.metadata[_KEY])
+
+
+def _as_batch(batch):
+    """gives a record batch from a record batch or a table"""
+    if isinstance(batch, pa.Table):
+        return pa.RecordBatch.from_arrays(
+            [column.combine_chunks() for column in batch.columns],
+            schema=batch.schema)
+    elif not isinstance(batch, pa.RecordBatch):
+        raise Exception("batch must be of type pyarrow.RecordBatch or "
+                        "pyarrow.Table")
+    return batch
+
+
+def _column_to_arrow(header, j):
+    """gives the Arrow array of the column j of a categorical header"""
+    descriptor = header.column_descriptors[j]
+    kind = descriptor.dimension_type
+    values = header.values[j].values
+    if kind == 'numeric':
+        if values.dtype == object:
+            # ints and floats
+            values = values.astype(float)
+        return pa.array(values)
+    elif kind == 'logical':
+        return pa.array(values.astype(bool))
+    elif kind == 'string':
+        # the codes of the hash index are the indices of the dictionary
+        index = header.get_index(j, 'hash')
+        codes = index.codes
+        missing = codes < 0
+        indices = pa.array(codes, mask=missing if missing.any() else None)
+        return pa.DictionaryArray.from_arrays(
+            indices, pa.array(index.uniques, type=pa.string()))
+    elif kind == 'color':
+        rgb = np.array([color.rgb for color in values], dtype=np.uint8)
+        return pa.FixedSizeListArray.from_arrays(pa.array(rgb.reshape(-1)),
+                                                 3)
+    try:
+        # e.g. strings with missing values
+        return pa.array(values, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        raise Exception("the values of the 'mixed' column " +
+                        descriptor.label + " can't be converted to Arrow")
+
+
+def _infer_type(arrow_type):
+    """gives the dimension_type of the values of an Arrow array"""
+    if pa.types.is_dictionary(arrow_type):
+        arrow_type = arrow_type.value_type
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return 'string'
+    elif pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type):
+        return 'numeric'
+    elif pa.types.is_boolean(arrow_type):
+        return 'logical'
+    elif pa.types.is_fixed_size_list(arrow_type) and \
+            arrow_type.list_size == 3 and \
+            pa.types.is_integer(arrow_type.value_type):
+        return 'color'
+    return 'mixed'
+
+
+def _column_from_arrow(array, field):
+    """gives the DimensionDescription, the values (numpy array) and the hash
+    index (or None) of the column of an Arrow array"""
+    description = _metadata(field)
+    if description:
+        unit = description['unit']
+        descriptor = xdata.DimensionDescription(
+            field.name, description['type'], unit,
+            None if description['calibration'] is None
+            else tuple(description['calibration']))
+    else:
+        descriptor = xdata.DimensionDescription(field.name,
+                                                _infer_type(array.type))
+    kind = descriptor.dimension_type
+    if kind == 'string':
+        if not pa.types.is_dictionary(array.type):
+            array = array.dictionary_encode()
+        # each distinct string is converted once
+        uniques = array.dictionary.to_numpy(zero_copy_only=False)
+        codes = array.indices.fill_null(-1).to_numpy(
+            zero_copy_only=False).astype(np.int64)
+        values = np.append(uniques, None)[codes]
+        code_of = {value: code for code, value in enumerate(uniques)}
+        index = None
+        if len(code_of) == len(uniques):
+            index = column_index.HashIndex._from_codes(codes, code_of)
+        return descriptor, values, index
+    elif kind == 'numeric':
+        # a view of the buffer of the array if there are no missing values
+        values = array.to_numpy(zero_copy_only=False)
+        if values.dtype not in (np.int64, np.float64):
+            values = values.astype(np.float64 if values.dtype.kind == 'f'
+                                   else np.int64)
+        return descriptor, values, None
+    values = np.empty(len(array), dtype=object)
+    if kind == 'color':
+        values[:] = [None if rgb is None else xdata.Color(rgb)
+                     for rgb in array.to_pylist()]
+    else:
+        values[:] = array.to_pylist()
+    return descriptor, values, None
+
+
+def _header_from_columns(label, arrays, fields):
+    """gives the categorical header of Arrow arrays"""
+    descriptors = []
+    columns = {}
+    indexes = {}
+    for j, (array, field) in enumerate(zip(arrays, fields)):
+        descriptor, values, index = _column_from_arrow(array, field)
+        descriptors.append(descriptor)
+        columns[j] = values
+        if index is not None:
+            indexes[(j, 'hash')] = index
+    # with copy=False, pandas 1.5 and later keep the arrays of the columns
+    # apart, so that the DataFrame shares them (the older versions
+    # consolidate the columns of the same type into a block, a copy)
+    values = pd.DataFrame(columns, copy=False)
+    return xdata.CategoricalHeader._from_columns(label, descriptors, values,
+                                                 indexes)
+
+
+def _header_fields(header):
+    """gives the Arrow arrays and fields of the columns of a header"""
+    arrays = []
+    fields = []
+    for j, descriptor in enumerate(header.column_descriptors):
+        array = _column_to_arrow(header, j)
+        description = {'type': descriptor.dimension_type,
+                       'unit': _unit_list(descriptor),
+                       'calibration': descriptor.calibration}
+        arrays.append(array)
+        fields.append(pa.field(descriptor.label, array.type,
+                               metadata={_KEY: json.dumps(description)}))
+    return arrays, fields
+
+
+def header_to_arrow(header):
+    """gives the record batch of the columns of a categorical header
+
+    **Parameters**
+
+    - header:
+        header to convert (type xdata.CategoricalHeader)
+
+    **returns**
+    pyarrow.RecordBatch with one array per column (dictionary arrays for the
+    'string' columns), the label of the header and the DimensionDescriptions
+    of the columns being in the metadata
+    """
+    _check_pyarrow()
+    if not isinstance(header, xdata.CategoricalHeader):
+        raise Exception("header must be of type CategoricalHeader")
+    arrays, fields = _header_fields(header)
+    schema = pa.schema(fields, metadata={_KEY: json.dumps(
+        {'label': header.label, 'n_elem': header.n_elem})})
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def header_from_arrow(batch, label=None):
+    """gives the categorical header whose columns are the arrays of a record
+    batch
+
+    **Parameters**
+
+    - batch:
+        columns of the header (type pyarrow.RecordBatch or pyarrow.Table)
+    - label:
+        label of the header (type str)
+
+        (optional if batch was given by header_to_arrow)
+
+    **returns**
+    CategoricalHeader instance (the dimension_type of the columns is given by
+    the type of the arrays if batch was not given by header_to_arrow)
+    """
+    _check_pyarrow()
+    batch = _as_batch(batch)
+    metadata = _metadata(batch.schema)
+    if label is None:
+        label = metadata.get('label')
+    if not isinstance(label, str):
+        raise Exception("label must be of type str")
+    if batch.num_columns == 0:
+        return xdata.CategoricalHeader(
+            label, n_elem=metadata.get('n_elem', batch.num_rows))
+    return _header_from_columns(label, batch.columns, list(batch.schema))
+
+
+def _serialize(batch):
+    """gives the bytes of a record batch (Arrow IPC stream)"""
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def _deserialize(data):
+    return pa.ipc.open_stream(pa.py_buffer(data)).read_next_batch()
+
+
+def xdata_to_arrow(x):
+    """gives the record batch of a Xdata
+
+    **Parameters**
+
+    - x:
+        data to convert (type xdata.Xdata)
+
+    **returns**
+    pyarrow.RecordBatch with one row per element of the first dimension: the
+    columns of its header (if it is a categorical header with values) and a
+    last column, named as the data, with the data of the element (a fixed
+    size list if there are several dimensions). It shares the buffer of the
+    data if it is a C-contiguous numpy array. The other headers, the unit
+    and the calibration of the data are in the metadata.
+    """
+    _check_pyarrow()
+    if not isinstance(x, xdata.Xdata):
+        raise Exception("x must be of type Xdata")
+    data = x.contiguous_data()
+    values = pa.array(data.reshape(-1))
+    if data.ndim > 1:
+        values = pa.FixedSizeListArray.from_arrays(
+            values, int(np.prod(data.shape[1:])))
+    arrays = []
+    fields = []
+    metadata = {}
+    headers = []
+    for d, header in enumerate(x.headers):
+        if header.is_measure:
+            headers.append({'kind': 'measure', 'label': header.label,
+                            'start': header.start, 'scale': header.scale,
+                            'unit': _unit_list(header.column_descriptors[0])})
+            continue
+        headers.append({'kind': 'categorical', 'label': header.label})
+        if header.is_undifferentiated:
+            continue
+        elif d == 0:
+            arrays, fields = _header_fields(header)
+        else:
+            # the headers of the other dimensions have other lengths
+            metadata[_KEY + b'.header.%d' % d] = \
+                _serialize(header_to_arrow(header))
+    descriptor = x.data_descriptor
+    metadata[_KEY] = json.dumps(
+        {'name': x.name, 'shape': list(data.shape),
+         'unit': _unit_list(descriptor),
+         'calibration': descriptor.calibration, 'headers': headers})
+    arrays.append(values)
+    fields.append(pa.field(x.name, values.type))
+    return pa.RecordBatch.from_arrays(arrays,
+                                      schema=pa.schema(fields, metadata))
+
+
+def xdata_from_arrow(batch, name=None, unit=None):
+    """gives the Xdata of a record batch
+
+    **Parameters**
+
+    - batch:
+        record batch given by xdata_to_arrow, or any record batch whose last
+        column contains the data (numbers or fixed size lists of numbers) and
+        the other columns the values of the elements of the first dimension
+        (type pyarrow.RecordBatch or pyarrow.Table)
+    - name:
+        name of the data (type str)
+
+        (optional, default value is the name of the last column)
+    - unit:
+        unit of the data (type str or list)
+
+        (optional, only used if batch was not given by xdata_to_arrow)
+
+    **returns**
+    Xdata instance whose data is a view of the buffer of the last column if
+    it has no missing values
+    """
+    _check_pyarrow()
+    batch = _as_batch(batch)
+    if batch.num_columns == 0:
+        raise Exception("batch must have a column with the data")
+    metadata = _metadata(batch.schema)
+    column = batch.column(batch.num_columns - 1)
+    if pa.types.is_fixed_size_list(column.type):
+        flat = column.flatten()
+        shape = [len(column), column.type.list_size]
+    else:
+        flat = column
+        shape = [len(column)]
+    if not (pa.types.is_integer(flat.type) or
+            pa.types.is_floating(flat.type) or
+            pa.types.is_boolean(flat.type)):
+        raise Exception("the last column must contain the data (numbers or "
+                        "fixed size lists of numbers)")
+    data = flat.to_numpy(zero_copy_only=False)
+    if name is None:
+        name = metadata.get('name', batch.schema[-1].name)
+    calibration = None
+    if metadata:
+        shape = metadata['shape']
+        unit = metadata['unit']
+        if metadata['calibration'] is not None:
+            calibration = tuple(metadata['calibration'])
+        descriptions = metadata['headers']
+    else:
+        descriptions = [{'kind': 'categorical', 'label': 'lines'}]
+        if len(shape) == 2:
+            descriptions.append({'kind': 'categorical', 'label': 'values'})
+    data = data.reshape(shape)
+
+    headers = []
+    for d, description in enumerate(descriptions):
+        label = description['label']
+        serialized = _KEY + b'.header.%d' % d
+        if description['kind'] == 'measure':
+            headers.append(xdata.MeasureHeader(
+                label, description['start'], shape[d], description['scale'],
+                description['unit']))
+        elif d == 0 and batch.num_columns > 1:
+            headers.append(_header_from_columns(
+                label, batch.columns[:-1], list(batch.schema)[:-1]))
+        elif batch.schema.metadata is not None and \
+                serialized in batch.schema.metadata:
+            headers.append(header_from_arrow(
+                _deserialize(batch.schema.metadata[serialized])))
+        else:
+            headers.append(xdata.CategoricalHeader(label, n_elem=shape[d]))
+    return xdata.Xdata(name, data, headers, unit, calibration)
+
+
+def xdata_to_tensor(x):
+    """gives the Arrow tensor of the data of a Xdata
+
+    **Parameters**
+
+    - x:
+        data to convert (type xdata.Xdata)
+
+    **returns**
+    pyarrow.Tensor sharing the buffer of the data (the strides of the views,
+    e.g. after 'dim_perm', are kept), whose dim_names are the labels of the
+    headers
+    """
+    _check_pyarrow()
+    if not isinstance(x, xdata.Xdata):
+        raise Exception("x must be of type Xdata")
+    data = x.data
+    if x.is_sparse or any(stride < 0 for stride in data.strides):
+        data = x.contiguous_data()
+    return pa.Tensor.from_numpy(data,
+                                dim_names=[h.label for h in x.headers])
+
+
+def xdata_from_tensor(tensor, name, headers=None, unit=None,
+                      calibration=None):
+    """gives the Xdata of an Arrow tensor
+
+    **Parameters**
+
+    - tensor:
+        the data (type pyarrow.Tensor)
+    - name:
+        name of the data (type str)
+    - headers:
+        headers of the dimensions (type list of xdata.Header)
+
+        (optional, default value is undifferentiated categorical headers
+        labeled with the dim_names of the tensor)
+    - unit:
+        unit of the data (type str or list)
+
+        (optional)
+    - calibration:
+        pair (scale, offset) if the data is quantized, as for Xdata
+
+        (optional)
+
+    **returns**
+    Xdata instance whose data is a view of the buffer of the tensor
+    """
+    _check_pyarrow()
+    if not isinstance(tensor, pa.Tensor):
+        raise Exception("tensor must be of type pyarrow.Tensor")
+    data = tensor.to_numpy()
+    if headers is None:
+        dim_names = tensor.dim_names or [''] * data.ndim
+        headers = [xdata.CategoricalHeader(label or 'dimension %d' % d,
+                                           n_elem=data.shape[d])
+                   for d, label in enumerate(dim_names)]
+    return xdata.Xdata(name, data, headers, unit, calibration)
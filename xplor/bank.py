@@ -0,0 +1,286 @@
+"""bank module is a module to store previously used units, to save the user
+some time.
+
+The bank is a persistent local store of conversion tables. A few usual tables
+(time, length, mass, frequency, voltage, current) are always available, the
+tables added by the user are saved in a json file (by default
+~/.xplor/unit_bank.json, the location can be changed with the XPLOR_BANK
+environment variable).
+
+The tables are indexed by every unit symbol they contain, so that finding the
+table of a unit does not require to go through all the tables. The file is
+only read the first time a unit is looked for, so that importing xplor does
+not pay for it.
+
+
+This module uses:
+    - json
+    - math
+    - os
+    - operator
+
+
+There is 1 class in this module:
+
+    - **UnitBank**:
+        This class stores the conversion tables and the index from each unit
+        symbol to its table.
+
+There are 2 functions in this module:
+    - **get_unit_bank**:
+        get_unit_bank gives the UnitBank instance shared by the whole process
+        (it is created the first time it is needed).
+    - **default_bank_path**:
+        default_bank_path gives the location of the file of the shared bank.
+"""
+
+# Authors: Elodie Ikkache CNRS <elodie.ikkache@student.ecp.fr>
+#          Thomas Deneux CNRS <thomas.deneux@unic.cnrs-gif.fr>
+#
+# version 1.0
+# -*- coding: utf-8 -*-
+
+import json
+import math
+import os
+# itemgetter is used to sort a list of dictionaries
+from operator import itemgetter
+
+
+# conversion tables that are always in the bank, in the same form as the unit
+# argument of DimensionDescription
+DEFAULT_TABLES = [
+    ['us', 10**(-6), 'ms', 10**(-3), 's', 1, 'min', 60, 'hour', 3600,
+     'day', 86400],
+    ['nm', 10**(-9), 'um', 10**(-6), 'mm', 10**(-3), 'cm', 10**(-2), 'm', 1,
+     'km', 10**3],
+    ['mg', 10**(-3), 'g', 1, 'kg', 10**3],
+    ['Hz', 1, 'kHz', 10**3, 'MHz', 10**6],
+    ['uV', 10**(-6), 'mV', 10**(-3), 'V', 1],
+    ['pA', 10**(-12), 'nA', 10**(-9), 'uA', 10**(-6), 'mA', 10**(-3), 'A', 1],
+]
+
+
+class UnitBank:
+    """ Persistent store of the conversion tables.
+
+    A conversion table is a list of dictionaries {'unit': str, 'value':
+    float}, sorted by value, as the all_units attribute of a
+    DimensionDescription. Each unit symbol appears in at most one table: when
+    a new table shares symbols with tables of the bank, they are merged into
+    one table, rescaled through the shared units (e.g. adding ['inch',
+    0.0254, 'm', 1] adds the inch to the metric table). An exception is
+    raised if the conversion values of the shared units conflict.
+
+    **Parameters**
+
+    - path:
+        json file where the tables added by the user are stored
+
+        (type str)
+
+        (optional, default value is given by default_bank_path)
+
+    **Attributes**
+
+    - path:
+        json file where the tables added by the user are stored
+    - units:
+        list of all the unit symbols known by the bank
+
+    **Methods**
+
+    - get_table(unit):
+        gives the conversion table containing unit, rescaled so that the
+        value of unit is 1, or None if the unit is not in the bank
+    - add_table(unit):
+        adds a conversion table (list of symbols followed by conversion
+        coefficients, e.g. ['mm', 10**(-3), 'm', 1]) to the bank, merging it
+        with the tables sharing units with it, and saves it
+    - save:
+        writes the tables added by the user in the json file
+
+    *(static methods)*
+
+    - table_from_list(unit):
+        converts a list of symbols and conversion coefficients into a
+        conversion table
+
+    **Examples**
+
+     bank = UnitBank()
+
+     bank.get_table('ms')
+
+     bank.add_table(['inch', 0.0254, 'foot', 0.3048, 'm', 1])
+    """
+
+    def __init__(self, path=None):
+        """Constructor of the class UnitBank"""
+        if path is None:
+            path = default_bank_path()
+        elif not isinstance(path, str):
+            raise Exception("path must be of type str")
+        self._path = path
+        # tables and index are only built when a unit is looked for
+        self._tables = None
+        self._user_tables = None
+        self._index = None
+
+    @property
+    def path(self):
+        """json file where the tables added by the user are stored"""
+        return self._path
+
+    @property
+    def units(self):
+        """list of all the unit symbols known by the bank"""
+        self._load()
+        return list(self._index.keys())
+
+    def __contains__(self, unit):
+        self._load()
+        return unit in self._index
+
+    def _load(self):
+        """read the file and build the index, only the first time"""
+        if self._index is not None:
+            return
+        self._tables = []
+        self._user_tables = []
+        self._index = {}
+        for table in DEFAULT_TABLES:
+            self._insert(UnitBank.table_from_list(table))
+        if os.path.isfile(self._path):
+            try:
+                with open(self._path, 'r') as f:
+                    saved = json.load(f)
+            except (OSError, ValueError):
+                raise Exception("the unit bank file " + self._path +
+                                " could not be read")
+            for table in saved:
+                table = UnitBank.table_from_list(table)
+                self._insert(table)
+                self._user_tables.append(table)
+
+    def _insert(self, table):
+        """add a table to the index, merging it with the tables sharing a
+        unit with it"""
+        values = {d['unit']: d['value'] for d in table}
+        merged_nums = []
+        for d in table:
+            num = self._index.get(d['unit'])
+            if num is not None and num not in merged_nums:
+                merged_nums.append(num)
+        # the values of the merged table are in the scale of the first table
+        # of the bank sharing a unit with the new one, the other tables are
+        # rescaled through the units they share with the new one
+        merged = {}
+        reference = None
+        for num in merged_nums:
+            factor = None
+            for d in self._tables[num]:
+                if d['unit'] not in values:
+                    continue
+                ratio = d['value'] / values[d['unit']]
+                if factor is None:
+                    factor = ratio
+                elif not math.isclose(ratio, factor, rel_tol=1e-9):
+                    raise Exception("the conversion values of " + d['unit'] +
+                                    " conflict with the ones of the bank")
+            if reference is None:
+                reference = factor
+            for d in self._tables[num]:
+                merged[d['unit']] = d['value'] * reference / factor
+        if reference is None:
+            reference = 1
+        for unit, value in values.items():
+            merged.setdefault(unit, value * reference)
+        table = sorted(({'unit': unit, 'value': value}
+                        for unit, value in merged.items()),
+                       key=itemgetter('value'))
+
+        for num in merged_nums:
+            self._tables[num] = None
+        self._tables.append(table)
+        num = len(self._tables) - 1
+        for d in table:
+            self._index[d['unit']] = num
+
+    def get_table(self, unit):
+        """gives the conversion table of unit (the value of unit is 1) or
+        None if unit is not in the bank"""
+        if not isinstance(unit, str):
+            raise Exception("unit must be of type str")
+        self._load()
+        num = self._index.get(unit)
+        if num is None:
+            return None
+        table = self._tables[num]
+        reference = next(d['value'] for d in table if d['unit'] == unit)
+        return [{'unit': d['unit'], 'value': d['value'] / reference}
+                for d in table]
+
+    def add_table(self, unit):
+        """adds a conversion table to the bank and saves the bank"""
+        table = UnitBank.table_from_list(unit)
+        self._load()
+        # the bank is not changed if the values conflict
+        self._insert(table)
+        self._user_tables.append(table)
+        self.save()
+
+    def save(self):
+        """writes the tables added by the user in the json file"""
+        self._load()
+        saved = []
+        for table in self._user_tables:
+            unit = []
+            for d in table:
+                unit += [d['unit'], d['value']]
+            saved.append(unit)
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self._path, 'w') as f:
+            json.dump(saved, f)
+
+    @staticmethod
+    def table_from_list(unit):
+        """converts a list of symbols and conversion coefficients (e.g.
+        ['mm', 10**(-3), 'm', 1]) into a conversion table"""
+        if not isinstance(unit, list) or len(unit) == 0 or len(unit) % 2:
+            raise Exception("unit must be a list of the symbols of the units "
+                            "followed by the conversion indicator (e.g. "
+                            "['mm', 10**(-3), 'm', 1])")
+        table = []
+        for i in range(0, len(unit), 2):
+            try:
+                d = {'unit': str(unit[i]), 'value': float(unit[i + 1])}
+            except (TypeError, ValueError):
+                raise Exception("unit name must be a string and conversion"
+                                " coefficient must be a numerical scalar")
+            if d['value'] <= 0:
+                raise Exception("conversion coefficients must be positive")
+            table.append(d)
+        table.sort(key=itemgetter('value'))
+        return table
+
+
+def default_bank_path():
+    """gives the location of the file of the shared bank"""
+    path = os.environ.get('XPLOR_BANK')
+    if path:
+        return path
+    return os.path.join(os.path.expanduser('~'), '.xplor', 'unit_bank.json')
+
+
+_unit_bank = None
+
+
+def get_unit_bank():
+    """gives the UnitBank instance shared by the whole process"""
+    global _unit_bank
+    if _unit_bank is None:
+        _unit_bank = UnitBank()
+    return _unit_bank
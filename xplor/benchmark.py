@@ -0,0 +1,630 @@
+"""benchmark module is a module to measure how the time of the operations of
+the module xdata grows with the size and the number of dimensions of the data.
+
+The benchmarks are written in the style of airspeed velocity (asv): a suite
+is a class with the attributes params and param_names, a method setup called
+with each combination of parameters before the measures (raising
+NotImplementedError to skip a combination that does not make sense), and
+methods whose name starts with 'time_' which are timed. The first parameter
+of each suite is the number of elements of the data, from 10^3 to 10^8.
+
+The results are stored as JSON (one file per commit and machine), so that
+the times can be compared between two commits. For each curve (all the
+parameters fixed but the size), the exponent of the growth of the time with
+the size is estimated: an exponent close to 2 reveals an operation in O(n^2).
+
+A combination that takes more than timeout seconds is measured only once and
+the bigger sizes of the same curve are not run.
+
+Usage (from the xplor directory):
+
+    python benchmark.py run [--max-size 1e8] [--bench update] [--output f]
+
+    python benchmark.py show results.json
+
+    python benchmark.py compare old.json new.json [--factor 1.5]
+
+
+This module uses:
+    - argparse
+    - datetime
+    - itertools
+    - json
+    - os
+    - platform
+    - re
+    - subprocess
+    - sys
+    - timeit
+    - warnings
+    - numpy as np
+    - pandas as pd
+
+    - xdata
+
+
+There are 6 classes in this module:
+
+    - **XdataSuite**:
+        This class times the construction, the copy and the grouping of Xdata
+        instances.
+    - **UpdateXdataSuite**:
+        This class times update_xdata for each flag.
+    - **ModifyDimensionsSuite**:
+        This class times modify_dimensions for each flag.
+    - **CategoricalHeaderSuite**:
+        This class times update_categorical_header for each flag, and the
+        construction of a CategoricalHeader.
+    - **TypeInferenceSuite**:
+        This class times the inference of the type of a column of values.
+    - **HeaderEqualitySuite**:
+        This class times the comparison of two equal headers.
+
+There are 5 functions in this module:
+    - **run**:
+        run measures the benchmarks and gives the results as a dictionary
+        that can be saved as JSON.
+    - **save**:
+        save writes the results in a JSON file.
+    - **format_results**:
+        format_results gives the results as tables, one line per curve.
+    - **compare**:
+        compare gives the measures that changed between two results.
+    - **main**:
+        main is the command line interface.
+"""
+
+# Authors: Elodie Ikkache CNRS <elodie.ikkache@student.ecp.fr>
+#          Thomas Deneux CNRS <thomas.deneux@unic.cnrs-gif.fr>
+#
+# version 1.0
+# -*- coding: utf-8 -*-
+
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import timeit
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import xdata
+
+
+SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7, 10 ** 8]
+N_DIMENSIONS = [1, 2, 3, 4, 5, 6]
+
+UPDATE_XDATA_FLAGS = ['all', 'data_chg', 'chg', 'new', 'remove', 'chg&new',
+                      'chg&rm', 'perm']
+CATEGORICAL_HEADER_FLAGS = ['all', 'new', 'chg', 'remove', 'perm', 'chg&new',
+                            'chg&rm']
+MODIFY_DIMENSIONS_FLAGS = ['global', 'dim_chg', 'dim_insert', 'dim_rm',
+                           'dim_perm']
+
+
+def _shape(size, n_dimensions):
+    """gives a shape with about size elements in n_dimensions dimensions, the
+    first dimension having at least as many elements as the others"""
+    side = max(2, int(round(size ** (1. / n_dimensions))))
+    shape = [side] * n_dimensions
+    shape[0] = max(3, size // side ** (n_dimensions - 1))
+    return tuple(shape)
+
+
+def _line(i):
+    """gives the values of line i of a categorical header"""
+    return pd.Series(['item ' + str(i), float(i)])
+
+
+def _categorical_header(n_elem):
+    """gives a categorical header with a string and a numeric column"""
+    values = pd.DataFrame({0: ['item ' + str(i) for i in range(n_elem)],
+                           1: np.arange(n_elem, dtype=float)})
+    return xdata.CategoricalHeader('items', ['name', 'weight'], values)
+
+
+def _make_xdata(size, n_dimensions):
+    """gives a Xdata instance of about size elements, the first dimension
+    being described by a categorical header with values and the others by
+    measure headers"""
+    shape = _shape(size, n_dimensions)
+    headers = [_categorical_header(shape[0])]
+    for d in range(1, n_dimensions):
+        headers.append(xdata.MeasureHeader('dim' + str(d), 0, shape[d], 1.,
+                                           's'))
+    data = np.random.rand(*shape)
+    return xdata.Xdata('benchmark', data, headers, 'mV')
+
+
+class XdataSuite:
+    """ Construction, copy and grouping of Xdata instances.
+
+    **Parameters**
+
+    - size:
+        number of elements of the data
+    - n_dimensions:
+        number of dimensions of the data
+    """
+
+    params = [SIZES, N_DIMENSIONS]
+    param_names = ['size', 'n_dimensions']
+
+    def setup(self, size, n_dimensions):
+        self.xdata = _make_xdata(size, n_dimensions)
+        self.headers = self.xdata.headers
+
+    def time_construction(self, size, n_dimensions):
+        xdata.Xdata('benchmark', self.xdata.data, self.headers, 'mV')
+
+    def time_copy(self, size, n_dimensions):
+        self.xdata.copy()
+
+    def time_group_by(self, size, n_dimensions):
+        self.xdata.group_by(0, 'weight')
+
+
+class UpdateXdataSuite:
+    """ update_xdata, two lines of the first dimension being changed, one
+    being added or removed ('all' and 'data_chg' replace the whole data,
+    'perm' reverses the lines).
+
+    **Parameters**
+
+    - size:
+        number of elements of the data
+    - n_dimensions:
+        number of dimensions of the data
+    - flag:
+        flag given to update_xdata
+    """
+
+    params = [SIZES, N_DIMENSIONS, UPDATE_XDATA_FLAGS]
+    param_names = ['size', 'n_dimensions', 'flag']
+
+    def setup(self, size, n_dimensions, flag):
+        self.xdata = _make_xdata(size, n_dimensions)
+        header = self.xdata.headers[0]
+        n_elem = header.n_elem
+        # a numpy.ndarray even for 1 dimensional data
+        line = np.random.rand(1, *self.xdata.shape()[1:])[0, ...]
+        changed = [_line(-1), _line(-2)]
+        if flag in ['all', 'data_chg']:
+            self.ind = None
+            self.data_slices = np.random.rand(*self.xdata.shape())
+            self.header = header if flag == 'data_chg' else \
+                header.update_categorical_header('chg', [1, 2], changed)
+        elif flag == 'chg':
+            self.ind = [1, 2]
+            self.data_slices = [line, line]
+            self.header = header.update_categorical_header('chg', [1, 2],
+                                                           changed)
+        elif flag == 'new':
+            self.ind = None
+            self.data_slices = [line]
+            self.header = header.update_categorical_header(
+                'new', None, [_line(n_elem)])
+        elif flag == 'remove':
+            self.ind = [0]
+            self.data_slices = None
+            self.header = header.update_categorical_header('remove', [0], [])
+        elif flag == 'chg&new':
+            self.ind = [[1, 2], None]
+            self.data_slices = [[line, line], [line]]
+            self.header = header.update_categorical_header(
+                'chg&new', [[1, 2], None], [changed, [_line(n_elem)]])
+        elif flag == 'chg&rm':
+            self.ind = [[1, 2], [0]]
+            self.data_slices = [line, line]
+            self.header = header.update_categorical_header(
+                'chg&rm', [[1, 2], [0]], changed)
+        elif flag == 'perm':
+            self.ind = list(range(n_elem))[::-1]
+            self.data_slices = None
+            self.header = header.update_categorical_header('perm', self.ind,
+                                                           None)
+
+    def time_update_xdata(self, size, n_dimensions, flag):
+        self.xdata.update_xdata(flag, 0, self.ind, self.data_slices,
+                                self.header)
+
+
+class ModifyDimensionsSuite:
+    """ modify_dimensions: replacing the data ('global'), replacing the
+    header of the last dimension ('dim_chg'), inserting a dimension of one
+    element ('dim_insert'), averaging the last dimension ('dim_rm') and
+    reversing the dimensions ('dim_perm').
+
+    **Parameters**
+
+    - size:
+        number of elements of the data
+    - n_dimensions:
+        number of dimensions of the data
+    - flag:
+        flag given to modify_dimensions
+    """
+
+    params = [SIZES, N_DIMENSIONS, MODIFY_DIMENSIONS_FLAGS]
+    param_names = ['size', 'n_dimensions', 'flag']
+
+    def setup(self, size, n_dimensions, flag):
+        if flag in ['dim_rm', 'dim_perm'] and n_dimensions == 1:
+            raise NotImplementedError
+        self.xdata = _make_xdata(size, n_dimensions)
+        last = n_dimensions - 1
+        if flag == 'global':
+            self.dim = None
+            self.new_data = np.random.rand(*self.xdata.shape())
+            self.new_headers = self.xdata.headers
+        elif flag == 'dim_chg':
+            self.dim = [last]
+            self.new_data = self.xdata.data
+            self.new_headers = [xdata.CategoricalHeader(
+                'new', n_elem=self.xdata.shape()[last])]
+        elif flag == 'dim_insert':
+            self.dim = [n_dimensions]
+            self.new_data = self.xdata.data[..., np.newaxis]
+            self.new_headers = [xdata.CategoricalHeader('new', n_elem=1)]
+        elif flag == 'dim_rm':
+            self.dim = [last]
+            self.new_data = None
+            self.new_headers = None
+        elif flag == 'dim_perm':
+            self.dim = list(range(n_dimensions))[::-1]
+            self.new_data = None
+            self.new_headers = None
+
+    def time_modify_dimensions(self, size, n_dimensions, flag):
+        self.xdata.modify_dimensions(flag, self.dim, self.new_data,
+                                     self.new_headers)
+
+
+class CategoricalHeaderSuite:
+    """ update_categorical_header, two lines being changed, one being added
+    or removed
+    ('all' replaces all the values, 'perm' reverses the lines), and the
+    construction of a header (with the inference of the type of its
+    columns).
+
+    **Parameters**
+
+    - size:
+        number of lines of the header
+    - flag:
+        flag given to update_categorical_header
+    """
+
+    params = [SIZES, CATEGORICAL_HEADER_FLAGS]
+    param_names = ['size', 'flag']
+
+    def setup(self, size, flag):
+        self.header = _categorical_header(size)
+        self.values = self.header.values
+        if flag == 'all':
+            self.ind = None
+            self.new_values = self.values.copy()
+        elif flag == 'new':
+            self.ind = None
+            self.new_values = [_line(size)]
+        elif flag == 'chg':
+            self.ind = [1, 2]
+            self.new_values = [_line(-1), _line(-2)]
+        elif flag == 'remove':
+            self.ind = [0]
+            self.new_values = []
+        elif flag == 'perm':
+            self.ind = list(range(size))[::-1]
+            self.new_values = None
+        elif flag == 'chg&new':
+            self.ind = [[1, 2], None]
+            self.new_values = [[_line(-1), _line(-2)], [_line(size)]]
+        elif flag == 'chg&rm':
+            self.ind = [[1, 2], [0]]
+            self.new_values = [_line(-1), _line(-2)]
+
+    def time_update_categorical_header(self, size, flag):
+        self.header.update_categorical_header(flag, self.ind,
+                                              self.new_values)
+
+    def time_construction(self, size, flag):
+        if flag != 'all':
+            # the construction does not depend on the flag
+            raise NotImplementedError
+        xdata.CategoricalHeader('items', ['name', 'weight'], self.values)
+
+
+class TypeInferenceSuite:
+    """ Inference of the dimension_type of a column of values (all the values
+    are checked, unless one of another type is found).
+
+    **Parameters**
+
+    - size:
+        number of values
+    - dimension_type:
+        type of the values ('mixed' columns have a string as last value)
+    """
+
+    params = [SIZES, ['numeric', 'string', 'mixed']]
+    param_names = ['size', 'dimension_type']
+
+    def setup(self, size, dimension_type):
+        if dimension_type == 'string':
+            values = ['item ' + str(i) for i in range(size)]
+        else:
+            values = list(np.arange(size, dtype=float))
+            if dimension_type == 'mixed':
+                values[-1] = 'last'
+        self.column = pd.Series(values, dtype=object)
+
+    def time_create_dimension_description(self, size, dimension_type):
+        xdata.create_dimension_description('column', self.column)
+
+
+class HeaderEqualitySuite:
+    """ Comparison of two equal headers that are different objects.
+
+    **Parameters**
+
+    - size:
+        number of elements of the headers
+    - kind:
+        'measure' or 'categorical'
+    """
+
+    params = [SIZES, ['measure', 'categorical']]
+    param_names = ['size', 'kind']
+
+    def setup(self, size, kind):
+        if kind == 'measure':
+            self.header = xdata.MeasureHeader('time', 0, size, 0.1, 's')
+        else:
+            self.header = _categorical_header(size)
+        self.other = self.header.copy()
+
+    def time_equality(self, size, kind):
+        self.header == self.other
+
+
+SUITES = [XdataSuite, UpdateXdataSuite, ModifyDimensionsSuite,
+          CategoricalHeaderSuite, TypeInferenceSuite, HeaderEqualitySuite]
+
+
+def _measure(fun, first, repeat, min_time):
+    """gives the median time of a call of fun, each of the repeat samples
+    calling fun enough times to last about min_time (first being the time of
+    a first call)"""
+    number = max(1, int(min_time / max(first, 1e-9)))
+    samples = timeit.Timer(fun).repeat(repeat, number)
+    return float(np.median(samples)) / number
+
+
+def _commit():
+    """gives the hash of the current commit, or None"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _exponent(sizes, times):
+    """estimates the exponent of the growth of times with sizes on the 3
+    biggest sizes, or None"""
+    points = [(s, t) for s, t in zip(sizes, times) if t is not None and t > 0]
+    points = points[-3:]
+    if len(points) < 2 or points[0][0] == points[-1][0]:
+        return None
+    x, y = np.log10(np.array(points)).T
+    return float(np.polyfit(x, y, 1)[0])
+
+
+def run(pattern=None, max_size=10 ** 6, repeat=5, min_time=0.05,
+        timeout=10., suites=None, verbose=False):
+    """measures the benchmarks whose name matches pattern (regular
+    expression, e.g. 'UpdateXdata' or 'time_copy') for the sizes up to
+    max_size, and gives the results"""
+    if suites is None:
+        suites = SUITES
+    results = {'commit': _commit(),
+               'date': datetime.datetime.now().isoformat(),
+               'machine': platform.node(),
+               'python': platform.python_version(),
+               'numpy': np.__version__,
+               'pandas': pd.__version__,
+               'benchmarks': {}}
+    for suite in suites:
+        methods = sorted(m for m in dir(suite) if m.startswith('time_'))
+        for method in methods:
+            name = suite.__name__ + '.' + method
+            if pattern is not None and not re.search(pattern, name):
+                continue
+            params = [[p for p in suite.params[0] if p <= max_size]] + \
+                list(suite.params[1:])
+            measures = []
+            too_slow = set()
+            # the size is the first parameter: the curves are measured from
+            # the smallest size
+            for combination in itertools.product(*params):
+                curve = combination[1:]
+                measure = {'params': list(combination), 'time': None}
+                measures.append(measure)
+                if curve in too_slow:
+                    measure['status'] = 'timeout'
+                    continue
+                instance = suite()
+                start = timeit.default_timer()
+                try:
+                    if hasattr(instance, 'setup'):
+                        instance.setup(*combination)
+                    bound = getattr(instance, method)
+                    first = timeit.timeit(lambda: bound(*combination),
+                                          number=1)
+                except NotImplementedError:
+                    measure['status'] = 'skipped'
+                    continue
+                except Exception as e:
+                    measure['status'] = 'failed'
+                    measure['error'] = repr(e)
+                    continue
+                if timeit.default_timer() - start > timeout:
+                    # this call is the only sample
+                    measure['time'] = first
+                    too_slow.add(curve)
+                else:
+                    measure['time'] = _measure(lambda: bound(*combination),
+                                               first, repeat, min_time)
+                measure['status'] = 'ok'
+                if verbose:
+                    print("%s%s: %s" % (name, tuple(combination),
+                                        _format_time(measure['time'])))
+            curves = {}
+            for measure in measures:
+                curve = json.dumps(measure['params'][1:])
+                curves.setdefault(curve, ([], []))
+                curves[curve][0].append(measure['params'][0])
+                curves[curve][1].append(measure['time'])
+            results['benchmarks'][name] = {
+                'params': params,
+                'param_names': suite.param_names,
+                'unit': 'seconds',
+                'measures': measures,
+                'exponents': {c: _exponent(s, t)
+                              for c, (s, t) in curves.items()}}
+    return results
+
+
+def save(results, path=None):
+    """writes the results in a JSON file (by default
+    .benchmarks/<machine>/<commit>.json next to this module) and gives its
+    path"""
+    if path is None:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            '.benchmarks', results['machine'],
+                            (results['commit'] or 'unknown') + '.json')
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=1)
+    return path
+
+
+def _format_time(t):
+    """gives a readable time"""
+    if t is None:
+        return '-'
+    for unit, factor in [('s', 1), ('ms', 1e-3), ('us', 1e-6)]:
+        if t >= factor:
+            return "%.3g%s" % (t / factor, unit)
+    return "%.3gns" % (t * 1e9)
+
+
+def format_results(results):
+    """gives the results as tables: one line per curve, one column per size,
+    and the estimated exponent of the growth of the time"""
+    lines = []
+    for name, benchmark in sorted(results['benchmarks'].items()):
+        sizes = benchmark['params'][0]
+        names = benchmark['param_names'][1:]
+        lines.append(name)
+        lines.append("  " + "  ".join(
+            ["%-24s" % ", ".join(names)] + ["%9s" % ("%.0e" % s)
+                                            for s in sizes] + ["  exponent"]))
+        rows = {}
+        for measure in benchmark['measures']:
+            curve = json.dumps(measure['params'][1:])
+            cell = _format_time(measure['time']) \
+                if measure['status'] == 'ok' else measure['status']
+            rows.setdefault(curve, []).append(cell)
+        for curve, cells in rows.items():
+            if all(c == 'skipped' for c in cells):
+                continue
+            exponent = benchmark['exponents'].get(curve)
+            label = ", ".join(str(p) for p in json.loads(curve))
+            lines.append("  " + "  ".join(
+                ["%-24s" % label] + ["%9s" % c for c in cells] +
+                ["  " + ('-' if exponent is None else "n^%.2f" % exponent)]))
+        lines.append("")
+    return "\n".join(lines)
+
+
+def compare(old, new, factor=1.5):
+    """gives the measures of both results whose time changed by more than
+    factor, as a list of (name, params, old time, new time, ratio), the
+    biggest changes first"""
+    changes = []
+    for name, benchmark in new['benchmarks'].items():
+        if name not in old['benchmarks']:
+            continue
+        before = {json.dumps(m['params']): m['time']
+                  for m in old['benchmarks'][name]['measures']}
+        for measure in benchmark['measures']:
+            t_old = before.get(json.dumps(measure['params']))
+            t_new = measure['time']
+            if t_old is None or t_new is None or t_old <= 0:
+                continue
+            ratio = t_new / t_old
+            if ratio >= factor or ratio <= 1. / factor:
+                changes.append((name, measure['params'], t_old, t_new, ratio))
+    changes.sort(key=lambda c: -abs(np.log(c[4])))
+    return changes
+
+
+def _load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    """command line interface: run, show or compare"""
+    parser = argparse.ArgumentParser(
+        description="benchmarks of the module xdata")
+    commands = parser.add_subparsers(dest='command')
+    run_parser = commands.add_parser('run', help="measures the benchmarks")
+    run_parser.add_argument('--bench', default=None,
+                            help="regular expression on the names")
+    run_parser.add_argument('--max-size', type=float, default=1e6)
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--timeout', type=float, default=10.)
+    run_parser.add_argument('--output', default=None)
+    show_parser = commands.add_parser('show', help="prints results")
+    show_parser.add_argument('results')
+    compare_parser = commands.add_parser(
+        'compare', help="prints the measures that changed")
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--factor', type=float, default=1.5)
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        # the deprecation warnings of pandas would be repeated at each call
+        warnings.simplefilter('ignore', FutureWarning)
+        results = run(args.bench, int(args.max_size), args.repeat,
+                      timeout=args.timeout, verbose=True)
+        print("results written in " + save(results, args.output) + "\n")
+        print(format_results(results))
+    elif args.command == 'show':
+        print(format_results(_load(args.results)))
+    elif args.command == 'compare':
+        changes = compare(_load(args.old), _load(args.new), args.factor)
+        for name, params, t_old, t_new, ratio in changes:
+            print("%-8s %s%s: %s -> %s (x%.2f)"
+                  % ('slower' if ratio > 1 else 'faster', name, tuple(params),
+                     _format_time(t_old), _format_time(t_new), ratio))
+        if not changes:
+            print("no change bigger than x%g" % args.factor)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
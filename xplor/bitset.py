@@ -0,0 +1,276 @@
+"""bitset module is a module to represent the selected elements of a dimension
+as a set of bits.
+
+A selection of hundreds of thousands of elements (e.g. the lines satisfying a
+predicate, or the union of the selections of several windows) is slow to
+combine as a list of line numbers. A Bitset stores one bit per element,
+packed in 64 bits words (numpy uint64): the union, intersection and
+difference of two selections are computed on the words, and the number of
+selected elements is counted from the bytes of the words, without going
+through the line numbers.
+
+A Bitset is immutable and hashable (it can be used in the state of a filter,
+as a key of the slice caches). It converts to a slice when the selected
+elements are consecutive, so that applying the filter takes a view of the
+data, and to an array of line numbers otherwise.
+
+
+This module uses:
+    - numpy as np
+
+
+There is 1 class in this module:
+
+    - **Bitset**:
+        This class gives the set operations on the selected elements of a
+        dimension.
+"""
+
+# Authors: Elodie Ikkache CNRS <elodie.ikkache@student.ecp.fr>
+#          Thomas Deneux CNRS <thomas.deneux@unic.cnrs-gif.fr>
+#
+# version 1.0
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+# number of bits set in each byte
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _n_words(n_elem):
+    return (n_elem + 63) // 64
+
+
+def _pack(mask):
+    """gives the words of a mask (numpy array of bool)"""
+    n_words = _n_words(len(mask))
+    packed = np.zeros(n_words * 8, dtype=np.uint8)
+    packed[:(len(mask) + 7) // 8] = np.packbits(mask, bitorder='little')
+    return packed.view('<u8').astype(np.uint64, copy=False)
+
+
+class Bitset:
+    """ Selected elements of a dimension, one bit per element.
+
+    **Parameters**
+
+    - n_elem:
+        number of elements of the dimension (type int)
+    - lines:
+        numbers of the selected elements (type list of int or numpy array of
+        int)
+
+        (optional, default value is no element)
+
+    (the class methods from_mask and from_range create a Bitset from a
+    numpy array of bool and from a range of elements)
+
+    **Attributes**
+
+    - n_elem:
+        number of elements of the dimension
+    - count:
+        number of selected elements (also len(bitset))
+    - first:
+        first selected element (None if there are none)
+    - last:
+        last selected element (None if there are none)
+    - is_contiguous:
+        True if the selected elements are consecutive
+
+    **Methods**
+
+    - union(other), intersection(other), difference(other),
+      symmetric_difference(other), complement():
+        set operations (also |, &, -, ^ and ~), giving a new Bitset (the
+        number of elements of the result is the largest one)
+    - lines():
+        gives the numbers of the selected elements (numpy array of int, in
+        increasing order), iterating on a Bitset gives them as int
+    - mask():
+        gives for each element whether it is selected (numpy array of bool)
+    - to_index():
+        gives a slice if the selected elements are consecutive, the numbers
+        of the selected elements otherwise
+    - bitset in, ==, hash:
+        the Bitsets with the same selected elements are equal, whatever
+        their number of elements
+    """
+
+    def __init__(self, n_elem, lines=None):
+        """Constructor of the class Bitset"""
+        if not isinstance(n_elem, (int, np.integer)) or n_elem < 0:
+            raise Exception("n_elem must be a non negative int")
+        mask = np.zeros(int(n_elem), dtype=bool)
+        if lines is not None:
+            lines = np.asarray(lines)
+            if len(lines):
+                if lines.dtype.kind not in 'iu':
+                    raise Exception("lines must be a list of int")
+                if lines.min() < 0 or lines.max() >= n_elem:
+                    raise Exception("lines must be in [0, n_elem[")
+                mask[lines] = True
+        self._set(int(n_elem), _pack(mask))
+
+    def _set(self, n_elem, words):
+        words.flags.writeable = False
+        self._n_elem = n_elem
+        self._words = words
+        self._count = None
+        self._hash = None
+
+    @classmethod
+    def _from_words(cls, n_elem, words):
+        obj = cls.__new__(cls)
+        obj._set(n_elem, words)
+        return obj
+
+    @classmethod
+    def from_mask(cls, mask):
+        """gives the Bitset of the elements whose value in mask is True"""
+        mask = np.asarray(mask)
+        if mask.ndim != 1 or mask.dtype != bool:
+            raise Exception("mask must be a numpy array of bool")
+        return cls._from_words(len(mask), _pack(mask))
+
+    @classmethod
+    def from_range(cls, n_elem, start, stop):
+        """gives the Bitset of the elements start to stop - 1"""
+        if not (0 <= start <= stop <= n_elem):
+            raise Exception("the range must be in [0, n_elem]")
+        mask = np.zeros(n_elem, dtype=bool)
+        mask[start:stop] = True
+        return cls._from_words(n_elem, _pack(mask))
+
+    @property
+    def n_elem(self):
+        """number of elements of the dimension"""
+        return self._n_elem
+
+    @property
+    def count(self):
+        """number of selected elements"""
+        if self._count is None:
+            self._count = int(_POPCOUNT[self._words.view(np.uint8)].sum(
+                dtype=np.int64))
+        return self._count
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def first(self):
+        """first selected element"""
+        nonzero = np.flatnonzero(self._words)
+        if len(nonzero) == 0:
+            return None
+        word = int(self._words[nonzero[0]])
+        return int(nonzero[0]) * 64 + (word & -word).bit_length() - 1
+
+    @property
+    def last(self):
+        """last selected element"""
+        nonzero = np.flatnonzero(self._words)
+        if len(nonzero) == 0:
+            return None
+        word = int(self._words[nonzero[-1]])
+        return int(nonzero[-1]) * 64 + word.bit_length() - 1
+
+    @property
+    def is_contiguous(self):
+        """True if the selected elements are consecutive"""
+        count = self.count
+        return count > 0 and self.last - self.first + 1 == count
+
+    def mask(self):
+        """gives for each element whether it is selected"""
+        bits = np.unpackbits(self._words.astype('<u8').view(np.uint8),
+                             bitorder='little')
+        return bits[:self._n_elem].astype(bool)
+
+    def lines(self):
+        """gives the numbers of the selected elements"""
+        return np.flatnonzero(self.mask())
+
+    def to_index(self):
+        """gives a slice if the selected elements are consecutive, their
+        numbers otherwise"""
+        if self.is_contiguous:
+            return slice(self.first, self.last + 1)
+        return self.lines()
+
+    def __iter__(self):
+        return iter(self.lines().tolist())
+
+    def __contains__(self, line):
+        if not isinstance(line, (int, np.integer)) or \
+                not 0 <= line < self._n_elem:
+            return False
+        return bool((int(self._words[line // 64]) >> (line % 64)) & 1)
+
+    def _aligned(self, other):
+        """gives the words of both bitsets, with the same length"""
+        if not isinstance(other, Bitset):
+            raise Exception("other must be of type Bitset")
+        n_elem = max(self._n_elem, other._n_elem)
+        n_words = _n_words(n_elem)
+        a, b = self._words, other._words
+        if len(a) < n_words:
+            a = np.concatenate((a, np.zeros(n_words - len(a), np.uint64)))
+        if len(b) < n_words:
+            b = np.concatenate((b, np.zeros(n_words - len(b), np.uint64)))
+        return n_elem, a, b
+
+    def union(self, other):
+        """gives the elements selected in self or other"""
+        n_elem, a, b = self._aligned(other)
+        return Bitset._from_words(n_elem, a | b)
+
+    def intersection(self, other):
+        """gives the elements selected in self and other"""
+        n_elem, a, b = self._aligned(other)
+        return Bitset._from_words(n_elem, a & b)
+
+    def difference(self, other):
+        """gives the elements selected in self but not in other"""
+        n_elem, a, b = self._aligned(other)
+        return Bitset._from_words(n_elem, a & ~b)
+
+    def symmetric_difference(self, other):
+        """gives the elements selected in only one of self and other"""
+        n_elem, a, b = self._aligned(other)
+        return Bitset._from_words(n_elem, a ^ b)
+
+    def complement(self):
+        """gives the elements that are not selected"""
+        words = ~self._words
+        if self._n_elem % 64:
+            # the bits after the last element stay unset
+            words[-1] &= np.uint64((1 << (self._n_elem % 64)) - 1)
+        return Bitset._from_words(self._n_elem, words)
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+    __xor__ = symmetric_difference
+    __invert__ = complement
+
+    def _trimmed(self):
+        """gives the words without the last empty ones"""
+        nonzero = np.flatnonzero(self._words)
+        return self._words[:nonzero[-1] + 1 if len(nonzero) else 0]
+
+    def __eq__(self, other):
+        if not isinstance(other, Bitset):
+            return NotImplemented
+        return np.array_equal(self._trimmed(), other._trimmed())
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(self._trimmed().tobytes())
+        return self._hash
+
+    def __repr__(self):
+        return "Bitset(%d elements, %d selected)" % (self._n_elem, self.count)
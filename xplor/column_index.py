@@ -0,0 +1,669 @@
+"""column_index module is a module to find quickly the lines of a categorical
+header having given values.
+
+Finding the lines of a column equal to a value, or within a range of values,
+requires a pass over all the lines of the header. An index is built once (the
+first time it is needed) and then answers each query in a time that only
+depends on the number of lines found:
+    - a HashIndex gives the lines having a value (e.g. 'F'),
+    - a SortedIndex gives the lines whose value is in a range (e.g. [40, 64])
+      for numeric or string columns,
+    - a TextIndex gives the lines whose value starts with or contains a text
+      (e.g. the names of the items that match what the user types), the case
+      being ignored.
+
+When a header is updated with the flags 'perm', 'chg', 'new' or 'remove', the
+indexes of its columns are updated with the changed lines (with array
+operations on the numbers of the lines, the values are not hashed or sorted
+again) instead of being built again. When the new values cannot be placed in
+an index (e.g. a string in a sorted numeric column), an IndexUpdateError is
+raised and the index has to be built again.
+
+Missing values (NaN, None) are not indexed.
+
+
+This module uses:
+    - numpy as np
+    - pandas as pd
+
+
+There are 4 classes in this module:
+
+    - **IndexUpdateError**:
+        This exception is raised when an index cannot be updated with the new
+        values of the column.
+    - **HashIndex**:
+        This class gives the lines of a column having a given value.
+    - **SortedIndex**:
+        This class gives the lines of a column whose value is in a range.
+    - **TextIndex**:
+        This class gives the lines of a column whose value starts with or
+        contains a text.
+
+There is 1 function in this module:
+    - **scan_text**:
+        scan_text gives the lines of a column whose value starts with or
+        contains a text, going through all the lines (when the TextIndex of
+        the column is not built yet).
+"""
+
+# Authors: Elodie Ikkache CNRS <elodie.ikkache@student.ecp.fr>
+#          Thomas Deneux CNRS <thomas.deneux@unic.cnrs-gif.fr>
+#
+# version 1.0
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+
+def _new_line_numbers(n_elem, removed):
+    """gives the new number of each line after removing the lines removed
+    (-1 for the removed lines)"""
+    keep = np.ones(n_elem, dtype=bool)
+    keep[removed] = False
+    numbers = np.cumsum(keep) - 1
+    numbers[~keep] = -1
+    return numbers
+
+
+class IndexUpdateError(Exception):
+    """ The new values of the column cannot be placed in the index, which has
+    to be built again."""
+
+
+class HashIndex:
+    """ Lines of a column having each value.
+
+    The values are numbered (codes), the lines of each code are stored
+    contiguously and in increasing order, so that the lines having a value are
+    found with a dictionary lookup and a slice.
+
+    **Parameters**
+
+    - values:
+        values of the column (type pandas.core.series.Series or list), they
+        must be hashable
+
+    **Attributes**
+
+    - n_elem:
+        number of lines
+    - n_values:
+        number of distinct values
+    - codes:
+        number of the value of each line (-1 for the missing values), in
+        the order of uniques
+    - uniques:
+        list of the distinct values
+
+    **Methods**
+
+    - lookup(value):
+        gives the lines having this value (numpy array of int, in increasing
+        order)
+    - updated(flag, ind, new_values, n_elem):
+        gives the index of the column updated by update_categorical_header
+        with the flag 'perm', 'chg', 'new' or 'remove' (new_values are the
+        values of the changed or new lines, n_elem the number of lines before
+        the update)
+    """
+
+    def __init__(self, values):
+        """Constructor of the class HashIndex"""
+        try:
+            codes, uniques = pd.factorize(pd.Series(values, dtype=object),
+                                          sort=False)
+        except TypeError:
+            raise Exception("the values of the column must be hashable to be "
+                            "indexed")
+        self._codes = codes.astype(np.int64)
+        self._code_of = {v: c for c, v in enumerate(uniques)}
+        self._order = None
+        self._starts = None
+
+    @classmethod
+    def _from_codes(cls, codes, code_of):
+        obj = cls.__new__(cls)
+        obj._codes = codes
+        obj._code_of = code_of
+        obj._order = None
+        obj._starts = None
+        return obj
+
+    @property
+    def n_elem(self):
+        """number of lines"""
+        return len(self._codes)
+
+    @property
+    def n_values(self):
+        """number of distinct values"""
+        return len(self._code_of)
+
+    @property
+    def codes(self):
+        """number of the value of each line (-1 for the missing values)"""
+        codes = self._codes.view()
+        codes.flags.writeable = False
+        return codes
+
+    @property
+    def uniques(self):
+        """list of the distinct values"""
+        # the codes are given in order when the values are added
+        return list(self._code_of)
+
+    def _group(self):
+        """sorts the lines by code (once after each update)"""
+        if self._order is None:
+            indexed = self._codes >= 0
+            # a stable sort keeps the lines of a code in increasing order,
+            # the missing values (code -1) come first
+            order = np.argsort(self._codes, kind='stable')
+            self._order = order[len(order) - np.count_nonzero(indexed):]
+            counts = np.bincount(self._codes[indexed],
+                                 minlength=len(self._code_of))
+            self._starts = np.concatenate(([0], np.cumsum(counts)))
+
+    def lookup(self, value):
+        """gives the lines having this value"""
+        try:
+            code = self._code_of.get(value)
+        except TypeError:
+            raise Exception("value must be hashable")
+        if code is None:
+            return np.zeros(0, dtype=np.int64)
+        self._group()
+        return self._order[self._starts[code]:self._starts[code + 1]].copy()
+
+    def _codes_of(self, new_values):
+        """gives the codes of new values, new codes being added"""
+        code_of = dict(self._code_of)
+        codes = np.empty(len(new_values), dtype=np.int64)
+        for i, v in enumerate(new_values):
+            if v is None or (isinstance(v, float) and np.isnan(v)):
+                codes[i] = -1
+                continue
+            try:
+                codes[i] = code_of.setdefault(v, len(code_of))
+            except TypeError:
+                raise IndexUpdateError("the values of the column must be "
+                                       "hashable to be indexed")
+        return codes, code_of
+
+    def updated(self, flag, ind, new_values, n_elem):
+        """gives the index of the column after an update of the header"""
+        if n_elem != self.n_elem:
+            raise Exception("the index does not have the lines of the header")
+        if flag == 'perm':
+            return HashIndex._from_codes(self._codes[np.asarray(ind)],
+                                         self._code_of)
+        elif flag == 'remove':
+            return HashIndex._from_codes(np.delete(self._codes, ind),
+                                         self._code_of)
+        elif flag == 'new':
+            codes, code_of = self._codes_of(new_values)
+            return HashIndex._from_codes(
+                np.concatenate((self._codes, codes)), code_of)
+        elif flag == 'chg':
+            codes, code_of = self._codes_of(new_values)
+            new_codes = self._codes.copy()
+            new_codes[np.asarray(ind, dtype=np.int64)] = codes
+            return HashIndex._from_codes(new_codes, code_of)
+        raise Exception("an index can only be updated with the flags 'perm', "
+                        "'chg', 'new' or 'remove'")
+
+
+class SortedIndex:
+    """ Lines of a column sorted by value.
+
+    **Parameters**
+
+    - values:
+        values of the column (type pandas.core.series.Series or list), they
+        must be all numbers or all strings
+
+    **Attributes**
+
+    - n_elem:
+        number of lines
+
+    **Methods**
+
+    - lookup_range(low=None, high=None):
+        gives the lines whose value v is such that low <= v <= high (numpy
+        array of int, in increasing order), low or high being None for no
+        bound
+    - updated(flag, ind, new_values, n_elem):
+        gives the index of the column updated by update_categorical_header
+        with the flag 'perm', 'chg', 'new' or 'remove'
+    """
+
+    def __init__(self, values):
+        """Constructor of the class SortedIndex"""
+        values = SortedIndex._check(pd.Series(values, dtype=object))
+        if values is None:
+            raise Exception("only columns of numbers or of strings can be "
+                            "sorted")
+        lines = np.flatnonzero(~pd.isnull(values))
+        sorted_values = values[lines]
+        order = np.argsort(sorted_values, kind='stable')
+        self._n_elem = len(values)
+        self._values = sorted_values[order]
+        self._lines = lines[order]
+
+    @classmethod
+    def _from_sorted(cls, n_elem, values, lines):
+        obj = cls.__new__(cls)
+        obj._n_elem = n_elem
+        obj._values = values
+        obj._lines = lines
+        return obj
+
+    @staticmethod
+    def _check(values):
+        """gives the values as a numpy array that can be sorted (None if
+        they are not all numbers or all strings)"""
+        present = values[~pd.isnull(values)]
+        if all(isinstance(v, str) for v in present):
+            return values.values
+        elif all(isinstance(v, (int, float, np.integer, np.floating)) and
+                 not isinstance(v, bool) for v in present):
+            return values.values.astype(np.float64)
+        return None
+
+    @property
+    def n_elem(self):
+        """number of lines"""
+        return self._n_elem
+
+    def _check_bound(self, bound):
+        if bound is None:
+            return
+        numeric = (isinstance(bound, (int, float, np.integer, np.floating))
+                   and not isinstance(bound, bool))
+        if numeric != (self._values.dtype == np.float64) or \
+                not (numeric or isinstance(bound, str)):
+            raise Exception("low and high must be of the type of the values")
+
+    def lookup_range(self, low=None, high=None):
+        """gives the lines whose value is in [low, high]"""
+        self._check_bound(low)
+        self._check_bound(high)
+        try:
+            start = 0 if low is None else \
+                np.searchsorted(self._values, low, 'left')
+            stop = len(self._values) if high is None else \
+                np.searchsorted(self._values, high, 'right')
+        except (TypeError, ValueError):
+            raise Exception("low and high must be of the type of the values")
+        return np.sort(self._lines[start:max(start, stop)])
+
+    def _inserted(self, values, lines, new_values, new_lines):
+        """gives the sorted values and lines with new ones inserted"""
+        new_values = SortedIndex._check(pd.Series(list(new_values),
+                                                  dtype=object))
+        if new_values is None:
+            raise IndexUpdateError("only columns of numbers or of strings "
+                                   "can be sorted")
+        present = ~pd.isnull(new_values)
+        new_values = new_values[present]
+        new_lines = np.asarray(new_lines, dtype=np.int64)[present]
+        if len(new_values) and new_values.dtype != values.dtype:
+            raise IndexUpdateError("only columns of numbers or of strings "
+                                   "can be sorted")
+        if len(new_values):
+            try:
+                positions = np.searchsorted(values, new_values, 'right')
+            except (TypeError, ValueError):
+                raise IndexUpdateError("only columns of numbers or of "
+                                       "strings can be sorted")
+            values = np.insert(values, positions, new_values)
+            lines = np.insert(lines, positions, new_lines)
+        return values, lines
+
+    def updated(self, flag, ind, new_values, n_elem):
+        """gives the index of the column after an update of the header"""
+        if n_elem != self._n_elem:
+            raise Exception("the index does not have the lines of the header")
+        if flag == 'perm':
+            # the new line i is the old line ind[i]
+            new_numbers = np.argsort(np.asarray(ind, dtype=np.int64))
+            return SortedIndex._from_sorted(n_elem, self._values,
+                                            new_numbers[self._lines])
+        elif flag == 'remove':
+            new_numbers = _new_line_numbers(n_elem, ind)[self._lines]
+            kept = new_numbers >= 0
+            return SortedIndex._from_sorted(n_elem - len(set(ind)),
+                                            self._values[kept],
+                                            new_numbers[kept])
+        elif flag == 'new':
+            values, lines = self._inserted(
+                self._values, self._lines, new_values,
+                np.arange(n_elem, n_elem + len(new_values)))
+            return SortedIndex._from_sorted(n_elem + len(new_values), values,
+                                            lines)
+        elif flag == 'chg':
+            changed = np.isin(self._lines, ind)
+            values, lines = self._inserted(self._values[~changed],
+                                           self._lines[~changed],
+                                           new_values, ind)
+            return SortedIndex._from_sorted(n_elem, values, lines)
+        raise Exception("an index can only be updated with the flags 'perm', "
+                        "'chg', 'new' or 'remove'")
+
+
+# longest n-grams indexed by a TextIndex, and number of values whose n-grams
+# are computed at once
+N_GRAM = 3
+_CHUNK = 65536
+# the keys are kept as a matrix of character codes (to check many of them at
+# once) when they are not longer than _MAX_WIDTH
+_MAX_WIDTH = 64
+# under this number of candidates, the texts are checked rather than
+# intersecting more lists of keys, and the lines are gathered key by key
+_FEW = 1024
+# number of bits of the code of a character in an n-gram
+_CHAR_BITS = 21
+
+
+def _text_key(value):
+    """gives the text searched in a value (the case is ignored)"""
+    return str(value).casefold()
+
+
+def _check_text(text):
+    if not isinstance(text, str):
+        raise Exception("text must be of type str")
+    return text.casefold()
+
+
+def scan_text(values, text, mode='substring'):
+    """gives the lines of values (type pandas.core.series.Series or list)
+    whose value starts with (mode 'prefix') or contains (mode 'substring')
+    text, going through all the lines"""
+    if mode not in ['prefix', 'substring']:
+        raise Exception("mode must be 'prefix' or 'substring'")
+    text = _check_text(text)
+    values = pd.Series(values, dtype=object)
+    present = values.notnull().values
+    keys = values[present].map(_text_key)
+    if mode == 'prefix':
+        found = keys.str.startswith(text)
+    else:
+        found = keys.str.contains(text, regex=False)
+    return np.flatnonzero(present)[found.values.astype(bool)]
+
+
+def _gram_code(codes):
+    """gives the code of an n-gram from the codes of its characters"""
+    gram = 0
+    for code in codes:
+        gram = (gram << _CHAR_BITS) | (code + 1)
+    return gram
+
+
+def _grams(keys):
+    """gives the codes of the n-grams (n = 1 to N_GRAM) of the keys, and the
+    number of the key of each of them, sorted by code and by key, without
+    repetitions"""
+    grams = [np.zeros(0, dtype=np.int64)]
+    owners = [np.zeros(0, dtype=np.int64)]
+    for start in range(0, len(keys), _CHUNK):
+        chunk = np.array(keys[start:start + _CHUNK].tolist(), dtype=str)
+        width = chunk.dtype.itemsize // 4
+        if width == 0:
+            continue
+        # one line of character codes per key, padded with zeros
+        chars = chunk.view(np.uint32).reshape(len(chunk), width) \
+            .astype(np.int64)
+        lengths = np.char.str_len(chunk)
+        numbers = np.arange(start, start + len(chunk))
+        for n in range(1, min(N_GRAM, width) + 1):
+            n_pos = width - n + 1
+            gram = np.zeros((len(chunk), n_pos), dtype=np.int64)
+            for i in range(n):
+                gram = (gram << _CHAR_BITS) | (chars[:, i:i + n_pos] + 1)
+            valid = np.arange(n_pos)[None, :] + n <= lengths[:, None]
+            grams.append(gram[valid])
+            owners.append(np.broadcast_to(numbers[:, None], gram.shape)[valid])
+    grams = np.concatenate(grams)
+    owners = np.concatenate(owners)
+    order = np.lexsort((owners, grams))
+    grams = grams[order]
+    owners = owners[order]
+    first = np.ones(len(grams), dtype=bool)
+    first[1:] = (grams[1:] != grams[:-1]) | (owners[1:] != owners[:-1])
+    return grams[first], owners[first]
+
+
+class TextIndex:
+    """ Lines of a column whose value starts with or contains a text.
+
+    The values are converted to text and the case is ignored. The distinct
+    texts (keys) are sorted: the keys starting with a text are consecutive
+    and found by a binary search. For each n-gram (sequence of 1 to N_GRAM
+    characters) of the keys, the index keeps the list of the keys containing
+    it: the keys containing a text have all its n-grams, they are found by
+    intersecting these lists (and checked if the text is longer than
+    N_GRAM).
+
+    The search is incremental: when the user types one more character, the
+    keys containing the new text are searched among the keys found for the
+    previous one.
+
+    **Parameters**
+
+    - values:
+        values of the column (type pandas.core.series.Series or list)
+
+    **Attributes**
+
+    - n_elem:
+        number of lines
+    - n_values:
+        number of distinct texts
+
+    **Methods**
+
+    - find_prefix(text):
+        gives the lines whose value starts with text (numpy array of int, in
+        increasing order)
+    - find_substring(text):
+        gives the lines whose value contains text (numpy array of int, in
+        increasing order)
+    - find(text, mode='substring'):
+        find_prefix (mode 'prefix') or find_substring (mode 'substring')
+    - updated(flag, ind, new_values, n_elem):
+        gives the index of the column updated by update_categorical_header
+        with the flag 'perm' or 'remove', or with the flags 'chg' or 'new'
+        when the new values are texts that are already indexed
+    """
+
+    def __init__(self, values):
+        """Constructor of the class TextIndex"""
+        values = pd.Series(values, dtype=object)
+        present = values.notnull().values
+        key_codes, keys = pd.factorize(values[present].map(_text_key),
+                                       sort=True)
+        codes = np.full(len(values), -1, dtype=np.int64)
+        codes[present] = key_codes
+        self._codes = codes
+        self._keys = np.asarray(keys, dtype=object)
+        texts = np.array(self._keys.tolist(), dtype=str)
+        width = texts.dtype.itemsize // 4
+        self._chars = texts.view(np.uint32).reshape(len(texts), width) \
+            if 0 < width <= _MAX_WIDTH else None
+        grams, owners = _grams(self._keys)
+        self._grams, starts = np.unique(grams, return_index=True)
+        self._gram_starts = np.append(starts, len(grams))
+        self._owners = owners
+        self._order = None
+        self._starts = None
+        self._last = None
+        self._group()
+
+    @classmethod
+    def _from_codes(cls, codes, index):
+        obj = cls.__new__(cls)
+        obj._codes = codes
+        obj._keys = index._keys
+        obj._chars = index._chars
+        obj._grams = index._grams
+        obj._gram_starts = index._gram_starts
+        obj._owners = index._owners
+        obj._order = None
+        obj._starts = None
+        obj._last = None
+        return obj
+
+    @property
+    def n_elem(self):
+        """number of lines"""
+        return len(self._codes)
+
+    @property
+    def n_values(self):
+        """number of distinct texts"""
+        return len(self._keys)
+
+    def _group(self):
+        """sorts the lines by key (once after each update)"""
+        if self._order is None:
+            indexed = self._codes >= 0
+            order = np.argsort(self._codes, kind='stable')
+            counts = np.bincount(self._codes[indexed],
+                                 minlength=len(self._keys))
+            self._order = order[len(order) - np.count_nonzero(indexed):]
+            self._starts = np.concatenate(([0], np.cumsum(counts)))
+
+    def _lines_of_range(self, first, last):
+        """gives the lines of the keys first to last - 1"""
+        self._group()
+        if self._starts[last] - self._starts[first] <= _FEW:
+            return np.sort(
+                self._order[self._starts[first]:self._starts[last]])
+        return np.flatnonzero((self._codes >= first) & (self._codes < last))
+
+    def _lines_of_keys(self, keys):
+        """gives the lines of some keys"""
+        if len(keys) <= _FEW:
+            self._group()
+            lines = [self._order[self._starts[k]:self._starts[k + 1]]
+                     for k in keys]
+            return np.sort(np.concatenate(
+                [np.zeros(0, dtype=np.int64)] + lines))
+        # many keys: one pass over the lines (the last element of found is
+        # for the missing values, of code -1)
+        found = np.zeros(len(self._keys) + 1, dtype=bool)
+        found[keys] = True
+        return np.flatnonzero(found[self._codes])
+
+    def find_prefix(self, text):
+        """gives the lines whose value starts with text"""
+        text = _check_text(text)
+        first = np.searchsorted(self._keys, text, 'left')
+        last = np.searchsorted(self._keys, text + chr(0x10ffff), 'left')
+        return self._lines_of_range(first, last)
+
+    def _posting(self, gram):
+        """gives the keys containing an n-gram"""
+        i = np.searchsorted(self._grams, gram)
+        if i == len(self._grams) or self._grams[i] != gram:
+            return np.zeros(0, dtype=np.int64)
+        return self._owners[self._gram_starts[i]:self._gram_starts[i + 1]]
+
+    def _check_keys(self, candidates, text):
+        """gives the candidates whose key contains text"""
+        if self._chars is None or len(candidates) <= _FEW:
+            keys = self._keys
+            return candidates[np.fromiter(
+                (text in keys[k] for k in candidates), dtype=bool,
+                count=len(candidates))]
+        chars = self._chars[candidates]
+        n_pos = chars.shape[1] - len(text) + 1
+        if n_pos <= 0:
+            return candidates[:0]
+        # match[k, p]: the text is at position p of the key k
+        match = np.ones((len(candidates), n_pos), dtype=bool)
+        for i, c in enumerate(text):
+            match &= chars[:, i:i + n_pos] == ord(c)
+        return candidates[match.any(axis=1)]
+
+    def _keys_containing(self, text):
+        """gives the keys containing text"""
+        last = self._last
+        if last is not None and last[0] in text and len(last[1]) <= _FEW:
+            # the user typed more: the keys are among the previous ones
+            candidates = last[1]
+            checked = False
+        else:
+            chars = [ord(c) for c in text]
+            n = min(N_GRAM, len(text))
+            postings = sorted((self._posting(_gram_code(chars[i:i + n]))
+                               for i in range(len(text) - n + 1)), key=len)
+            # the rarest n-grams first: the candidates are looked up in the
+            # (sorted) lists of keys of the others
+            candidates = postings[0]
+            for posting in postings[1:]:
+                if len(candidates) <= _FEW:
+                    break
+                found = np.searchsorted(posting, candidates)
+                found[found == len(posting)] = 0
+                candidates = candidates[posting[found] == candidates]
+            checked = len(postings) == 1
+        if not checked:
+            candidates = self._check_keys(candidates, text)
+        self._last = (text, candidates)
+        return candidates
+
+    def find_substring(self, text):
+        """gives the lines whose value contains text"""
+        text = _check_text(text)
+        if text == '':
+            return self._lines_of_range(0, len(self._keys))
+        return self._lines_of_keys(self._keys_containing(text))
+
+    def find(self, text, mode='substring'):
+        """gives the lines whose value starts with (mode 'prefix') or
+        contains (mode 'substring') text"""
+        if mode == 'prefix':
+            return self.find_prefix(text)
+        elif mode == 'substring':
+            return self.find_substring(text)
+        raise Exception("mode must be 'prefix' or 'substring'")
+
+    def _codes_of(self, new_values):
+        """gives the codes of texts that are already indexed"""
+        codes = np.empty(len(new_values), dtype=np.int64)
+        for i, v in enumerate(new_values):
+            if v is None or (isinstance(v, float) and np.isnan(v)):
+                codes[i] = -1
+                continue
+            key = _text_key(v)
+            k = np.searchsorted(self._keys, key)
+            if k == len(self._keys) or self._keys[k] != key:
+                raise IndexUpdateError("new texts must be indexed again")
+            codes[i] = k
+        return codes
+
+    def updated(self, flag, ind, new_values, n_elem):
+        """gives the index of the column after an update of the header"""
+        if n_elem != self.n_elem:
+            raise Exception("the index does not have the lines of the header")
+        if flag == 'perm':
+            return TextIndex._from_codes(self._codes[np.asarray(ind)], self)
+        elif flag == 'remove':
+            return TextIndex._from_codes(np.delete(self._codes, ind), self)
+        elif flag == 'new':
+            return TextIndex._from_codes(
+                np.concatenate((self._codes, self._codes_of(new_values))),
+                self)
+        elif flag == 'chg':
+            new_codes = self._codes.copy()
+            new_codes[np.asarray(ind, dtype=np.int64)] = \
+                self._codes_of(new_values)
+            return TextIndex._from_codes(new_codes, self)
+        raise Exception("an index can only be updated with the flags 'perm', "
+                        "'chg', 'new' or 'remove'")
@@ -0,0 +1,322 @@
+"""ingest module is a module to feed a StreamingXdata with the samples sent by
+an acquisition rig through a socket.
+
+The rig (or any producer) connects to a TCP or Unix socket and sends frames:
+a frame is the number of samples it contains (unsigned 32 bits integer,
+little-endian) followed by the samples, in the type of the stream, each
+sample being an array with the shape of the data except in the dimension of
+the stream (in C order).
+
+The frames are read by an asyncio server running in its own thread, so that
+the event loop of the display (vispy) is never blocked. The blocks of samples
+go through a bounded queue: when the stream does not keep up, the server
+stops reading the socket and the producer is slowed down by the flow control
+of the socket (backpressure). The blocks waiting in the queue are pushed
+together, so that the stream only notifies its listeners once per batch.
+
+
+This module uses:
+    - asyncio
+    - numpy as np
+    - struct
+    - threading
+
+    - stream
+
+
+There is 1 class in this module:
+
+    - **IngestServer**:
+        This class receives the frames sent to a socket and pushes the
+        samples in a StreamingXdata.
+
+There is 1 function in this module:
+    - **encode_frame**:
+        encode_frame gives the bytes of the frame of a block of samples, to
+        be sent by a producer.
+"""
+
+# Authors: Elodie Ikkache CNRS <elodie.ikkache@student.ecp.fr>
+#          Thomas Deneux CNRS <thomas.deneux@unic.cnrs-gif.fr>
+#
+# version 1.0
+# -*- coding: utf-8 -*-
+
+import asyncio
+import struct
+import threading
+
+import numpy as np
+
+import stream
+
+
+# number of samples in the frame
+FRAME_HEADER = struct.Struct('<I')
+
+
+class IngestServer:
+    """ Pushes in a StreamingXdata the samples received through a socket.
+
+    **Parameters**
+
+    - stream_xdata:
+        StreamingXdata in which the samples are pushed
+    - batch_size:
+        maximal number of samples pushed at once, the frames being split if
+        needed (type int)
+
+        (optional, default value is 4096)
+    - max_blocks:
+        maximal number of blocks waiting to be pushed, the socket is not read
+        any more when it is reached (type int)
+
+        (optional, default value is 64)
+    - deliver:
+        function called with each batch of samples (numpy array with the
+        samples along the dimension of the stream) instead of stream.push,
+        e.g. to push the samples in the thread of the display
+
+        (optional)
+
+    **Attributes**
+
+    - stream:
+        StreamingXdata in which the samples are pushed
+    - address:
+        address the server listens to: (host, port) for TCP, path for a Unix
+        socket, None if the server is not started
+    - n_frames:
+        number of frames received
+    - n_samples:
+        number of samples pushed
+    - n_batches:
+        number of batches pushed
+    - error:
+        latest error raised by a malformed frame or by the delivery of a
+        batch, or None
+
+    **Methods**
+
+    - start(address):
+        starts the server in a new thread, address being (host, port) for
+        TCP (port 0 to choose a free port) or the path of a Unix socket, and
+        returns the address it listens to
+    - stop(timeout=5):
+        pushes the blocks still in the queue and stops the server
+    - wait(n_samples, timeout=None):
+        waits until n_samples samples have been pushed, returns False if
+        timeout is reached first
+
+    *(coroutines, to use the server in an existing event loop)*
+
+    - serve(address):
+        starts listening to address
+    - aclose:
+        pushes the blocks still in the queue and stops listening
+
+    **Examples**
+
+     server = IngestServer(signal)
+
+     host, port = server.start(('127.0.0.1', 0))
+
+     server.stop()
+    """
+
+    def __init__(self, stream_xdata, batch_size=4096, max_blocks=64,
+                 deliver=None):
+        """Constructor of the class IngestServer"""
+        if not isinstance(stream_xdata, stream.StreamingXdata):
+            raise Exception("stream_xdata must be of type StreamingXdata")
+        elif not isinstance(batch_size, int) or batch_size <= 0:
+            raise Exception("batch_size must be a positive int")
+        elif not isinstance(max_blocks, int) or max_blocks <= 0:
+            raise Exception("max_blocks must be a positive int")
+        elif not (deliver is None or callable(deliver)):
+            raise Exception("deliver must be a function")
+        self._stream = stream_xdata
+        self._batch_size = batch_size
+        self._max_blocks = max_blocks
+        self._deliver = stream_xdata.push if deliver is None else deliver
+        shape = list(stream_xdata.shape())
+        del shape[stream_xdata.dim]
+        self._sample_shape = tuple(shape)
+        self._dtype = stream_xdata.data.dtype
+        self._sample_size = (int(np.prod(self._sample_shape)) *
+                             self._dtype.itemsize)
+        self._address = None
+        self._server = None
+        self._queue = None
+        self._consumer = None
+        self._loop = None
+        self._thread = None
+        self._n_frames = 0
+        self._n_samples = 0
+        self._n_batches = 0
+        self._error = None
+        self._pushed = threading.Condition()
+
+    @property
+    def stream(self):
+        """StreamingXdata in which the samples are pushed"""
+        return self._stream
+
+    @property
+    def address(self):
+        """address the server listens to"""
+        return self._address
+
+    @property
+    def n_frames(self):
+        """number of frames received"""
+        return self._n_frames
+
+    @property
+    def n_samples(self):
+        """number of samples pushed"""
+        return self._n_samples
+
+    @property
+    def n_batches(self):
+        """number of batches pushed"""
+        return self._n_batches
+
+    @property
+    def error(self):
+        """latest error raised by a malformed frame or by the delivery of a
+        batch, or None"""
+        return self._error
+
+    async def serve(self, address):
+        """starts listening to address"""
+        if self._server is not None:
+            raise Exception("the server is already started")
+        self._queue = asyncio.Queue(self._max_blocks)
+        self._consumer = asyncio.ensure_future(self._consume())
+        if isinstance(address, str):
+            self._server = await asyncio.start_unix_server(self._handle,
+                                                           address)
+            self._address = address
+        elif isinstance(address, tuple) and len(address) == 2:
+            self._server = await asyncio.start_server(self._handle,
+                                                      address[0], address[1])
+            self._address = self._server.sockets[0].getsockname()[:2]
+        else:
+            raise Exception("address must be (host, port) or the path of a "
+                            "Unix socket")
+        return self._address
+
+    async def aclose(self):
+        """pushes the blocks still in the queue and stops listening"""
+        if self._server is None:
+            return
+        self._server.close()
+        await self._server.wait_closed()
+        await self._queue.join()
+        self._consumer.cancel()
+        self._server = None
+        self._address = None
+
+    async def _handle(self, reader, writer):
+        """reads the frames of a connection"""
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(FRAME_HEADER.size)
+                except asyncio.IncompleteReadError as e:
+                    if e.partial:
+                        raise Exception("the connection was closed in the "
+                                        "middle of a frame")
+                    break
+                n_sample, = FRAME_HEADER.unpack(header)
+                payload = await reader.readexactly(n_sample *
+                                                   self._sample_size)
+                block = np.frombuffer(payload, dtype=self._dtype).reshape(
+                    (n_sample,) + self._sample_shape)
+                self._n_frames += 1
+                # waits while the queue is full: the socket is not read
+                await self._queue.put(block)
+        except Exception as e:
+            self._error = e
+        finally:
+            writer.close()
+
+    async def _consume(self):
+        """pushes the blocks of the queue, by batches of at most batch_size
+        samples"""
+        # samples of a block that did not fit in the previous batch
+        rest = None
+        while True:
+            if rest is None:
+                rest = await self._queue.get()
+            blocks = []
+            n_sample = 0
+            # number of blocks of the queue whose last samples are in the
+            # batch
+            n_done = 0
+            while True:
+                n_free = self._batch_size - n_sample
+                blocks.append(rest[:n_free])
+                n_sample += len(blocks[-1])
+                if len(rest) > n_free:
+                    # the block is split, the rest begins the next batch
+                    rest = rest[n_free:]
+                    break
+                rest = None
+                n_done += 1
+                if n_sample >= self._batch_size or self._queue.empty():
+                    break
+                rest = self._queue.get_nowait()
+            batch = np.concatenate(blocks, axis=0)
+            try:
+                if n_sample:
+                    self._deliver(np.moveaxis(batch, 0, self._stream.dim))
+                    self._n_batches += 1
+                    # only the samples that were delivered are counted
+                    with self._pushed:
+                        self._n_samples += n_sample
+                        self._pushed.notify_all()
+            except Exception as e:
+                # the next batches are still delivered
+                self._error = e
+            finally:
+                for _ in range(n_done):
+                    self._queue.task_done()
+
+    def start(self, address):
+        """starts the server in a new thread"""
+        if self._thread is not None:
+            raise Exception("the server is already started")
+        self._loop = asyncio.new_event_loop()
+        started = self._loop.run_until_complete(self.serve(address))
+        self._thread = threading.Thread(target=self._loop.run_forever,
+                                        name='xplor-ingest', daemon=True)
+        self._thread.start()
+        return started
+
+    def stop(self, timeout=5):
+        """pushes the blocks still in the queue and stops the server"""
+        if self._thread is None:
+            return
+        future = asyncio.run_coroutine_threadsafe(self.aclose(), self._loop)
+        future.result(timeout)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._loop.close()
+        self._thread = None
+        self._loop = None
+
+    def wait(self, n_samples, timeout=None):
+        """waits until n_samples samples have been pushed"""
+        with self._pushed:
+            return self._pushed.wait_for(lambda: self._n_samples >= n_samples,
+                                         timeout)
+
+
+def encode_frame(samples, dim=0):
+    """gives the bytes of the frame of a block of samples (samples along
+    dimension dim)"""
+    samples = np.moveaxis(np.asarray(samples), dim, 0)
+    return (FRAME_HEADER.pack(samples.shape[0]) +
+            np.ascontiguousarray(samples).tobytes())
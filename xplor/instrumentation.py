@@ -0,0 +1,503 @@
+"""instrumentation module is a module to measure where the time and the
+memory go in the operations on the data.
+
+The methods of xdata that create or modify data and headers (update_xdata,
+modify_dimensions, copy, the constructors of the headers...) are decorated
+with instrumented. When the instrumentation is enabled, each call records in
+the registry its wall time, the bytes allocated during the call (if memory
+tracing is enabled, with tracemalloc) and the bytes of the new data buffer it
+returns (bytes copied). The records are grouped by operation and by flag
+('chg', 'new', 'perm'...).
+
+The instrumentation is disabled by default: a decorated method then only
+checks a boolean before calling the original method.
+
+The display measures its frames with a FrameProfiler: the time of each
+stage of the rendering (slice received, decimation, upload of the buffers to
+the GPU, draw, swap) is kept for the latest frames, to tell whether a slow
+frame is spent preparing the arrays with numpy or in OpenGL.
+
+
+This module uses:
+    - collections
+    - contextlib
+    - functools
+    - inspect
+    - json
+    - logging
+    - threading
+    - time
+    - tracemalloc
+    - numpy as np
+
+
+There are 2 classes in this module:
+
+    - **Registry**:
+        This class stores the call counts, times and bytes of the
+        instrumented operations.
+    - **FrameProfiler**:
+        This class keeps the time of each stage of the latest frames
+        rendered by the display.
+
+There are 6 functions in this module:
+    - **instrumented**:
+        instrumented is a decorator recording the calls of a function in the
+        registry.
+    - **get_registry**:
+        get_registry gives the Registry instance shared by the whole process.
+    - **enable**:
+        enable starts recording the calls.
+    - **disable**:
+        disable stops recording the calls.
+    - **start_logging**:
+        start_logging writes a summary of the registry in the log
+        periodically.
+    - **stop_logging**:
+        stop_logging stops writing the summary in the log.
+"""
+
+# Authors: Elodie Ikkache CNRS <elodie.ikkache@student.ecp.fr>
+#          Thomas Deneux CNRS <thomas.deneux@unic.cnrs-gif.fr>
+#
+# version 1.0
+# -*- coding: utf-8 -*-
+
+import collections
+import contextlib
+import functools
+import inspect
+import json
+import logging
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+
+logger = logging.getLogger('xplor.instrumentation')
+
+
+class Registry:
+    """ Call counts, times and bytes of the instrumented operations.
+
+    Each record is identified by the name of the operation (e.g.
+    'Xdata.update_xdata') and the flag it was called with (None for the
+    operations without flag).
+
+    **Attributes**
+
+    - enabled:
+        True if the calls are recorded
+    - trace_memory:
+        True if the bytes allocated are measured (with tracemalloc, which
+        slows down all the allocations of python)
+
+    **Methods**
+
+    - record(operation, flag, duration, allocated, copied):
+        adds a call to the record of (operation, flag)
+    - get(operation, flag=None):
+        gives the record of (operation, flag) as a dictionary {'count',
+        'time', 'allocated', 'copied'}, or None if it was never called
+    - report:
+        gives the list of all the records, as dictionaries {'operation',
+        'flag', 'count', 'time', 'allocated', 'copied'}, by decreasing time
+    - summary:
+        gives a one line summary of the records
+    - reset:
+        forgets all the records
+    """
+
+    def __init__(self):
+        """Constructor of the class Registry"""
+        self._enabled = False
+        self._trace_memory = False
+        # True if tracemalloc was started by enable (and not by the user)
+        self._started_tracing = False
+        self._lock = threading.Lock()
+        self._records = {}
+
+    @property
+    def enabled(self):
+        """True if the calls are recorded"""
+        return self._enabled
+
+    @property
+    def trace_memory(self):
+        """True if the bytes allocated are measured"""
+        return self._trace_memory
+
+    def record(self, operation, flag, duration, allocated, copied):
+        """adds a call to the record of (operation, flag)"""
+        with self._lock:
+            record = self._records.get((operation, flag))
+            if record is None:
+                record = {'count': 0, 'time': 0., 'allocated': 0,
+                          'copied': 0}
+                self._records[(operation, flag)] = record
+            record['count'] += 1
+            record['time'] += duration
+            record['allocated'] += allocated
+            record['copied'] += copied
+
+    def get(self, operation, flag=None):
+        """gives the record of (operation, flag)"""
+        with self._lock:
+            record = self._records.get((operation, flag))
+            return None if record is None else dict(record)
+
+    def report(self):
+        """gives the list of all the records, by decreasing time"""
+        with self._lock:
+            rows = [dict(record, operation=operation, flag=flag)
+                    for (operation, flag), record in self._records.items()]
+        rows.sort(key=lambda row: -row['time'])
+        return rows
+
+    def summary(self):
+        """gives a one line summary of the records"""
+        parts = []
+        for row in self.report():
+            name = row['operation']
+            if row['flag'] is not None:
+                name += "[" + str(row['flag']) + "]"
+            parts.append("%s: %d calls %.3fs %s allocated %s copied"
+                         % (name, row['count'], row['time'],
+                            _format_bytes(row['allocated']),
+                            _format_bytes(row['copied'])))
+        if not parts:
+            return "no instrumented call"
+        return "; ".join(parts)
+
+    def reset(self):
+        """forgets all the records"""
+        with self._lock:
+            self._records.clear()
+
+
+def _format_bytes(n):
+    """gives a readable size"""
+    for unit in ['B', 'kB', 'MB', 'GB']:
+        if abs(n) < 1024 or unit == 'GB':
+            return ("%d%s" if unit == 'B' else "%.1f%s") % (n, unit)
+        n /= 1024
+
+
+def _copied_bytes(obj, result):
+    """gives the bytes of the data buffer of result that is not shared with
+    the data of obj"""
+    if isinstance(result, tuple) and result:
+        # update_xdata and modify_dimensions return (new_xdata, flag)
+        result = result[0]
+    data = getattr(result, '_data', None)
+    if not isinstance(data, np.ndarray):
+        return 0
+    source = getattr(obj, '_data', None)
+    # a bounds check is enough to tell a copy from a view, and unlike
+    # np.shares_memory its cost does not depend on the strides
+    if isinstance(source, np.ndarray) and np.may_share_memory(data, source):
+        return 0
+    return data.nbytes
+
+
+_registry = Registry()
+
+
+def get_registry():
+    """gives the Registry instance shared by the whole process"""
+    return _registry
+
+
+def instrumented(operation, flag=None):
+    """decorator recording the calls of a method in the registry, flag being
+    the name of the argument whose value distinguishes the records (e.g.
+    'flag' for update_xdata)"""
+    def decorator(fun):
+        signature = None if flag is None else inspect.signature(fun)
+
+        @functools.wraps(fun)
+        def wrapper(*args, **kwargs):
+            if not _registry._enabled:
+                return fun(*args, **kwargs)
+            flag_value = None
+            if signature is not None:
+                try:
+                    arguments = signature.bind(*args, **kwargs)
+                    arguments.apply_defaults()
+                    flag_value = arguments.arguments[flag]
+                except (TypeError, KeyError):
+                    # the call itself will raise the error
+                    pass
+            tracing = _registry._trace_memory and tracemalloc.is_tracing()
+            if tracing:
+                before = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            result = fun(*args, **kwargs)
+            duration = time.perf_counter() - start
+            allocated = 0
+            if tracing:
+                # memory still allocated after the call (e.g. the new
+                # arrays), nested calls do not disturb each other
+                allocated = max(0, tracemalloc.get_traced_memory()[0] -
+                                before)
+            _registry.record(operation, flag_value, duration, allocated,
+                             _copied_bytes(args[0] if args else None,
+                                           result))
+            return result
+        return wrapper
+    return decorator
+
+
+def enable(trace_memory=False):
+    """starts recording the calls (and measuring the bytes allocated if
+    trace_memory is True)"""
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _registry._started_tracing = True
+    _registry._trace_memory = trace_memory
+    _registry._enabled = True
+
+
+def disable():
+    """stops recording the calls"""
+    _registry._enabled = False
+    # the tracing started by the user goes on
+    if _registry._started_tracing and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _registry._started_tracing = False
+    _registry._trace_memory = False
+
+
+class FrameProfiler:
+    """ Time of each stage of the latest frames rendered by the display.
+
+    A frame goes through the stages 'slice' (the slice to display is
+    received), 'decimation' (the points are reduced to the resolution of the
+    screen), 'upload' (the buffers are sent to the GPU), 'draw' and 'swap'.
+    The first two are spent in numpy, the last three in OpenGL. A stage that
+    is not run in a frame counts as 0.
+
+    **Parameters**
+
+    - n_frames:
+        number of frames kept (type int)
+
+        (optional, default value is 300)
+
+    **Attributes**
+
+    - n_frames:
+        number of frames kept
+    - frames:
+        list of the latest frames, as dictionaries {stage: seconds, 'total':
+        seconds}
+    - in_frame:
+        True if a frame is started and not ended
+
+    **Methods**
+
+    - start_frame:
+        starts measuring a frame
+    - stage(name):
+        context manager measuring a stage of the current frame
+    - record(name, duration):
+        adds the time of a stage measured elsewhere to the current frame
+    - end_frame:
+        ends the current frame and keeps its times
+    - cancel_frame:
+        forgets the current frame, if any
+    - add_hook(fun):
+        fun(stage, duration) will be called at the end of each stage ('total'
+        for the whole frame)
+    - remove_hook(fun):
+        stops calling fun
+    - histogram(stage='total'):
+        gives the histogram (counts, edges in seconds) of the times of the
+        stage on the latest frames, the edges being logarithmic from 0.1 ms
+        to 1 s
+    - statistics:
+        gives for each stage and for the groups 'numpy' and 'gl' the
+        dictionary {'mean', 'median', 'p95', 'max'} in seconds
+    - overlay_text:
+        gives a short text of the statistics, to be displayed on the canvas
+    - dump(path):
+        writes the frames and the statistics in a JSON file
+    - reset:
+        forgets the frames
+
+    **Examples**
+
+     profiler.start_frame()
+
+     with profiler.stage('decimation'):
+         ...
+
+     profiler.end_frame()
+    """
+
+    STAGES = ['slice', 'decimation', 'upload', 'draw', 'swap']
+    GROUPS = {'numpy': ['slice', 'decimation'],
+              'gl': ['upload', 'draw', 'swap']}
+    EDGES = np.logspace(-4, 0, 25)
+
+    def __init__(self, n_frames=300):
+        """Constructor of the class FrameProfiler"""
+        if not isinstance(n_frames, int) or n_frames <= 0:
+            raise Exception("n_frames must be a positive int")
+        self._n_frames = n_frames
+        self._frames = collections.deque(maxlen=n_frames)
+        self._current = None
+        self._start = None
+        self._hooks = []
+
+    @property
+    def n_frames(self):
+        """number of frames kept"""
+        return self._n_frames
+
+    @property
+    def frames(self):
+        """list of the latest frames"""
+        return [dict(frame) for frame in self._frames]
+
+    @property
+    def in_frame(self):
+        """True if a frame is started and not ended"""
+        return self._current is not None
+
+    def start_frame(self):
+        """starts measuring a frame"""
+        self._current = dict.fromkeys(FrameProfiler.STAGES, 0.)
+        self._start = time.perf_counter()
+
+    def record(self, name, duration):
+        """adds the time of a stage measured elsewhere to the current frame"""
+        if name not in FrameProfiler.STAGES:
+            raise Exception("the stage must be 'slice', 'decimation', "
+                            "'upload', 'draw' or 'swap'")
+        elif self._current is None:
+            raise Exception("no frame is started")
+        self._current[name] += duration
+        for fun in list(self._hooks):
+            fun(name, duration)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """measures a stage of the current frame"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def end_frame(self):
+        """ends the current frame and keeps its times"""
+        if self._current is None:
+            raise Exception("no frame is started")
+        frame = self._current
+        frame['total'] = time.perf_counter() - self._start
+        self._frames.append(frame)
+        self._current = None
+        for fun in list(self._hooks):
+            fun('total', frame['total'])
+        return frame
+
+    def cancel_frame(self):
+        """forgets the current frame, if any"""
+        self._current = None
+
+    def add_hook(self, fun):
+        """fun(stage, duration) will be called at the end of each stage"""
+        self._hooks.append(fun)
+
+    def remove_hook(self, fun):
+        """stops calling fun"""
+        self._hooks.remove(fun)
+
+    def _times(self, stage):
+        if stage in FrameProfiler.GROUPS:
+            return np.array([sum(f[s] for s in FrameProfiler.GROUPS[stage])
+                             for f in self._frames])
+        elif stage in FrameProfiler.STAGES or stage == 'total':
+            return np.array([f[stage] for f in self._frames])
+        raise Exception("unknown stage")
+
+    def histogram(self, stage='total'):
+        """gives the histogram (counts, edges) of the times of the stage"""
+        # the times out of the edges are counted in the first or last bin
+        times = np.clip(self._times(stage), FrameProfiler.EDGES[0],
+                        FrameProfiler.EDGES[-1])
+        return np.histogram(times, FrameProfiler.EDGES)
+
+    def statistics(self):
+        """gives for each stage the dictionary {'mean', 'median', 'p95',
+        'max'}"""
+        statistics = {}
+        if not self._frames:
+            return statistics
+        for stage in FrameProfiler.STAGES + list(FrameProfiler.GROUPS) + \
+                ['total']:
+            times = self._times(stage)
+            statistics[stage] = {'mean': float(times.mean()),
+                                 'median': float(np.median(times)),
+                                 'p95': float(np.percentile(times, 95)),
+                                 'max': float(times.max())}
+        return statistics
+
+    def overlay_text(self):
+        """gives a short text of the statistics"""
+        statistics = self.statistics()
+        if not statistics:
+            return "no frame"
+        total = statistics['total']
+        lines = ["%d frames: %.1f ms (p95 %.1f ms)"
+                 % (len(self._frames), total['median'] * 1e3,
+                    total['p95'] * 1e3),
+                 "numpy %.1f ms, gl %.1f ms"
+                 % (statistics['numpy']['median'] * 1e3,
+                    statistics['gl']['median'] * 1e3)]
+        lines += ["%s %.1f ms" % (stage, statistics[stage]['median'] * 1e3)
+                  for stage in FrameProfiler.STAGES]
+        return "\n".join(lines)
+
+    def dump(self, path):
+        """writes the frames and the statistics in a JSON file"""
+        counts, edges = self.histogram()
+        with open(path, 'w') as f:
+            json.dump({'frames': self.frames,
+                       'statistics': self.statistics(),
+                       'histogram': {'counts': counts.tolist(),
+                                     'edges': edges.tolist()}}, f, indent=1)
+
+    def reset(self):
+        """forgets the frames"""
+        self._frames.clear()
+
+
+_logging_stopped = None
+
+
+def start_logging(interval=60., level=logging.INFO):
+    """writes the summary of the registry in the log every interval
+    seconds"""
+    global _logging_stopped
+    stop_logging()
+    stopped = threading.Event()
+
+    def log():
+        while not stopped.wait(interval):
+            logger.log(level, _registry.summary())
+
+    _logging_stopped = stopped
+    threading.Thread(target=log, name='xplor-instrumentation',
+                     daemon=True).start()
+
+
+def stop_logging():
+    """stops writing the summary of the registry in the log"""
+    global _logging_stopped
+    if _logging_stopped is not None:
+        _logging_stopped.set()
+        _logging_stopped = None
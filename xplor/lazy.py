@@ -0,0 +1,568 @@
+"""lazy module is a module to describe the computation of a slice of the data
+as a graph of operations, which is optimized before being evaluated.
+
+Going from the data to the image on the screen takes several operations
+(filters, zoom, binning, elementwise transforms...). Computing them one
+after the other creates a full intermediate array at each step, even when
+only a small part of the result is displayed. A LazyArray only records the
+operations:
+    - selections of elements along a dimension (int, slice or list of
+      elements),
+    - reductions of dimensions (mean, sum, min, max...),
+    - binning of consecutive elements (as in the binding step of a zoom),
+    - elementwise operations (arithmetic with numbers or other LazyArrays,
+      numpy functions),
+and when the result is asked (for a region, e.g. the viewport), the graph is
+optimized:
+    - consecutive selections on a dimension are merged into one,
+    - selections are moved before the reductions, the binnings and the
+      elementwise operations (a window of bins becomes a window of the
+      elements that are binned), so that they are applied to the data
+      itself and only the needed part of the data is read,
+    - consecutive reductions with the same method are merged.
+The reductions and binnings are computed in the pool of threads of the
+parallel module.
+
+
+This module uses:
+    - abc
+    - numbers
+    - numpy as np
+
+    - bitset
+    - parallel
+    - xdata
+
+
+There is 1 class in this module:
+
+    - **LazyArray**:
+        This class records operations on an array and computes the result
+        (or a region of it) from an optimized graph.
+"""
+
+# Authors: Elodie Ikkache CNRS <elodie.ikkache@student.ecp.fr>
+#          Thomas Deneux CNRS <thomas.deneux@unic.cnrs-gif.fr>
+#
+# version 1.0
+# -*- coding: utf-8 -*-
+
+import numbers
+# _Node is abstract, each operation of the graph is a subclass
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+import bitset
+import parallel
+import xdata
+
+
+# reductions that can be computed in two steps along different dimensions
+_SEPARABLE = ['mean', 'sum', 'min', 'max', 'nansum', 'nanmin', 'nanmax']
+
+
+def _range_to_slice(r):
+    """gives the slice of a range"""
+    if len(r) == 0:
+        return slice(0, 0)
+    stop = r.start + len(r) * r.step
+    return slice(r.start, stop if stop >= 0 else None, r.step)
+
+
+def _check_index(index, n):
+    """gives the index normalized (slice with positive bounds, int in
+    [0, n[, or numpy array of int)"""
+    if isinstance(index, (bool, np.bool_)):
+        raise Exception("index must be an int, a slice or a list of int")
+    if isinstance(index, numbers.Integral):
+        try:
+            return range(n)[index]
+        except IndexError:
+            raise Exception("index must be in [-n_elem, n_elem[")
+    elif isinstance(index, slice):
+        return _range_to_slice(range(n)[index])
+    index = np.asarray(index)
+    if index.ndim != 1 or (len(index) and index.dtype.kind not in 'iu'):
+        raise Exception("index must be an int, a slice or a list of int")
+    index = index.astype(np.intp)
+    if len(index) and (index.min() < -n or index.max() >= n):
+        raise Exception("index must be in [-n_elem, n_elem[")
+    return index % n if n else index
+
+
+def _compose(n, first, second):
+    """gives the index equivalent to selecting second after first, on a
+    dimension of n elements (first is not an int)"""
+    if isinstance(first, slice):
+        selected = range(n)[first]
+        if isinstance(second, slice):
+            return _range_to_slice(selected[second])
+        elif isinstance(second, numbers.Integral):
+            return selected[second]
+        return np.asarray(selected, dtype=np.intp)[second]
+    selected = first[second]
+    if isinstance(second, numbers.Integral):
+        return int(selected)
+    return selected
+
+
+def _is_window(index):
+    """True if index is a slice of consecutive elements"""
+    return isinstance(index, slice) and index.step in (None, 1)
+
+
+class _Node(ABC):
+    """a node of the graph: its shape, the nodes it is computed from and how
+    it is computed"""
+
+    children = ()
+
+    @abstractmethod
+    def evaluate(self, context):
+        """gives the array of the node (context counts the elements read)"""
+        pass
+
+    def _read(self, context, child, array):
+        """counts the elements read from the data"""
+        if _is_view(child):
+            context['n_read'] += array.size
+        return array
+
+
+class _Source(_Node):
+    def __init__(self, array):
+        self.array = array
+        self.shape = array.shape
+
+    def evaluate(self, context):
+        return self.array
+
+    def describe(self):
+        return "data %s" % (self.shape,)
+
+
+class _Select(_Node):
+    def __init__(self, child, axis, index):
+        self.child = child
+        self.children = (child,)
+        self.axis = axis
+        self.index = index
+        n = child.shape[axis]
+        if isinstance(index, numbers.Integral):
+            self.shape = child.shape[:axis] + child.shape[axis + 1:]
+        else:
+            length = len(range(n)[index]) if isinstance(index, slice) \
+                else len(index)
+            self.shape = child.shape[:axis] + (length,) + \
+                child.shape[axis + 1:]
+
+    def evaluate(self, context):
+        array = self.child.evaluate(context)
+        index = [slice(None)] * array.ndim
+        index[self.axis] = self.index
+        result = array[tuple(index)]
+        if isinstance(self.index, np.ndarray) and _is_view(self.child):
+            # only the selected elements are read
+            context['n_read'] += result.size
+        return result
+
+    def describe(self):
+        index = self.index
+        if isinstance(index, np.ndarray):
+            index = "%d elements" % len(index)
+        elif isinstance(index, slice):
+            index = "%s:%s" % (index.start, index.stop) + \
+                (":%d" % index.step if index.step not in (None, 1) else "")
+        return "select %s on dimension %d" % (index, self.axis)
+
+
+class _Reduce(_Node):
+    def __init__(self, child, axes, method):
+        self.child = child
+        self.children = (child,)
+        self.axes = tuple(sorted(axes))
+        self.method = method
+        self.shape = tuple(n for a, n in enumerate(child.shape)
+                           if a not in self.axes)
+        # dimension of the child for each dimension of the result
+        self.kept = [a for a in range(len(child.shape))
+                     if a not in self.axes]
+
+    def evaluate(self, context):
+        array = self._read(context, self.child,
+                           self.child.evaluate(context))
+        return np.asarray(parallel.reduce(np.asarray(array), self.axes,
+                                          self.method))
+
+    def describe(self):
+        return "%s over dimensions %s" % (self.method, list(self.axes))
+
+
+class _Bin(_Node):
+    def __init__(self, child, axis, step, method):
+        self.child = child
+        self.children = (child,)
+        self.axis = axis
+        self.step = step
+        self.method = method
+        n = child.shape[axis]
+        self.shape = child.shape[:axis] + (-(-n // step),) + \
+            child.shape[axis + 1:]
+
+    def evaluate(self, context):
+        array = self._read(context, self.child,
+                           self.child.evaluate(context))
+        return parallel.bin_reduce(np.asarray(array), self.axis, self.step,
+                                   self.method)
+
+    def describe(self):
+        return "%s of %d elements on dimension %d" % (self.method, self.step,
+                                                       self.axis)
+
+
+class _Elementwise(_Node):
+    def __init__(self, fun, operands, name):
+        self.fun = fun
+        self.operands = operands
+        self.children = tuple(o for o in operands if isinstance(o, _Node))
+        self.shape = self.children[0].shape
+        self.name = name
+
+    def evaluate(self, context):
+        values = [self._read(context, o, o.evaluate(context))
+                  if isinstance(o, _Node) else o for o in self.operands]
+        return self.fun(*values)
+
+    def describe(self):
+        return self.name
+
+
+def _is_view(node):
+    """True if the node gives a view of the data (no element is read)"""
+    while isinstance(node, _Select):
+        if isinstance(node.index, np.ndarray):
+            return False
+        node = node.child
+    return isinstance(node, _Source)
+
+
+def _select(node, axis, index):
+    """gives the node selecting index on dimension axis of node, the
+    selection being moved as close as possible to the data"""
+    if isinstance(node, _Select) and node.axis == axis and \
+            not isinstance(node.index, numbers.Integral):
+        # two selections on the same dimension are merged
+        n = node.child.shape[axis]
+        return _select(node.child, axis, _compose(n, node.index, index))
+
+    elif isinstance(node, _Select) and (
+            isinstance(node.index, numbers.Integral) or
+            (isinstance(node.index, np.ndarray) and
+             not isinstance(index, np.ndarray))):
+        # the selections on the other dimensions are made first (the view is
+        # taken before the copy of the elements of a list)
+        child_axis = axis
+        if isinstance(node.index, numbers.Integral) and axis >= node.axis:
+            child_axis += 1
+        inner_axis = node.axis
+        if isinstance(index, numbers.Integral) and child_axis < node.axis:
+            inner_axis -= 1
+        return _Select(_select(node.child, child_axis, index), inner_axis,
+                       node.index)
+
+    elif isinstance(node, _Reduce):
+        # a dimension of the result is a dimension of the data that is not
+        # reduced: it is selected before the reduction
+        child_axis = node.kept[axis]
+        axes = node.axes
+        if isinstance(index, numbers.Integral):
+            axes = [a - 1 if a > child_axis else a for a in axes]
+        return _Reduce(_select(node.child, child_axis, index), axes,
+                       node.method)
+
+    elif isinstance(node, _Bin):
+        if axis != node.axis:
+            bin_axis = node.axis
+            if isinstance(index, numbers.Integral) and axis < bin_axis:
+                bin_axis -= 1
+            return _Bin(_select(node.child, axis, index), bin_axis,
+                        node.step, node.method)
+        n = node.child.shape[axis]
+        if _is_window(index) or isinstance(index, numbers.Integral):
+            # a window of bins is computed from the window of the elements
+            # in these bins
+            if isinstance(index, numbers.Integral):
+                start, stop = index, index + 1
+            else:
+                start, stop = index.start, index.stop
+            elements = slice(start * node.step, min(stop * node.step, n))
+            binned = _Bin(_select(node.child, axis, elements), axis,
+                          node.step, node.method)
+            if isinstance(index, numbers.Integral):
+                return _Select(binned, axis, 0)
+            return binned
+
+    elif isinstance(node, _Elementwise):
+        operands = [_select(o, axis, index) if isinstance(o, _Node) else o
+                    for o in node.operands]
+        return _Elementwise(node.fun, operands, node.name)
+
+    return _Select(node, axis, index)
+
+
+def _optimize(node):
+    """gives an equivalent graph, in which the selections are applied first"""
+    if isinstance(node, _Source):
+        return node
+    elif isinstance(node, _Select):
+        return _select(_optimize(node.child), node.axis, node.index)
+    elif isinstance(node, _Reduce):
+        child = _optimize(node.child)
+        if isinstance(child, _Reduce) and child.method == node.method and \
+                node.method in _SEPARABLE:
+            # the two reductions are made at once
+            axes = list(child.axes) + [child.kept[a] for a in node.axes]
+            return _Reduce(child.child, axes, node.method)
+        return _Reduce(child, node.axes, node.method)
+    elif isinstance(node, _Bin):
+        return _Bin(_optimize(node.child), node.axis, node.step, node.method)
+    elif isinstance(node, _Elementwise):
+        return _Elementwise(node.fun, [_optimize(o) if isinstance(o, _Node)
+                                       else o for o in node.operands],
+                            node.name)
+    raise Exception("unknown node")
+
+
+def _describe(node, depth=0):
+    lines = ["    " * depth + node.describe()]
+    for child in node.children:
+        lines += _describe(child, depth + 1)
+    return lines
+
+
+class LazyArray:
+    """ Operations on an array, computed when the result is asked.
+
+    Each operation gives a new LazyArray, the data is not read until compute
+    is called.
+
+    **Parameters**
+
+    - data:
+        the data (type numpy.ndarray or xdata.Xdata with dense data)
+
+    **Attributes**
+
+    - shape:
+        shape of the result
+    - ndim:
+        number of dimensions of the result
+    - n_read:
+        number of elements of the data read by the last call of compute
+
+    **Methods**
+
+    - select(axis, index), lazy_array[index]:
+        selects elements along a dimension (int: the dimension is removed,
+        slice or list of int: it is kept), lazy_array[index] selects on the
+        first dimensions
+    - filter(axis, selection):
+        averages the selected elements of a dimension (list of int or
+        bitset.Bitset), which is removed, as a filter does
+    - reduce(axis, method='mean'):
+        reduces one or several dimensions (method as in
+        parallel.ThreadReducer.reduce)
+    - bin(axis, step, method='mean'):
+        reduces the groups of step consecutive elements of a dimension
+    - apply(fun, name=None):
+        applies an elementwise numpy function (e.g. np.log)
+    - +, -, *, /, ** and unary -, numpy ufuncs (np.log(lazy_array)):
+        elementwise operations with numbers or LazyArrays of the same shape
+    - optimized():
+        gives the LazyArray computed from the optimized graph
+    - plan():
+        gives a description of the optimized graph (one operation per line,
+        the operations it is computed from being indented below it)
+    - compute(region=None):
+        computes the result, or the region of it (same as lazy_array[region]
+        .compute())
+    """
+
+    def __init__(self, data):
+        """Constructor of the class LazyArray"""
+        if isinstance(data, xdata.Xdata):
+            if data.is_sparse:
+                raise Exception("only dense data can be used")
+            data = data.data
+        if not isinstance(data, np.ndarray):
+            raise Exception("data must be of type numpy.ndarray or Xdata")
+        self._node = _Source(data)
+        self._n_read = 0
+
+    @classmethod
+    def _from_node(cls, node):
+        obj = cls.__new__(cls)
+        obj._node = node
+        obj._n_read = 0
+        return obj
+
+    @property
+    def shape(self):
+        """shape of the result"""
+        return self._node.shape
+
+    @property
+    def ndim(self):
+        """number of dimensions of the result"""
+        return len(self._node.shape)
+
+    @property
+    def n_read(self):
+        """number of elements of the data read by the last compute"""
+        return self._n_read
+
+    def _check_axis(self, axis):
+        if not isinstance(axis, numbers.Integral) or \
+                not -self.ndim <= axis < self.ndim:
+            raise Exception("axis must correspond to an existing dimension")
+        return int(axis) % self.ndim
+
+    def select(self, axis, index):
+        """selects elements along a dimension"""
+        axis = self._check_axis(axis)
+        index = _check_index(index, self.shape[axis])
+        return LazyArray._from_node(_Select(self._node, axis, index))
+
+    def __getitem__(self, index):
+        if not isinstance(index, tuple):
+            index = (index,)
+        if len(index) > self.ndim:
+            raise Exception("too many indices")
+        result = self
+        # the dimensions removed by the previous ints are not counted
+        axis = 0
+        for i in index:
+            result = result.select(axis, i)
+            if not isinstance(i, numbers.Integral):
+                axis += 1
+        return result
+
+    def filter(self, axis, selection):
+        """averages the selected elements of a dimension"""
+        axis = self._check_axis(axis)
+        if isinstance(selection, bitset.Bitset):
+            if selection.count == 0:
+                raise Exception("at least one element must be selected")
+            selection = selection.to_index()
+        elif not isinstance(selection, slice):
+            selection = np.asarray(selection)
+            if len(selection) == 0:
+                raise Exception("at least one element must be selected")
+            if len(selection) == 1:
+                return self.select(axis, int(selection[0]))
+        return self.select(axis, selection).reduce(axis, 'mean')
+
+    def reduce(self, axis, method='mean'):
+        """reduces one or several dimensions"""
+        if method not in parallel.REDUCTIONS:
+            raise Exception("method must be one of " +
+                            ", ".join(parallel.REDUCTIONS.keys()))
+        axes = axis if isinstance(axis, (tuple, list)) else (axis,)
+        axes = sorted(set(self._check_axis(a) for a in axes))
+        return LazyArray._from_node(_Reduce(self._node, axes, method))
+
+    def bin(self, axis, step, method='mean'):
+        """reduces the groups of step consecutive elements of a dimension"""
+        axis = self._check_axis(axis)
+        if not isinstance(step, numbers.Integral) or step < 1:
+            raise Exception("step must be a positive int")
+        if method not in parallel.REDUCTIONS:
+            raise Exception("method must be one of " +
+                            ", ".join(parallel.REDUCTIONS.keys()))
+        return LazyArray._from_node(_Bin(self._node, axis, int(step),
+                                         method))
+
+    def apply(self, fun, name=None):
+        """applies an elementwise numpy function"""
+        if not callable(fun):
+            raise Exception("fun must be a function")
+        if name is None:
+            name = getattr(fun, '__name__', 'function')
+        return LazyArray._from_node(_Elementwise(fun, [self._node], name))
+
+    def _elementwise(self, fun, other, name, reverse=False):
+        if isinstance(other, LazyArray):
+            if other.shape != self.shape:
+                raise Exception("the LazyArrays must have the same shape")
+            other = other._node
+        elif not isinstance(other, numbers.Number):
+            return NotImplemented
+        operands = [other, self._node] if reverse else [self._node, other]
+        return LazyArray._from_node(_Elementwise(fun, operands, name))
+
+    def __add__(self, other):
+        return self._elementwise(np.add, other, 'add')
+
+    def __radd__(self, other):
+        return self._elementwise(np.add, other, 'add', True)
+
+    def __sub__(self, other):
+        return self._elementwise(np.subtract, other, 'subtract')
+
+    def __rsub__(self, other):
+        return self._elementwise(np.subtract, other, 'subtract', True)
+
+    def __mul__(self, other):
+        return self._elementwise(np.multiply, other, 'multiply')
+
+    def __rmul__(self, other):
+        return self._elementwise(np.multiply, other, 'multiply', True)
+
+    def __truediv__(self, other):
+        return self._elementwise(np.true_divide, other, 'divide')
+
+    def __rtruediv__(self, other):
+        return self._elementwise(np.true_divide, other, 'divide', True)
+
+    def __pow__(self, other):
+        return self._elementwise(np.power, other, 'power')
+
+    def __neg__(self):
+        return self.apply(np.negative)
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        # numpy functions on LazyArrays (np.log(lazy_array)) are recorded
+        if method != '__call__' or kwargs or ufunc.nout != 1:
+            return NotImplemented
+        operands = []
+        for value in inputs:
+            if isinstance(value, LazyArray):
+                if value.shape != self.shape:
+                    raise Exception("the LazyArrays must have the same shape")
+                operands.append(value._node)
+            elif isinstance(value, numbers.Number):
+                operands.append(value)
+            else:
+                return NotImplemented
+        return LazyArray._from_node(_Elementwise(ufunc, operands,
+                                                 ufunc.__name__))
+
+    def optimized(self):
+        """gives the LazyArray computed from the optimized graph"""
+        return LazyArray._from_node(_optimize(self._node))
+
+    def plan(self):
+        """gives a description of the optimized graph"""
+        return "\n".join(_describe(_optimize(self._node)))
+
+    def compute(self, region=None):
+        """computes the result, or a region of it"""
+        lazy_array = self if region is None else self[region]
+        context = {'n_read': 0}
+        node = _optimize(lazy_array._node)
+        result = node.evaluate(context)
+        if _is_view(node):
+            context['n_read'] += np.size(result)
+        self._n_read = context['n_read']
+        return np.asarray(result)
@@ -0,0 +1,380 @@
+"""list_display module is a module to choose the elements selected by a
+filter, in the list of the elements of its dimension.
+
+The list of a dimension can have hundreds of thousands of elements: it is
+virtual. Only the rows visible in the list (the window) are asked to the
+header, by pages of consecutive rows read with one get_item_name(range) call,
+and the formatted labels of the latest pages are kept in a cache. Opening the
+list of a dimension, or scrolling it, thus takes a time that only depends on
+the number of visible rows, not on the size of the dimension.
+
+The user can type a text to find the elements whose label starts with or
+contains it: the search index of the labels is built in the background when
+the list is opened.
+
+The list is toolkit independent: the widget showing it asks the rows to
+display with get_rows and forwards the clicks of the user to click.
+
+
+This module uses:
+    - collections
+    - numbers
+    - numpy as np
+
+    - bitset
+    - column_index
+    - operation
+    - xdata
+
+
+There are 2 classes in this module:
+
+    - **ListModel**:
+        This class gives the formatted labels of the visible rows of the list
+        of the elements of a dimension.
+    - **ListDisplay**:
+        This class shows the elements of the dimension of a filter and
+        changes the selection of the filter when the user clicks on them.
+"""
+
+# Authors: Elodie Ikkache CNRS <elodie.ikkache@student.ecp.fr>
+#          Thomas Deneux CNRS <thomas.deneux@unic.cnrs-gif.fr>
+#
+# version 1.0
+# -*- coding: utf-8 -*-
+
+import numbers
+from collections import OrderedDict
+
+import numpy as np
+
+import bitset
+import column_index
+import operation
+import xdata
+
+
+def format_label(value):
+    """gives the text displayed for the value of an element"""
+    if value is None:
+        return ''
+    elif isinstance(value, str):
+        return value
+    elif isinstance(value, numbers.Integral) and not isinstance(value, bool):
+        return str(value)
+    elif isinstance(value, numbers.Real):
+        if np.isnan(value):
+            return ''
+        return '%.6g' % value
+    return str(value)
+
+
+class ListModel:
+    """ Formatted labels of the visible rows of a list.
+
+    The rows are the lines of a header. They are read by pages of page_size
+    consecutive lines, with one call to the get_item_name method of the
+    header for each page, the first time they are visible. The labels of the
+    last n_pages pages read are kept (the least recently used pages are
+    forgotten first).
+
+    **Parameters**
+
+    - header:
+        header of the dimension (type xdata.Header)
+    - n_visible:
+        number of rows shown at once (type int)
+
+        (optional, default value is 50)
+    - page_size:
+        number of rows read at once (type int)
+
+        (optional, default value is 256)
+    - n_pages:
+        maximal number of pages in the cache (type int)
+
+        (optional, default value is 64)
+
+    **Attributes**
+
+    - header:
+        header of the dimension
+    - n_rows:
+        number of rows of the list (n_elem of the header)
+    - first:
+        number of the first visible row
+    - n_visible:
+        number of rows shown at once
+    - n_reads:
+        number of calls to get_item_name since the creation of the list
+
+    **Methods**
+
+    - set_window(first, n_visible=None):
+        changes the visible rows (first is clipped so that the window stays
+        in the list)
+    - get_rows():
+        gives the list of the (row, label) of the visible rows
+    - get_labels(start, stop):
+        gives the labels of the rows in [start, stop[
+    - set_header(header):
+        shows the elements of another header (after an update of the data),
+        the cache is emptied
+    - clear():
+        empties the cache
+    """
+
+    def __init__(self, header, n_visible=50, page_size=256, n_pages=64):
+        """Constructor of the class ListModel"""
+        for name, value in (('n_visible', n_visible),
+                            ('page_size', page_size), ('n_pages', n_pages)):
+            if not isinstance(value, int) or value <= 0:
+                raise Exception(name + " must be a positive int")
+        self._page_size = page_size
+        self._n_pages = n_pages
+        self._n_visible = n_visible
+        self._first = 0
+        self._pages = OrderedDict()
+        self._n_reads = 0
+        self._header = None
+        self.set_header(header)
+
+    @property
+    def header(self):
+        """header of the dimension"""
+        return self._header
+
+    @property
+    def n_rows(self):
+        """number of rows of the list"""
+        return self._header.n_elem
+
+    @property
+    def first(self):
+        """number of the first visible row"""
+        return self._first
+
+    @property
+    def n_visible(self):
+        """number of rows shown at once"""
+        return self._n_visible
+
+    @property
+    def n_reads(self):
+        """number of calls to get_item_name"""
+        return self._n_reads
+
+    def set_header(self, header):
+        """shows the elements of another header"""
+        if not isinstance(header, xdata.Header):
+            raise Exception("header must be of type Header")
+        self._header = header
+        self.clear()
+        self.set_window(self._first)
+
+    def clear(self):
+        """empties the cache"""
+        self._pages.clear()
+
+    def set_window(self, first, n_visible=None):
+        """changes the visible rows"""
+        if n_visible is not None:
+            if not isinstance(n_visible, int) or n_visible <= 0:
+                raise Exception("n_visible must be a positive int")
+            self._n_visible = n_visible
+        if not isinstance(first, int):
+            raise Exception("first must be of type int")
+        self._first = max(0, min(first, self.n_rows - self._n_visible))
+
+    def _get_page(self, page):
+        """gives the labels of the rows of a page, reading them if needed"""
+        labels = self._pages.get(page)
+        if labels is not None:
+            self._pages.move_to_end(page)
+            return labels
+        start = page * self._page_size
+        stop = min(start + self._page_size, self.n_rows)
+        labels = [format_label(value) for value in
+                  self._header.get_item_name(range(start, stop))]
+        self._n_reads += 1
+        self._pages[page] = labels
+        while len(self._pages) > self._n_pages:
+            self._pages.popitem(last=False)
+        return labels
+
+    def get_labels(self, start, stop):
+        """gives the labels of the rows in [start, stop["""
+        if not (isinstance(start, int) and isinstance(stop, int)):
+            raise Exception("start and stop must be of type int")
+        start = max(start, 0)
+        stop = min(stop, self.n_rows)
+        labels = []
+        if stop <= start:
+            return labels
+        for page in range(start // self._page_size,
+                          (stop - 1) // self._page_size + 1):
+            page_start = page * self._page_size
+            labels += self._get_page(page)[max(start - page_start, 0):
+                                           stop - page_start]
+        return labels
+
+    def get_rows(self):
+        """gives the list of the (row, label) of the visible rows"""
+        stop = min(self._first + self._n_visible, self.n_rows)
+        return list(zip(range(self._first, stop),
+                        self.get_labels(self._first, stop)))
+
+
+class ListDisplay:
+    """ Elements of the dimension of a filter.
+
+    A ListDisplay shows the list of the elements of the dimension of a
+    filter, the selected elements being highlighted. Clicking on an element
+    selects it, clicking with extend=True adds it to the selection (or
+    removes it if it was selected). The selection of the filter can also be
+    changed elsewhere (e.g. by a prefetcher or another window): the display
+    follows it, and scrolls to keep the first selected element visible.
+
+    **Parameters**
+
+    - filter:
+        filter whose selection is chosen (type operation.Filter)
+    - header:
+        header of the dimension of the filter (type xdata.Header)
+    - n_visible:
+        number of rows shown at once (type int)
+
+        (optional, default value is 50)
+
+    **Attributes**
+
+    - filter:
+        filter whose selection is chosen
+    - model:
+        ListModel giving the labels of the rows
+
+    **Methods**
+
+    - get_rows():
+        gives the list of the (row, label, selected) of the visible rows
+    - scroll(first):
+        shows the rows from first
+    - click(row, extend=False):
+        selects an element (extend=False) or adds it to the selection /
+        removes it from the selection (extend=True)
+    - search(text, mode='substring'):
+        gives the rows whose label starts with (mode 'prefix') or contains
+        (mode 'substring') text, ignoring the case, and shows the first one
+    - select_found(text, mode='substring'):
+        selects the rows found by search (the selection does not change if
+        none is found)
+    - set_header(header):
+        shows the elements of the updated header of the dimension
+    - close():
+        stops following the filter
+    """
+
+    def __init__(self, filter, header, n_visible=50):
+        """Constructor of the class ListDisplay"""
+        if not isinstance(filter, operation.Filter):
+            raise Exception("filter must be of type Filter")
+        if isinstance(header, xdata.Header) and header.label != filter.label:
+            raise Exception("header must be the header of the dimension of "
+                            "the filter")
+        self._filter = filter
+        self._model = ListModel(header, n_visible)
+        self._filter.add_listener(self._on_filter_change)
+        self._start_search_index()
+
+    def _start_search_index(self):
+        header = self._model.header
+        if header.is_categorical_with_values:
+            header.get_index(0, 'text', wait=False)
+
+    @property
+    def filter(self):
+        """filter whose selection is chosen"""
+        return self._filter
+
+    @property
+    def model(self):
+        """ListModel giving the labels of the rows"""
+        return self._model
+
+    def get_rows(self):
+        """gives the list of the (row, label, selected) of the visible rows"""
+        selection = self._filter.selection
+        if not isinstance(selection, bitset.Bitset):
+            selection = set(selection)
+        return [(row, label, row in selection)
+                for row, label in self._model.get_rows()]
+
+    def scroll(self, first):
+        """shows the rows from first"""
+        self._model.set_window(first)
+
+    def click(self, row, extend=False):
+        """selects an element, or adds it to / removes it from the
+        selection"""
+        if not isinstance(row, int) or row < 0 or row >= self._model.n_rows:
+            raise Exception("row must be in [0, n_elem[")
+        if not extend:
+            self._filter.set_selection([row])
+            return
+        selection = self._filter.selection
+        if isinstance(selection, bitset.Bitset):
+            # e.g. the selection of a predicate filter
+            clicked = bitset.Bitset(self._model.n_rows, [row])
+            if row not in selection:
+                self._filter.set_selection(selection | clicked)
+            elif len(selection) > 1:
+                self._filter.set_selection(selection - clicked)
+            return
+        selection = list(selection)
+        if row in selection:
+            if len(selection) == 1:
+                # at least one element stays selected
+                return
+            selection.remove(row)
+        else:
+            selection.append(row)
+        self._filter.set_selection(selection)
+
+    def search(self, text, mode='substring'):
+        """gives the rows whose label starts with or contains text"""
+        header = self._model.header
+        if header.is_categorical_with_values:
+            rows = header.search_lines(0, text, mode)
+        else:
+            # the labels of measure headers are computed
+            rows = column_index.scan_text(
+                [format_label(v) for v in
+                 header.get_item_name(range(header.n_elem))], text, mode)
+        if len(rows):
+            self._model.set_window(int(rows[0]))
+        return rows
+
+    def select_found(self, text, mode='substring'):
+        """selects the rows whose label starts with or contains text"""
+        rows = self.search(text, mode)
+        if len(rows):
+            self._filter.set_selection(
+                bitset.Bitset(self._model.n_rows, rows))
+        return rows
+
+    def _on_filter_change(self, filter):
+        selection = filter.selection
+        first = selection.first if isinstance(selection, bitset.Bitset) \
+            else min(selection)
+        if not (self._model.first <= first <
+                self._model.first + self._model.n_visible):
+            self._model.set_window(first)
+
+    def set_header(self, header):
+        """shows the elements of the updated header of the dimension"""
+        self._model.set_header(header)
+        self._start_search_index()
+
+    def close(self):
+        """stops following the filter"""
+        self._filter.remove_listener(self._on_filter_change)
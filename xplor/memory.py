@@ -0,0 +1,344 @@
+"""memory module is a module to find how much memory the Xdata instances use
+and what keeps them alive.
+
+update_xdata, modify_dimensions, filters and slicers create new Xdata
+instances: an old version stays in memory as long as an object (a slicer, a
+cache, a window...) refers to it. The memory used by a Xdata instance is
+split in buffers: the data buffer (for a view, the whole array it is a view
+of, since it is kept alive too), each value column of the categorical
+headers, and the caches (statistics, contiguous copy of a view, indexes of
+the header columns). A buffer is shared when
+another live Xdata instance uses it too (e.g. headers that were not copied,
+data views), and owned otherwise: only the owned bytes are freed when the
+instance is deleted.
+
+Every Xdata instance registers itself in a process-wide tracker (weak
+references only, the tracker never keeps an instance alive), which lists the
+live versions and the objects that refer to them.
+
+
+This module uses:
+    - gc
+    - inspect
+    - sys
+    - threading
+    - weakref
+    - collections
+    - numpy as np
+    - pandas as pd
+
+    - sparse
+
+
+There are 2 classes in this module:
+
+    - **MemoryUsage**:
+        This class gives the bytes owned and shared by a Xdata instance, by
+        kind of buffer.
+    - **VersionTracker**:
+        This class keeps weak references to all the live Xdata instances.
+
+There are 2 functions in this module:
+    - **get_memory_usage**:
+        get_memory_usage gives the MemoryUsage of a Xdata instance.
+    - **get_tracker**:
+        get_tracker gives the VersionTracker of the whole process.
+"""
+
+# Authors: Elodie Ikkache CNRS <elodie.ikkache@student.ecp.fr>
+#          Thomas Deneux CNRS <thomas.deneux@unic.cnrs-gif.fr>
+#
+# version 1.0
+# -*- coding: utf-8 -*-
+
+import gc
+import inspect
+import sys
+import threading
+import weakref
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+import sparse
+
+
+KINDS = ['data', 'headers', 'caches']
+
+
+def _root(array):
+    """gives the array owning the memory of array (array itself if it is not
+    a view)"""
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    return array
+
+
+def _buffers(xdata_instance):
+    """gives the buffers used by a Xdata instance, as a dictionary {key:
+    (kind, name, n_bytes)}, key identifying the memory of the buffer"""
+    buffers = {}
+
+    def add_array(kind, name, array):
+        root = _root(array)
+        buffers.setdefault(id(root), (kind, name, root.nbytes))
+
+    data = xdata_instance._data
+    if isinstance(data, sparse.SparseArray):
+        add_array('data', 'coords', data.coords)
+        add_array('data', 'values', data.values)
+    else:
+        add_array('data', 'data', data)
+    for header in xdata_instance._headers:
+        values = getattr(header, '_values', None)
+        if isinstance(values, pd.DataFrame) and values.shape[1]:
+            # one buffer per value column (the strings of object columns are
+            # counted too), and one for the row index
+            usage = values.memory_usage(index=True, deep=True)
+            buffers.setdefault((id(values), 'index'), (
+                'headers', header.label + ' (index)', int(usage.iloc[0])))
+            for j, descriptor in enumerate(header.column_descriptors):
+                buffers.setdefault((id(values), j), (
+                    'headers', header.label + '/' + descriptor.label,
+                    int(usage.iloc[j + 1])))
+        # indexes of the columns (module column_index), kept by the headers
+        indexes = getattr(header, '_indexes', None) or {}
+        for (j, kind), index in list(indexes.items()):
+            name = "%s/%s %s index" % (
+                header.label, header.column_descriptors[j].label, kind)
+            for value in vars(index).values():
+                if isinstance(value, np.ndarray):
+                    add_array('caches', name, value)
+                elif isinstance(value, dict):
+                    buffers.setdefault(id(value),
+                                       ('caches', name, sys.getsizeof(value)))
+    contiguous = getattr(xdata_instance, '_contiguous', None)
+    if contiguous is not None:
+        add_array('caches', 'contiguous data', contiguous)
+    statistics = xdata_instance._statistics
+    if statistics is not None:
+        for lines in statistics._lines.values():
+            for array in lines.values():
+                if isinstance(array, np.ndarray):
+                    add_array('caches', 'statistics', array)
+    return buffers
+
+
+class MemoryUsage:
+    """ Bytes used by a Xdata instance.
+
+    **Parameters**
+
+    - xdata_instance:
+        the Xdata instance
+    - others:
+        the other Xdata instances whose buffers are considered as shared
+
+        (optional, default value is all the live instances of the tracker)
+
+    **Attributes**
+
+    - version:
+        version of the Xdata instance
+    - name:
+        name of the Xdata instance
+    - owned:
+        bytes that are only used by this instance
+    - shared:
+        bytes that are also used by other instances
+    - total:
+        owned + shared
+    - breakdown:
+        dictionary {kind: {'owned', 'shared'}}, kind being 'data',
+        'headers' or 'caches'
+    - buffers:
+        list of dictionaries {'kind', 'name', 'bytes', 'shared'}, one per
+        buffer
+
+    **Methods**
+
+    - disp:
+        gives a readable summary
+    """
+
+    def __init__(self, xdata_instance, others=None):
+        """Constructor of the class MemoryUsage"""
+        if others is None:
+            others = _tracker.live_versions()
+        used_elsewhere = set()
+        for other in others:
+            if other is not xdata_instance:
+                used_elsewhere.update(_buffers(other))
+        self._set(xdata_instance, _buffers(xdata_instance),
+                  used_elsewhere.__contains__)
+
+    @classmethod
+    def _from_buffers(cls, xdata_instance, buffers, is_shared):
+        """gives the MemoryUsage from the buffers of the instance, already
+        listed, is_shared telling if the buffer of a key is used by another
+        instance"""
+        obj = cls.__new__(cls)
+        obj._set(xdata_instance, buffers, is_shared)
+        return obj
+
+    def _set(self, xdata_instance, buffers, is_shared):
+        self._version = xdata_instance.version
+        self._name = xdata_instance.name
+        self._buffers = [{'kind': kind, 'name': name, 'bytes': n_bytes,
+                          'shared': is_shared(key)}
+                         for key, (kind, name, n_bytes) in buffers.items()]
+
+    @property
+    def version(self):
+        """version of the Xdata instance"""
+        return self._version
+
+    @property
+    def name(self):
+        """name of the Xdata instance"""
+        return self._name
+
+    @property
+    def owned(self):
+        """bytes that are only used by this instance"""
+        return sum(b['bytes'] for b in self._buffers if not b['shared'])
+
+    @property
+    def shared(self):
+        """bytes that are also used by other instances"""
+        return sum(b['bytes'] for b in self._buffers if b['shared'])
+
+    @property
+    def total(self):
+        """owned + shared"""
+        return sum(b['bytes'] for b in self._buffers)
+
+    @property
+    def breakdown(self):
+        """dictionary {kind: {'owned', 'shared'}}"""
+        breakdown = {kind: {'owned': 0, 'shared': 0} for kind in KINDS}
+        for b in self._buffers:
+            breakdown[b['kind']]['shared' if b['shared'] else 'owned'] += \
+                b['bytes']
+        return breakdown
+
+    @property
+    def buffers(self):
+        """list of dictionaries {'kind', 'name', 'bytes', 'shared'}"""
+        return [dict(b) for b in self._buffers]
+
+    def disp(self):
+        """gives a readable summary"""
+        text = "%s (version %d): %d bytes owned, %d bytes shared" \
+            % (self._name, self._version, self.owned, self.shared)
+        for kind, n_bytes in self.breakdown.items():
+            text += "\n    %s: %d owned, %d shared" \
+                % (kind, n_bytes['owned'], n_bytes['shared'])
+        return text
+
+
+def get_memory_usage(xdata_instance, others=None):
+    """gives the MemoryUsage of a Xdata instance, the buffers also used by
+    others (default: all the live instances) being shared"""
+    return MemoryUsage(xdata_instance, others)
+
+
+class VersionTracker:
+    """ Weak references to all the live Xdata instances.
+
+    **Attributes**
+
+    - n_live:
+        number of live Xdata instances
+
+    **Methods**
+
+    - register(xdata_instance):
+        adds an instance (called by the constructor of Xdata)
+    - live_versions(name=None):
+        gives the live instances (with this name), by increasing version
+    - report(name=None):
+        gives the MemoryUsage of each live instance, the biggest owners
+        first
+    - total_bytes:
+        gives the bytes used by all the live instances, each buffer being
+        counted once
+    - get_holders(xdata_instance):
+        gives the objects that refer to an instance (the objects whose
+        attribute it is rather than their __dict__), to find what keeps an
+        old version alive
+    """
+
+    def __init__(self):
+        """Constructor of the class VersionTracker"""
+        self._lock = threading.Lock()
+        self._live = weakref.WeakSet()
+
+    @property
+    def n_live(self):
+        """number of live Xdata instances"""
+        return len(self._live)
+
+    def register(self, xdata_instance):
+        """adds an instance"""
+        with self._lock:
+            self._live.add(xdata_instance)
+
+    def live_versions(self, name=None):
+        """gives the live instances, by increasing version"""
+        with self._lock:
+            live = list(self._live)
+        if name is not None:
+            live = [x for x in live if x.name == name]
+        return sorted(live, key=lambda x: x.version)
+
+    def report(self, name=None):
+        """gives the MemoryUsage of each live instance, the biggest owners
+        first"""
+        live = self.live_versions()
+        selected = live if name is None else [x for x in live
+                                              if x.name == name]
+        # the buffers of each live instance are listed once, with the
+        # number of instances using each of them
+        buffers = {x.version: _buffers(x) for x in live}
+        n_users = Counter(key for listed in buffers.values()
+                          for key in listed)
+        usages = [MemoryUsage._from_buffers(x, buffers[x.version],
+                                            lambda key: n_users[key] > 1)
+                  for x in selected]
+        usages.sort(key=lambda u: -u.owned)
+        return usages
+
+    def total_bytes(self):
+        """gives the bytes used by all the live instances, each buffer being
+        counted once"""
+        buffers = {}
+        for x in self.live_versions():
+            buffers.update(_buffers(x))
+        return sum(n_bytes for _, _, n_bytes in buffers.values())
+
+    def get_holders(self, xdata_instance):
+        """gives the objects that refer to an instance"""
+        gc.collect()
+        holders = []
+        for referrer in gc.get_referrers(xdata_instance):
+            if inspect.isframe(referrer) or referrer is holders:
+                continue
+            if isinstance(referrer, dict):
+                # an attribute: the object is more useful than its __dict__
+                owners = [o for o in gc.get_referrers(referrer)
+                          if getattr(o, '__dict__', None) is referrer]
+                if owners:
+                    holders.extend(owners)
+                    continue
+            holders.append(referrer)
+        return holders
+
+
+_tracker = VersionTracker()
+
+
+def get_tracker():
+    """gives the VersionTracker of the whole process"""
+    return _tracker
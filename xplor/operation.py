@@ -0,0 +1,1181 @@
+"""operation module is a module to apply filters on the data, so as to obtain
+the slice to display.
+
+A Filter selects some elements of one dimension of a Xdata instance. A Slicer
+applies a succession of filters on a Xdata instance, the result (a new Xdata
+instance, with one dimension less for each filter) is the slice to display.
+
+Computing a slice can take time for big data, so the slices can be computed
+in the background by a SliceWorker: each request has a generation number,
+and a new request supersedes the previous ones, so that only the latest slice
+is delivered to the display. Computed slices are kept in a SliceCache, which
+a SlicePrefetcher fills in advance with the slices the user is likely to ask
+next when going through the elements of a dimension. Windows showing the same
+data share a SliceGraph, so that the filters they have in common are only
+applied once.
+
+
+This module uses:
+    - numpy as np
+    - threading
+    - time
+    - collections
+    - concurrent.futures
+
+    - bitset
+    - parallel
+    - predicate
+    - stream
+    - xdata
+
+
+There are 7 classes in this module:
+
+    - **Filter**:
+        A Filter selects some elements of a dimension, defined by the label
+        of its header. The selected elements are averaged.
+
+    - **PredicateFilter**:
+        A PredicateFilter is a Filter whose selected elements are the ones
+        satisfying an expression over the columns of the header.
+
+    - **Slicer**:
+        A Slicer applies a list of filters on a Xdata instance to obtain the
+        slice to display.
+
+    - **SliceWorker**:
+        A SliceWorker computes slices in a background thread. Requests are
+        numbered by generation, a newer request cancels the older ones.
+
+    - **SliceCache**:
+        A SliceCache keeps the latest computed slices, for given data and
+        filter states, within a memory budget.
+
+    - **SlicePrefetcher**:
+        A SlicePrefetcher follows the navigation along the dimension of a
+        filter and computes the next slices in the background.
+
+    - **SliceGraph**:
+        A SliceGraph is shared by the slicers of several windows on the same
+        data, the filters they have in common at the beginning of their lists
+        are only applied once.
+
+There are 2 functions in this module:
+    - **apply_filter**:
+        apply_filter applies the state of a filter (label of the dimension and
+        selected elements) on a Xdata instance.
+    - **get_slice_graph**:
+        get_slice_graph gives the SliceGraph instance shared by the whole
+        process.
+"""
+
+# Authors: Elodie Ikkache CNRS <elodie.ikkache@student.ecp.fr>
+#          Thomas Deneux CNRS <thomas.deneux@unic.cnrs-gif.fr>
+#
+# version 1.0
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future
+
+import numpy as np
+
+import bitset
+import parallel
+import predicate
+import stream
+import xdata
+
+
+class Filter:
+    """ Selects some elements of a dimension.
+
+    A Filter is defined by the label of the header of the dimension it
+    applies to, and by the list of the selected elements (line numbers of the
+    header). When applying the filter, the selected elements are averaged and
+    the dimension is removed. Each time a filter is created, its default
+    value is to only keep the first element of its dimension.
+
+    The state of the filter (label and selection) is a tuple, it describes
+    entirely the effect of the filter and can be used as a key.
+
+    The selection can also be a Bitset (module bitset), for selections of
+    many elements: the selections of several filters are then combined with
+    set operations on the bits rather than on the lists of elements.
+
+    **Parameters**
+
+    - label:
+        label of the header of the filtered dimension
+        (type str)
+    - selection:
+        list of the selected elements (type list of int, numpy array of int
+        or bitset.Bitset)
+
+        (optional, default value is [0])
+    - active:
+        an inactive filter does not change the data
+
+        (type bool)
+
+        (optional, default value is True)
+
+    **Attributes**
+
+    - label:
+        label of the header of the filtered dimension
+    - selection:
+        tuple of the selected elements, or Bitset
+    - active:
+        True if the filter is applied
+    - state:
+        tuple (label, selection)
+
+    **Methods**
+
+    - set_selection(selection):
+        changes the selected elements and notifies the listeners
+    - get_bitset(n_elem):
+        gives the selection as a Bitset of n_elem elements
+    - set_active(active):
+        activates or deactivates the filter and notifies the listeners
+    - add_listener(fun):
+        fun will be called (with the filter as argument) each time the
+        filter changes
+    - remove_listener(fun):
+        stops notifying fun
+    - apply(data):
+        applies the filter on a Xdata instance
+    """
+
+    def __init__(self, label, selection=None, active=True):
+        """Constructor of the class Filter"""
+        if not isinstance(label, str):
+            raise Exception("label must be of type str")
+        self._label = label
+        self._selection = Filter._check_selection(
+            [0] if selection is None else selection)
+        if not isinstance(active, bool):
+            raise Exception("active must be a boolean")
+        self._active = active
+        self._listeners = []
+
+    @property
+    def label(self):
+        """label of the header of the filtered dimension"""
+        return self._label
+
+    @property
+    def selection(self):
+        """tuple of the selected elements"""
+        return self._selection
+
+    @property
+    def active(self):
+        """True if the filter is applied"""
+        return self._active
+
+    @property
+    def state(self):
+        """tuple (label, selection), describing the effect of the filter"""
+        return self._label, self._selection
+
+    @staticmethod
+    def _check_selection(selection):
+        if isinstance(selection, bitset.Bitset):
+            if selection.count == 0:
+                raise Exception("at least one element must be selected")
+            return selection
+        if isinstance(selection, np.ndarray):
+            # e.g. lines found by a predicate: checked at once
+            if selection.ndim != 1 or selection.dtype.kind not in 'iu':
+                raise Exception("selection must be a list of int")
+            if len(selection) == 0:
+                raise Exception("at least one element must be selected")
+            if selection.min() < 0:
+                raise Exception("selection must be a list of non negative "
+                                "int")
+            return tuple(selection.tolist())
+        if not isinstance(selection, (list, tuple, range)):
+            raise Exception("selection must be a list of int")
+        selection = tuple(selection)
+        if len(selection) == 0:
+            raise Exception("at least one element must be selected")
+        for i in selection:
+            if not isinstance(i, int) or i < 0:
+                raise Exception("selection must be a list of non negative "
+                                "int")
+        return selection
+
+    def set_selection(self, selection):
+        """changes the selected elements"""
+        self._selection = Filter._check_selection(selection)
+        self._notify()
+
+    def get_bitset(self, n_elem):
+        """gives the selection as a Bitset of n_elem elements"""
+        if isinstance(self._selection, bitset.Bitset):
+            if self._selection.n_elem == n_elem:
+                return self._selection
+            return bitset.Bitset(n_elem, self._selection.lines())
+        return bitset.Bitset(n_elem, list(self._selection))
+
+    def set_active(self, active):
+        """activates or deactivates the filter"""
+        if not isinstance(active, bool):
+            raise Exception("active must be a boolean")
+        self._active = active
+        self._notify()
+
+    def add_listener(self, fun):
+        """fun will be called each time the filter changes"""
+        self._listeners.append(fun)
+
+    def remove_listener(self, fun):
+        """stops notifying fun"""
+        self._listeners.remove(fun)
+
+    def _notify(self):
+        for fun in list(self._listeners):
+            fun(self)
+
+    def apply(self, data):
+        """applies the filter on a Xdata instance"""
+        if not self._active:
+            return data
+        return apply_filter(data, self.state)
+
+
+class PredicateFilter(Filter):
+    """ Selects the elements of a dimension satisfying an expression.
+
+    The expression is written over the columns of the categorical header of
+    the dimension (module predicate), e.g. "age >= 40 and sex == 'F'". The
+    selection of the filter is the lines of the header satisfying it, it is
+    computed again when the expression or the header changes.
+
+    **Parameters**
+
+    - header:
+        categorical header of the filtered dimension
+        (type xdata.CategoricalHeader)
+    - expression:
+        expression over the columns of the header (type str)
+    - active:
+        an inactive filter does not change the data
+
+        (type bool)
+
+        (optional, default value is True)
+
+    **Attributes**
+
+    (same as Filter)
+
+    - expression:
+        expression over the columns of the header
+    - header:
+        categorical header of the filtered dimension
+
+    **Methods**
+
+    (same as Filter)
+
+    - set_expression(expression):
+        changes the expression and the selection and notifies the listeners
+        (the filter does not change if no element satisfies the expression)
+    - set_header(header):
+        changes the header (after an update of the data) and the selection
+        and notifies the listeners
+    """
+
+    def __init__(self, header, expression, active=True):
+        """Constructor of the class PredicateFilter"""
+        if not isinstance(header, xdata.CategoricalHeader):
+            raise Exception("header must be of type CategoricalHeader")
+        self._header = header
+        self._predicate = predicate.Predicate(expression)
+        lines, _ = self._select()
+        Filter.__init__(self, header.label, lines, active)
+
+    @property
+    def expression(self):
+        """expression over the columns of the header"""
+        return self._predicate.expression
+
+    @property
+    def header(self):
+        """categorical header of the filtered dimension"""
+        return self._header
+
+    def _select(self, header=None, expression=None):
+        """gives the lines satisfying the expression"""
+        if header is None:
+            header = self._header
+        p = self._predicate if expression is None \
+            else predicate.Predicate(expression)
+        lines = bitset.Bitset.from_mask(p.mask(header))
+        if lines.count == 0:
+            raise Exception("no element satisfies the expression")
+        return lines, p
+
+    def set_expression(self, expression):
+        """changes the expression"""
+        lines, self._predicate = self._select(expression=expression)
+        self.set_selection(lines)
+
+    def set_header(self, header):
+        """changes the header"""
+        if not isinstance(header, xdata.CategoricalHeader) or \
+                header.label != self._label:
+            raise Exception("header must be the categorical header of the "
+                            "dimension of the filter")
+        lines, _ = self._select(header)
+        self._header = header
+        self.set_selection(lines)
+
+
+class Slicer:
+    """ Applies a succession of filters on a Xdata instance.
+
+    The slice is the Xdata instance obtained after applying all the active
+    filters, in order. The Slicer listens to its filters: when one of them
+    changes, the slice is computed again, in the background if the Slicer has
+    a SliceWorker.
+
+    **Parameters**
+
+    - data:
+        data to slice
+        (type Xdata)
+    - filters:
+        filters to apply, in order (type list of Filter)
+
+        (optional)
+    - worker:
+        SliceWorker computing the slices in the background
+
+        (optional, if None the slices are computed when the filters change)
+    - callback:
+        function called with the new slice each time it is computed (e.g.
+        to notify the ViewDisplay)
+
+        (optional)
+    - cache:
+        SliceCache in which the slices are looked for before being computed,
+        and stored after
+
+        (optional)
+    - graph:
+        SliceGraph shared with the slicers of other windows on the same data,
+        so that the filters they have in common are only applied once (the
+        cache of the graph is used as the cache of the slicer)
+
+        (optional)
+
+    **Attributes**
+
+    - data:
+        data to slice
+    - filters:
+        list of the filters
+    - worker:
+        SliceWorker computing the slices in the background, or None
+    - cache:
+        SliceCache of the slices, or None
+    - graph:
+        SliceGraph shared with other slicers, or None
+    - filter_states:
+        list of the states of the active filters, in order
+    - slice:
+        latest slice computed
+
+    **Methods**
+
+    - set_data(data):
+        changes the data to slice
+    - add_filter(f, position=None):
+        adds a filter (at the end by default)
+    - remove_filter(f):
+        removes a filter
+    - get_slice(filter_states=None, is_cancelled=None):
+        computes the slice for the current filters (or for the given
+        filter_states), is_cancelled is a function called between the filters
+        to stop the computation if it returns True
+    - update:
+        computes the slice again (in the background if there is a worker)
+    """
+
+    def __init__(self, data, filters=None, worker=None, callback=None,
+                 cache=None, graph=None):
+        """Constructor of the class Slicer"""
+        if not isinstance(data, xdata.Xdata):
+            raise Exception("data must be of type Xdata")
+        if filters is None:
+            filters = []
+        elif not isinstance(filters, list):
+            raise Exception("filters must be a list of Filter")
+        for f in filters:
+            if not isinstance(f, Filter):
+                raise Exception("filters must be a list of Filter")
+        if not (worker is None or isinstance(worker, SliceWorker)):
+            raise Exception("worker must be of type SliceWorker")
+        if not (cache is None or isinstance(cache, SliceCache)):
+            raise Exception("cache must be of type SliceCache")
+        if graph is not None:
+            if not isinstance(graph, SliceGraph):
+                raise Exception("graph must be of type SliceGraph")
+            elif cache is None:
+                cache = graph.cache
+            elif cache is not graph.cache:
+                raise Exception("a slicer with a graph uses the cache of the "
+                                "graph")
+        self._graph = graph
+        self._data = data
+        self._filters = []
+        self._worker = worker
+        self._cache = cache
+        self._callback = callback
+        self._slice = None
+        for f in filters:
+            self._filters.append(f)
+            f.add_listener(self._filter_changed)
+
+    @property
+    def data(self):
+        """data to slice"""
+        return self._data
+
+    @property
+    def filters(self):
+        """list of the filters"""
+        return list(self._filters)
+
+    @property
+    def worker(self):
+        """SliceWorker computing the slices in the background, or None"""
+        return self._worker
+
+    @property
+    def cache(self):
+        """SliceCache of the slices, or None"""
+        return self._cache
+
+    @property
+    def graph(self):
+        """SliceGraph shared with other slicers, or None"""
+        return self._graph
+
+    @property
+    def filter_states(self):
+        """list of the states of the active filters, in order"""
+        return [f.state for f in self._filters if f.active]
+
+    @property
+    def slice(self):
+        """latest slice computed"""
+        return self._slice
+
+    def set_data(self, data):
+        """changes the data to slice"""
+        if not isinstance(data, xdata.Xdata):
+            raise Exception("data must be of type Xdata")
+        self._data = data
+        self.update()
+
+    def add_filter(self, f, position=None):
+        """adds a filter"""
+        if not isinstance(f, Filter):
+            raise Exception("f must be of type Filter")
+        if position is None:
+            position = len(self._filters)
+        self._filters.insert(position, f)
+        f.add_listener(self._filter_changed)
+        self.update()
+
+    def remove_filter(self, f):
+        """removes a filter"""
+        self._filters.remove(f)
+        f.remove_listener(self._filter_changed)
+        self.update()
+
+    def _filter_changed(self, f):
+        self.update()
+
+    def get_slice(self, filter_states=None, is_cancelled=None):
+        """computes the slice"""
+        if filter_states is None:
+            filter_states = self.filter_states
+        if is_cancelled is None:
+            is_cancelled = lambda: False
+        return self._get_slice_of(self._data, filter_states, is_cancelled)
+
+    def update(self):
+        """computes the slice again"""
+        data = self._data
+        states = self.filter_states
+        if self._cache is not None:
+            new_slice = self._cache.get(data, states)
+            if new_slice is not None:
+                # the slice is already known: the requests that are still
+                # computed in the background are superseded
+                if self._worker is not None:
+                    self._worker.cancel()
+                self._deliver(new_slice)
+                return
+        # the cache was looked up above: the miss is not counted twice
+        if self._worker is None:
+            self._deliver(self._get_slice_of(data, states, lambda: False,
+                                             True))
+        else:
+            # the states are read now: the computation in the background
+            # does not depend on later changes of the filters
+            self._worker.submit(
+                lambda is_cancelled: self._get_slice_of(data, states,
+                                                        is_cancelled, True),
+                self._deliver)
+
+    def _get_slice_of(self, data, filter_states, is_cancelled,
+                      looked_up=False):
+        """computes the slice, unless it is in the cache (looked_up is True
+        if the cache was already looked up for it)"""
+        if self._graph is not None:
+            return self._graph.get_slice(data, filter_states, is_cancelled)
+        if self._cache is not None and not looked_up:
+            new_slice = self._cache.get(data, filter_states)
+            if new_slice is not None:
+                return new_slice
+        new_slice = data
+        for state in filter_states:
+            if is_cancelled():
+                raise CancelledError()
+            new_slice = apply_filter(new_slice, state)
+        if self._cache is not None:
+            self._cache.put(data, filter_states, new_slice)
+        return new_slice
+
+    def _deliver(self, new_slice):
+        self._slice = new_slice
+        if self._callback is not None:
+            self._callback(new_slice)
+
+
+class SliceWorker:
+    """ Computes slices in a background thread.
+
+    Each request receives a generation number. Only the latest request is
+    computed: a request that has not started yet is dropped when a new one
+    arrives, and a computation that has started is cancelled at the next
+    check of its is_cancelled function. The result of a request is only
+    delivered if no newer request has been made in the meantime, so that the
+    display never receives a superseded slice and never waits for one.
+
+    The delivery functions are called in the background thread, they must
+    hand over the slice to the event loop of the interface (the slice can
+    also be fetched with get_result at each frame).
+
+    **Parameters**
+
+    - name:
+        name of the background thread
+        (type str)
+
+        (optional)
+
+    **Attributes**
+
+    - generation:
+        generation number of the latest request
+    - busy:
+        True while a request is waiting or being computed
+    - error:
+        (generation, exception) for the latest request that failed, or None
+
+    **Methods**
+
+    - submit(compute, deliver=None):
+        makes a new request, compute is called in the background with a
+        function is_cancelled as argument and must return the slice,
+        deliver(slice) is called with the result if it is still the latest
+        request; returns the generation number of the request
+    - cancel:
+        cancels all the requests
+    - get_result:
+        gives (generation, slice) for the latest delivered result, without
+        waiting
+    - wait(timeout=None):
+        waits until all the requests are done, returns False if the timeout
+        expired
+    - shutdown:
+        stops the background thread
+    """
+
+    def __init__(self, name='xplor-slice'):
+        """Constructor of the class SliceWorker"""
+        self._condition = threading.Condition()
+        self._generation = 0
+        self._pending = None
+        self._running = False
+        self._result = (0, None)
+        self._error = None
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name=name,
+                                        daemon=True)
+        self._thread.start()
+
+    @property
+    def generation(self):
+        """generation number of the latest request"""
+        return self._generation
+
+    @property
+    def error(self):
+        """(generation, exception) for the latest failed request, or None"""
+        return self._error
+
+    @property
+    def busy(self):
+        """True while a request is waiting or being computed"""
+        with self._condition:
+            return self._pending is not None or self._running
+
+    def submit(self, compute, deliver=None):
+        """makes a new request, which supersedes the previous ones"""
+        if not callable(compute):
+            raise Exception("compute must be a function")
+        with self._condition:
+            if self._stopped:
+                raise Exception("the worker has been shut down")
+            self._generation += 1
+            self._pending = (self._generation, compute, deliver)
+            self._condition.notify_all()
+            return self._generation
+
+    def cancel(self):
+        """cancels all the requests"""
+        with self._condition:
+            self._generation += 1
+            self._pending = None
+            self._condition.notify_all()
+
+    def get_result(self):
+        """gives (generation, slice) for the latest delivered result"""
+        return self._result
+
+    def wait(self, timeout=None):
+        """waits until all the requests are done"""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self._pending is None and not self._running, timeout)
+
+    def shutdown(self):
+        """stops the background thread"""
+        with self._condition:
+            self._stopped = True
+            self._generation += 1
+            self._pending = None
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._pending is not None or self._stopped)
+                if self._stopped:
+                    return
+                generation, compute, deliver = self._pending
+                self._pending = None
+                self._running = True
+            try:
+                result = compute(lambda: generation != self._generation)
+                with self._condition:
+                    stale = generation != self._generation
+                    if not stale:
+                        self._result = (generation, result)
+                if not stale and deliver is not None:
+                    deliver(result)
+            except CancelledError:
+                pass
+            except Exception as e:
+                # the error is kept for the interface, the thread goes on
+                with self._condition:
+                    self._error = (generation, e)
+            finally:
+                with self._condition:
+                    self._running = False
+                    self._condition.notify_all()
+
+
+class SliceCache:
+    """ Keeps the latest computed slices, within a memory budget.
+
+    A slice is identified by the version of the data it was computed from
+    (each Xdata instance has its own version number) and the ordered list of
+    the states of the filters that were applied. Turning a filter off and on
+    again, or coming back to a previous selection, gives the same key, so the
+    slice is not computed again.
+
+    When the slices use more than the budget, the slice that was used the
+    least recently is forgotten. The cache can be used from several threads.
+
+    The slices of a StreamingXdata (module stream) are stored as copies: its
+    data is a view of a buffer overwritten by the next pushes.
+
+    **Parameters**
+
+    - max_bytes:
+        memory budget for the data of the slices, in bytes
+        (type int)
+
+        (optional, default value is 256 MB)
+    - max_items:
+        maximal number of slices kept
+        (type int)
+
+        (optional, no maximum by default)
+
+    **Attributes**
+
+    - max_bytes:
+        memory budget for the data of the slices, in bytes
+    - n_bytes:
+        memory used by the data of the slices, in bytes
+    - hits:
+        number of slices found in the cache by get
+    - misses:
+        number of slices not found in the cache by get
+
+    **Methods**
+
+    - get(data, filter_states):
+        gives the slice, or None if it is not in the cache
+    - put(data, filter_states, new_slice):
+        stores a slice (unless it is bigger than the budget)
+    - clear:
+        forgets all the slices and resets the counters
+    """
+
+    def __init__(self, max_bytes=2**28, max_items=None):
+        """Constructor of the class SliceCache"""
+        if not isinstance(max_bytes, int) or max_bytes < 0:
+            raise Exception("max_bytes must be a non negative int")
+        if not (max_items is None or
+                (isinstance(max_items, int) and max_items > 0)):
+            raise Exception("max_items must be a positive int")
+        self._max_bytes = max_bytes
+        self._max_items = max_items
+        self._lock = threading.Lock()
+        self._slices = OrderedDict()
+        self._n_bytes = 0
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def max_bytes(self):
+        """memory budget for the data of the slices, in bytes"""
+        return self._max_bytes
+
+    @property
+    def n_bytes(self):
+        """memory used by the data of the slices, in bytes"""
+        return self._n_bytes
+
+    @property
+    def hits(self):
+        """number of slices found in the cache"""
+        return self._hits
+
+    @property
+    def misses(self):
+        """number of slices not found in the cache"""
+        return self._misses
+
+    @staticmethod
+    def _key(data, filter_states):
+        return data.version, tuple(filter_states)
+
+    @staticmethod
+    def _size(new_slice):
+        if isinstance(new_slice, xdata.Xdata):
+            return new_slice.data.nbytes
+        return getattr(new_slice, 'nbytes', 0)
+
+    def __len__(self):
+        return len(self._slices)
+
+    def __contains__(self, key):
+        data, filter_states = key
+        with self._lock:
+            return SliceCache._key(data, filter_states) in self._slices
+
+    def get(self, data, filter_states):
+        """gives the slice, or None if it is not in the cache"""
+        key = SliceCache._key(data, filter_states)
+        with self._lock:
+            entry = self._slices.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._slices.move_to_end(key)
+            return entry[0]
+
+    def put(self, data, filter_states, new_slice):
+        """stores a slice"""
+        key = SliceCache._key(data, filter_states)
+        if (isinstance(data, stream.StreamingXdata) and
+                isinstance(new_slice, xdata.Xdata)):
+            new_slice = new_slice.copy()
+        size = SliceCache._size(new_slice)
+        with self._lock:
+            if key in self._slices:
+                self._n_bytes -= self._slices.pop(key)[1]
+            if size > self._max_bytes:
+                return
+            self._slices[key] = (new_slice, size)
+            self._n_bytes += size
+            while (self._n_bytes > self._max_bytes or
+                   (self._max_items is not None and
+                    len(self._slices) > self._max_items)):
+                self._n_bytes -= self._slices.popitem(last=False)[1][1]
+
+    def clear(self):
+        """forgets all the slices and resets the counters"""
+        with self._lock:
+            self._slices.clear()
+            self._n_bytes = 0
+            self._hits = 0
+            self._misses = 0
+
+
+class SlicePrefetcher:
+    """ Computes in advance the slices the user is likely to ask next.
+
+    The prefetcher follows the changes of the selection of a filter (when a
+    single element is selected, as when stepping through the elements of a
+    CategoricalHeader in ListDisplay or along a MeasureHeader). From the
+    direction and speed of the navigation, it predicts the next elements and
+    computes the corresponding slices in the background, storing them in the
+    cache of the slicer. The faster the user goes, the further ahead the
+    slices are computed.
+
+    The prefetching has a low priority: it waits while the slicer's own
+    worker is computing a slice, and it is superseded by each new move.
+
+    **Parameters**
+
+    - slicer:
+        Slicer whose slices are prefetched (it must have a cache)
+    - f:
+        Filter of the slicer whose navigation is followed
+    - depth:
+        number of slices computed ahead when navigating slowly
+
+        (type int)
+
+        (optional, default value is 2)
+    - max_depth:
+        maximal number of slices computed ahead when navigating fast
+
+        (type int)
+
+        (optional, default value is 16)
+    - lookahead:
+        duration (in seconds) of navigation that is anticipated when
+        navigating fast
+
+        (type float)
+
+        (optional, default value is 0.5)
+
+    **Attributes**
+
+    - direction:
+        1 or -1 for the direction of the latest move, 0 before the first
+    - step:
+        number of elements of the latest move
+
+    **Methods**
+
+    - predict(current):
+        gives the list of the elements expected after current
+    - wait(timeout=None):
+        waits until the predicted slices are computed
+    - stop:
+        stops following the filter and stops the background thread
+    """
+
+    def __init__(self, slicer, f, depth=2, max_depth=16, lookahead=0.5):
+        """Constructor of the class SlicePrefetcher"""
+        if not isinstance(slicer, Slicer):
+            raise Exception("slicer must be of type Slicer")
+        elif slicer.cache is None:
+            raise Exception("slicer must have a cache to store the slices")
+        elif f not in slicer.filters:
+            raise Exception("f must be one of the filters of slicer")
+        elif not isinstance(depth, int) or depth < 1:
+            raise Exception("depth must be a positive int")
+        elif not isinstance(max_depth, int) or max_depth < depth:
+            raise Exception("max_depth must be an int, at least depth")
+        self._slicer = slicer
+        self._filter = f
+        self._depth = depth
+        self._max_depth = max_depth
+        self._lookahead = float(lookahead)
+        self._worker = SliceWorker('xplor-prefetch')
+        self._current = None
+        self._time = None
+        self._direction = 0
+        self._step = 1
+        self._speed = 0.
+        f.add_listener(self._filter_changed)
+
+    @property
+    def direction(self):
+        """1 or -1 for the direction of the latest move, 0 before the
+        first"""
+        return self._direction
+
+    @property
+    def step(self):
+        """number of elements of the latest move"""
+        return self._step
+
+    def _n_elem(self):
+        for header in self._slicer.data.headers:
+            if header.label == self._filter.label:
+                return header.n_elem
+        return 0
+
+    def predict(self, current):
+        """gives the list of the elements expected after current"""
+        n_elem = self._n_elem()
+        if self._direction == 0:
+            candidates = [current + 1, current - 1]
+        else:
+            n_ahead = int(round(self._speed * self._lookahead))
+            n_ahead = min(self._max_depth, max(self._depth, n_ahead))
+            candidates = [current + self._direction * self._step * k
+                          for k in range(1, n_ahead + 1)]
+        return [i for i in candidates if 0 <= i < n_elem]
+
+    def _filter_changed(self, f):
+        if not f.active or len(f.selection) != 1:
+            return
+        current = next(iter(f.selection))
+        now = time.perf_counter()
+        if self._current is not None and current != self._current:
+            move = current - self._current
+            self._direction = 1 if move > 0 else -1
+            self._step = abs(move)
+            elapsed = now - self._time
+            # number of moves per second
+            self._speed = 1. / elapsed if elapsed > 0 else 0.
+        self._current = current
+        self._time = now
+
+        data = self._slicer.data
+        states = self._slicer.filter_states
+        position = states.index(f.state)
+        predicted = []
+        for i in self.predict(current):
+            # the predicted states have the same type of selection as the
+            # filter, so that they are the keys the slicer looks for
+            if isinstance(f.selection, bitset.Bitset):
+                selection = bitset.Bitset(f.selection.n_elem, [i])
+            else:
+                selection = (i,)
+            new_states = list(states)
+            new_states[position] = (f.label, selection)
+            predicted.append(new_states)
+        self._worker.submit(
+            lambda is_cancelled: self._prefetch(data, predicted,
+                                                is_cancelled))
+
+    def _prefetch(self, data, predicted, is_cancelled):
+        cache = self._slicer.cache
+        foreground = self._slicer.worker
+        for states in predicted:
+            if (data, states) in cache:
+                continue
+            # low priority: wait for the slice the user is looking at
+            while foreground is not None and foreground.busy:
+                if is_cancelled():
+                    raise CancelledError()
+                time.sleep(0.002)
+            self._slicer._get_slice_of(data, states, is_cancelled)
+
+    def wait(self, timeout=None):
+        """waits until the predicted slices are computed"""
+        return self._worker.wait(timeout)
+
+    def stop(self):
+        """stops following the filter and stops the background thread"""
+        self._filter.remove_listener(self._filter_changed)
+        self._worker.shutdown()
+
+
+class SliceGraph:
+    """ Shares the intermediate results of the slicers of the same data.
+
+    A slice is obtained by applying a list of filters, each prefix of the
+    list gives an intermediate result: these results form a tree whose root
+    is the data. When several slicers (e.g. the slicers of several windows
+    driven by the same ListDisplay) have filters in common at the beginning
+    of their lists, the intermediate results are computed once and used by
+    all of them. When two slicers need the same result at the same time, one
+    computes it and the other waits for it.
+
+    The results are kept in a SliceCache, within its memory budget.
+
+    **Parameters**
+
+    - cache:
+        SliceCache keeping the intermediate results
+
+        (optional, a SliceCache with the default budget is created)
+
+    **Attributes**
+
+    - cache:
+        SliceCache keeping the intermediate results
+    - n_computed:
+        number of filters that have been applied by the graph
+
+    **Methods**
+
+    - get_slice(data, filter_states, is_cancelled=None):
+        gives the slice obtained by applying the filter states on data,
+        starting from the longest prefix that is already computed
+    """
+
+    def __init__(self, cache=None):
+        """Constructor of the class SliceGraph"""
+        if cache is None:
+            cache = SliceCache()
+        elif not isinstance(cache, SliceCache):
+            raise Exception("cache must be of type SliceCache")
+        self._cache = cache
+        self._lock = threading.Lock()
+        # results being computed, waited for by the other slicers
+        self._running = {}
+        self._n_computed = 0
+
+    @property
+    def cache(self):
+        """SliceCache keeping the intermediate results"""
+        return self._cache
+
+    @property
+    def n_computed(self):
+        """number of filters that have been applied by the graph"""
+        return self._n_computed
+
+    def get_slice(self, data, filter_states, is_cancelled=None):
+        """gives the slice obtained by applying filter_states on data"""
+        states = tuple(filter_states)
+        # longest prefix that is already computed
+        n = len(states)
+        while n > 0 and (data, states[:n]) not in self._cache:
+            n -= 1
+        new_slice = data
+        if n > 0:
+            new_slice = self._cache.get(data, states[:n])
+            if new_slice is None:
+                # forgotten in the meantime
+                n = 0
+                new_slice = data
+        for k in range(n + 1, len(states) + 1):
+            if is_cancelled is not None and is_cancelled():
+                raise CancelledError()
+            new_slice = self._get_node(data, states[:k], new_slice)
+        return new_slice
+
+    def _get_node(self, data, prefix, parent):
+        """gives the result of prefix, computed from parent (the result of
+        prefix[:-1]) unless it is known or being computed"""
+        key = (data.version, prefix)
+        with self._lock:
+            if (data, prefix) in self._cache:
+                new_slice = self._cache.get(data, prefix)
+                if new_slice is not None:
+                    return new_slice
+            future = self._running.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._running[key] = future
+        if not owner:
+            return future.result()
+        try:
+            new_slice = apply_filter(parent, prefix[-1])
+            self._cache.put(data, prefix, new_slice)
+            with self._lock:
+                self._n_computed += 1
+            future.set_result(new_slice)
+            return new_slice
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._running[key]
+
+
+_slice_graph = None
+
+
+def get_slice_graph():
+    """gives the SliceGraph instance shared by the whole process"""
+    global _slice_graph
+    if _slice_graph is None:
+        _slice_graph = SliceGraph()
+    return _slice_graph
+
+
+def apply_filter(data, state):
+    """applies the state of a filter on a Xdata instance: the selected
+    elements of the dimension are averaged and the dimension is removed"""
+    label, selection = state
+    dim = None
+    for i in range(data.get_n_dimensions()):
+        if data.headers[i].label == label:
+            dim = i
+            break
+    if dim is None:
+        raise Exception("there is no dimension labelled " + label)
+    if isinstance(selection, bitset.Bitset):
+        first, last = selection.first, selection.last
+        # consecutive elements are a slice: the data is not copied before
+        # being averaged
+        lines = selection.to_index()
+    else:
+        first, last = selection[0], max(selection)
+        lines = selection
+    if last >= data.shape()[dim]:
+        raise Exception("selected elements must be in [0, n_elem[")
+    # quantized data is not calibrated: the slice keeps the stored values
+    # (their mean for several elements) and the calibration
+    if data.is_sparse:
+        # sparse data stays sparse, the missing cells are ignored
+        if len(selection) == 1:
+            new_data = data.data.index(dim, first)
+        else:
+            if isinstance(lines, slice):
+                lines = np.arange(lines.start, lines.stop)
+            new_data = data.data.take(lines, dim).reduce(dim, 'mean')
+    elif len(selection) == 1:
+        index = [slice(None)] * data.get_n_dimensions()
+        index[dim] = first
+        new_data = data.data[tuple(index)]
+    elif isinstance(lines, slice):
+        index = [slice(None)] * data.get_n_dimensions()
+        index[dim] = lines
+        new_data = parallel.reduce(data.data[tuple(index)], dim, 'mean')
+    else:
+        new_data = parallel.reduce(np.take(data.data, lines, axis=dim),
+                                   dim, 'mean')
+    return data.modify_dimensions('dim_rm', [dim], new_data, None)[0]
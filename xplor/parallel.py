@@ -0,0 +1,425 @@
+"""parallel module is a module to run the heavy computations on the data on
+several cores.
+
+Reductions (averaging the elements within the binding step of a zoom,
+collapsing a dimension...) are computed by splitting the array into chunks
+along a dimension that is not reduced. Each chunk is reduced independently
+in a pool of threads: numpy releases the GIL during the computation, so the
+chunks are really computed in parallel.
+
+Transforms written in pure python (custom filters, detrending, peak
+detection...) hold the GIL, they are computed in a pool of processes. The
+source and destination arrays are placed in shared memory, so that only the
+names of the memory blocks and the ranges of lines are sent to the processes.
+
+
+This module uses:
+    - numpy as np
+    - os
+    - concurrent.futures
+    - multiprocessing.shared_memory (python 3.8 or later, only needed by
+      the transforms)
+
+
+There are 2 classes in this module:
+
+    - **ThreadReducer**:
+        This class computes reductions of numpy arrays along one or several
+        axes in a pool of threads.
+
+    - **ProcessTransformer**:
+        This class applies a function to each line of a dimension of a numpy
+        array in a pool of processes sharing the memory of the array.
+
+There are 5 functions in this module:
+    - **get_reducer**:
+        get_reducer gives the ThreadReducer instance shared by the whole
+        process (it is created the first time it is needed).
+    - **reduce**:
+        reduce computes a reduction with the shared ThreadReducer.
+    - **bin_reduce**:
+        bin_reduce reduces groups of consecutive elements with the shared
+        ThreadReducer.
+    - **get_transformer**:
+        get_transformer gives the ProcessTransformer instance shared by the
+        whole process (it is created the first time it is needed).
+    - **transform**:
+        transform applies a function to each line of a dimension with the
+        shared ProcessTransformer.
+"""
+
+# Authors: Elodie Ikkache CNRS <elodie.ikkache@student.ecp.fr>
+#          Thomas Deneux CNRS <thomas.deneux@unic.cnrs-gif.fr>
+#
+# version 1.0
+# -*- coding: utf-8 -*-
+
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+
+# all the reductions that can be computed, the nan-aware variants ignore the
+# NaN values
+REDUCTIONS = {'mean': np.mean,
+              'sum': np.sum,
+              'min': np.min,
+              'max': np.max,
+              'std': np.std,
+              'nanmean': np.nanmean,
+              'nansum': np.nansum,
+              'nanmin': np.nanmin,
+              'nanmax': np.nanmax,
+              'nanstd': np.nanstd}
+
+
+class ThreadReducer:
+    """ Computes reductions of numpy arrays in a pool of threads.
+
+    The array is split into chunks along the longest dimension that is not
+    reduced, so that each chunk gives a distinct part of the result and no
+    partial results need to be combined (this also makes 'std' exact). Small
+    arrays, and reductions over all the dimensions, are computed directly.
+
+    **Parameters**
+
+    - n_workers:
+        number of threads
+
+        (type int)
+
+        (optional, default value is the number of cores)
+    - min_chunk_size:
+        minimal size in bytes of a chunk, arrays smaller than twice this size
+        are reduced without threads
+
+        (type int)
+
+        (optional, default value is 4 MB)
+
+    **Attributes**
+
+    - n_workers:
+        number of threads
+    - min_chunk_size:
+        minimal size in bytes of a chunk
+
+    **Methods**
+
+    - reduce(data, axis, method='mean'):
+        reduces data along axis (int or tuple of int), method is one of
+        'mean', 'sum', 'min', 'max', 'std', 'nanmean', 'nansum', 'nanmin',
+        'nanmax' or 'nanstd'
+    - bin_reduce(data, axis, step, method='mean'):
+        reduces the groups of step consecutive elements along axis (the last
+        group can be smaller), as in the binding step of a zoom
+    - shutdown:
+        stops the threads
+
+    **Examples**
+
+     reducer = ThreadReducer(n_workers=32)
+
+     average = reducer.reduce(data, 2, 'nanmean')
+    """
+
+    def __init__(self, n_workers=None, min_chunk_size=2**22):
+        """Constructor of the class ThreadReducer"""
+        if n_workers is None:
+            n_workers = os.cpu_count() or 1
+        elif not isinstance(n_workers, int) or n_workers < 1:
+            raise Exception("n_workers must be a positive int")
+        if not isinstance(min_chunk_size, int) or min_chunk_size < 0:
+            raise Exception("min_chunk_size must be a non negative int")
+        self._n_workers = n_workers
+        self._min_chunk_size = min_chunk_size
+        # the threads are only started for the first big reduction
+        self._executor = None
+
+    @property
+    def n_workers(self):
+        """number of threads"""
+        return self._n_workers
+
+    @property
+    def min_chunk_size(self):
+        """minimal size in bytes of a chunk"""
+        return self._min_chunk_size
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._n_workers,
+                thread_name_prefix='xplor-reduce')
+        return self._executor
+
+    def _n_chunks(self, data, chunk_axis):
+        """number of chunks to split data into along chunk_axis"""
+        if chunk_axis is None or self._n_workers == 1:
+            return 1
+        n = data.shape[chunk_axis]
+        if self._min_chunk_size:
+            n = min(n, data.nbytes // self._min_chunk_size)
+        return max(1, min(n, self._n_workers))
+
+    def reduce(self, data, axis, method='mean'):
+        """reduces data along axis with method"""
+        if not isinstance(data, np.ndarray):
+            raise Exception("data must be of type numpy.ndarray")
+        if method not in REDUCTIONS:
+            raise Exception("method must be one of " +
+                            ", ".join(REDUCTIONS.keys()))
+        fun = REDUCTIONS[method]
+        nd = data.ndim
+        if isinstance(axis, int):
+            axis = (axis,)
+        try:
+            axis = tuple(sorted(set(a % nd for a in axis)))
+        except TypeError:
+            raise Exception("axis must be an int or a tuple of int")
+        kept = [a for a in range(nd) if a not in axis]
+        if not kept:
+            return fun(data, axis=axis)
+        # split along the longest dimension that is kept
+        chunk_axis = max(kept, key=lambda a: data.shape[a])
+        n_chunks = self._n_chunks(data, chunk_axis)
+        if n_chunks == 1:
+            return fun(data, axis=axis)
+
+        bounds = np.linspace(0, data.shape[chunk_axis], n_chunks + 1)
+        bounds = bounds.astype(int)
+        index = [slice(None)] * nd
+        chunks = []
+        for k in range(n_chunks):
+            index[chunk_axis] = slice(bounds[k], bounds[k + 1])
+            chunks.append(data[tuple(index)])
+        results = list(self._get_executor().map(
+            lambda chunk: fun(chunk, axis=axis), chunks))
+        # position of chunk_axis in the result
+        out_axis = chunk_axis - sum(1 for a in axis if a < chunk_axis)
+        return np.concatenate(results, axis=out_axis)
+
+    def bin_reduce(self, data, axis, step, method='mean'):
+        """reduces the groups of step consecutive elements along axis"""
+        if not isinstance(data, np.ndarray):
+            raise Exception("data must be of type numpy.ndarray")
+        elif not isinstance(axis, int) or not -data.ndim <= axis < data.ndim:
+            raise Exception("axis must correspond to an existing dimension")
+        elif not isinstance(step, int) or step < 1:
+            raise Exception("step must be a positive int")
+        axis %= data.ndim
+        n = data.shape[axis]
+        n_full = (n // step) * step
+        index = [slice(None)] * data.ndim
+        index[axis] = slice(0, n_full)
+        full = data[tuple(index)]
+        # the binned dimension is split into (n // step, step) and the new
+        # dimension of length step is reduced
+        shape = data.shape[:axis] + (n // step, step) + data.shape[axis + 1:]
+        result = self.reduce(full.reshape(shape), axis + 1, method)
+        if n_full < n:
+            index[axis] = slice(n_full, n)
+            rest = self.reduce(data[tuple(index)], axis, method)
+            result = np.concatenate((result, np.expand_dims(rest, axis)),
+                                    axis=axis)
+        return result
+
+    def shutdown(self):
+        """stops the threads"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+_reducer = None
+
+
+def get_reducer():
+    """gives the ThreadReducer instance shared by the whole process"""
+    global _reducer
+    if _reducer is None:
+        _reducer = ThreadReducer()
+    return _reducer
+
+
+def reduce(data, axis, method='mean'):
+    """reduces data along axis with method, in the shared pool of threads"""
+    return get_reducer().reduce(data, axis, method)
+
+
+def bin_reduce(data, axis, step, method='mean'):
+    """reduces the groups of step consecutive elements along axis, in the
+    shared pool of threads"""
+    return get_reducer().bin_reduce(data, axis, step, method)
+
+
+def _shared_memory():
+    """gives the SharedMemory class (multiprocessing.shared_memory exists
+    from python 3.8)"""
+    try:
+        from multiprocessing.shared_memory import SharedMemory
+    except ImportError:
+        raise Exception("transforms in a pool of processes need python 3.8 "
+                        "or later")
+    return SharedMemory
+
+
+def _transform_lines(fun, dim, source, destination, start, stop):
+    """applies fun to the lines start to stop - 1 of dimension dim (this
+    function runs in the processes of ProcessTransformer)"""
+    SharedMemory = _shared_memory()
+    src_block = SharedMemory(name=source[0])
+    dst_block = SharedMemory(name=destination[0])
+    try:
+        src = np.ndarray(source[1], dtype=source[2], buffer=src_block.buf)
+        dst = np.ndarray(destination[1], dtype=destination[2],
+                         buffer=dst_block.buf)
+        index = [slice(None)] * len(source[1])
+        for i in range(start, stop):
+            index[dim] = i
+            dst[tuple(index)] = fun(src[tuple(index)])
+        # the arrays must not use the memory blocks anymore when closing them
+        del src, dst
+    finally:
+        src_block.close()
+        dst_block.close()
+
+
+class ProcessTransformer:
+    """ Applies a function to each line of a dimension in a pool of
+    processes.
+
+    The function receives a line of the data (i.e. the data for one element
+    of the dimension, with one dimension less) and must return the new values
+    for this line, with the same shape. It must be defined at the top level of
+    a module so that it can be sent to the processes.
+
+    The source array is copied once in a shared memory block and the result
+    is written by the processes in another shared memory block: the
+    processes only receive the names of the blocks and the range of lines
+    they must transform, the data itself is never serialized. Shared memory
+    blocks need python 3.8 or later.
+
+    **Parameters**
+
+    - n_workers:
+        number of processes
+
+        (type int)
+
+        (optional, default value is the number of cores)
+    - n_tasks_per_worker:
+        number of ranges of lines given to each process, more ranges balance
+        better the work between processes when lines take different times
+
+        (type int)
+
+        (optional, default value is 4)
+
+    **Attributes**
+
+    - n_workers:
+        number of processes
+
+    **Methods**
+
+    - transform(data, fun, dim, dtype=None):
+        gives a new array in which each line of dimension dim has been
+        transformed by fun, dtype is the type of the new array (by default
+        the type of data)
+    - shutdown:
+        stops the processes
+
+    **Examples**
+
+     transformer = ProcessTransformer()
+
+     detrended = transformer.transform(data, detrend_trace, 1)
+    """
+
+    def __init__(self, n_workers=None, n_tasks_per_worker=4):
+        """Constructor of the class ProcessTransformer"""
+        if n_workers is None:
+            n_workers = os.cpu_count() or 1
+        elif not isinstance(n_workers, int) or n_workers < 1:
+            raise Exception("n_workers must be a positive int")
+        if not isinstance(n_tasks_per_worker, int) or n_tasks_per_worker < 1:
+            raise Exception("n_tasks_per_worker must be a positive int")
+        self._n_workers = n_workers
+        self._n_tasks_per_worker = n_tasks_per_worker
+        # the processes are only started for the first transform
+        self._executor = None
+
+    @property
+    def n_workers(self):
+        """number of processes"""
+        return self._n_workers
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self._n_workers)
+        return self._executor
+
+    def transform(self, data, fun, dim, dtype=None):
+        """transforms each line of dimension dim of data with fun"""
+        if not isinstance(data, np.ndarray):
+            raise Exception("data must be of type numpy.ndarray")
+        elif not callable(fun):
+            raise Exception("fun must be a function")
+        elif not isinstance(dim, int) or not 0 <= dim < data.ndim:
+            raise Exception("dim must correspond to an existing dimension")
+        dtype = data.dtype if dtype is None else np.dtype(dtype)
+        n_lines = data.shape[dim]
+        if n_lines == 0 or data.size == 0:
+            return np.empty(data.shape, dtype)
+
+        SharedMemory = _shared_memory()
+        src_block = SharedMemory(create=True, size=data.nbytes)
+        dst_block = SharedMemory(create=True,
+                                 size=max(1, data.size * dtype.itemsize))
+        try:
+            src = np.ndarray(data.shape, dtype=data.dtype, buffer=src_block.buf)
+            src[...] = data
+            del src
+            source = (src_block.name, data.shape, data.dtype.str)
+            destination = (dst_block.name, data.shape, dtype.str)
+            n_tasks = min(n_lines, self._n_workers * self._n_tasks_per_worker)
+            bounds = np.linspace(0, n_lines, n_tasks + 1).astype(int)
+            futures = [self._get_executor().submit(
+                _transform_lines, fun, dim, source, destination,
+                int(bounds[k]), int(bounds[k + 1])) for k in range(n_tasks)]
+            for future in futures:
+                future.result()
+            dst = np.ndarray(data.shape, dtype=dtype, buffer=dst_block.buf)
+            result = dst.copy()
+            del dst
+        finally:
+            src_block.close()
+            src_block.unlink()
+            dst_block.close()
+            dst_block.unlink()
+        return result
+
+    def shutdown(self):
+        """stops the processes"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+_transformer = None
+
+
+def get_transformer():
+    """gives the ProcessTransformer instance shared by the whole process"""
+    global _transformer
+    if _transformer is None:
+        _transformer = ProcessTransformer()
+    return _transformer
+
+
+def transform(data, fun, dim, dtype=None):
+    """transforms each line of dimension dim of data with fun, in the shared
+    pool of processes"""
+    return get_transformer().transform(data, fun, dim, dtype)
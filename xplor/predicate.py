@@ -0,0 +1,395 @@
+"""predicate module is a module to select the lines of a categorical header
+whose values satisfy an expression.
+
+An expression is written over the columns of the header, with the syntax of
+python, for example:
+    age >= 40 and sex == 'F' and country in ['France', 'Italy']
+    not (18 <= age < 30) or `cell type` != 'neuron'
+(labels that are not names are written between backquotes). It is parsed
+once and compiled into operations on numpy arrays: each comparison gives a
+boolean mask of the lines, and the masks are combined. The values are never
+compared line by line in python:
+    - numeric columns are compared as numpy arrays,
+    - the other columns are compared through their hash index (module
+      column_index): the comparison is made once per distinct value (or per
+      pair of distinct values when two columns are compared), and the result
+      is spread to the lines with the number of the value of each line.
+
+A missing value (NaN or None), or a value that can't be compared (e.g. a
+string compared to a number, in a numeric or a 'mixed' column), does not
+satisfy the comparison, nor its negation: each comparison gives the mask of
+the lines satisfying it and the mask of the lines not satisfying it, and not
+exchanges them, so that "not (age >= 40)" and "age != 40" do not select the
+lines whose age is missing. A bare label (e.g. "alive and age > 40") must be
+a 'logical' column.
+
+
+This module uses:
+    - ast
+    - operator
+    - re
+    - numpy as np
+
+    - xdata
+
+
+There is 1 class in this module:
+
+    - **Predicate**:
+        This class compiles an expression over the columns of a header and
+        gives the lines satisfying it.
+"""
+
+# Authors: Elodie Ikkache CNRS <elodie.ikkache@student.ecp.fr>
+#          Thomas Deneux CNRS <thomas.deneux@unic.cnrs-gif.fr>
+#
+# version 1.0
+# -*- coding: utf-8 -*-
+
+import ast
+import operator
+import re
+
+import numpy as np
+
+import xdata
+
+
+_COMPARISONS = {ast.Eq: operator.eq, ast.NotEq: operator.ne,
+                ast.Lt: operator.lt, ast.LtE: operator.le,
+                ast.Gt: operator.gt, ast.GtE: operator.ge}
+# comparisons of the column on the right side, written with the column on
+# the left side (40 <= age is age >= 40)
+_REVERSED = {operator.eq: operator.eq, operator.ne: operator.ne,
+             operator.lt: operator.gt, operator.le: operator.ge,
+             operator.gt: operator.lt, operator.ge: operator.le}
+_QUOTED = re.compile(r'`([^`]*)`')
+# the literals are ast.Constant from python 3.8, ast.Num, ast.Str and
+# ast.NameConstant before
+_LITERALS = tuple(getattr(ast, name) for name in
+                  ('Constant', 'Num', 'Str', 'NameConstant')
+                  if hasattr(ast, name))
+# kinds of values, only values of the same kind are compared
+_NUMBER, _STRING, _LOGICAL, _OTHER = range(4)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float, np.integer, np.floating)) and \
+        not isinstance(value, bool)
+
+
+def _literal(node):
+    """gives the value of a literal node"""
+    for attribute in ('value', 'n', 's'):
+        if hasattr(node, attribute):
+            return getattr(node, attribute)
+
+
+def _kind(value):
+    if isinstance(value, (bool, np.bool_)):
+        return _LOGICAL
+    elif _is_number(value):
+        return _NUMBER
+    elif isinstance(value, str):
+        return _STRING
+    return _OTHER
+
+
+def _kinds(values):
+    """gives the kind of each value of an array of distinct values"""
+    return np.fromiter((_kind(v) for v in values), dtype=np.int8,
+                       count=len(values))
+
+
+def _array_kind(values):
+    """gives the kind of the values of a numpy array of numbers or bool"""
+    return _LOGICAL if values.dtype.kind == 'b' else _NUMBER
+
+
+def _known(values):
+    """gives the mask of the values of a numpy array that are not missing"""
+    if values.dtype.kind == 'f':
+        return ~np.isnan(values)
+    return np.ones(len(values), dtype=bool)
+
+
+def _nothing(n):
+    """gives the masks of a comparison that no line satisfies or not"""
+    return np.zeros(n, dtype=bool), np.zeros(n, dtype=bool)
+
+
+class _Column:
+    """a column of the expression, by label"""
+
+    def __init__(self, label):
+        self.label = label
+
+
+def _uniques(index):
+    """gives the distinct values of a hash index (numpy array of object)"""
+    uniques = np.empty(index.n_values, dtype=object)
+    uniques[:] = index.uniques
+    return uniques
+
+
+def _compare_values(values, op, other):
+    """compares distinct values (numpy array of object) with a value, or
+    with other distinct values (numpy array of object of the same length),
+    giving the result and whether the values could be compared"""
+    if isinstance(other, np.ndarray):
+        comparable = _kinds(values) == _kinds(other)
+        other = other[comparable]
+    else:
+        comparable = _kinds(values) == _kind(other)
+    result = np.zeros(len(values), dtype=bool)
+    if comparable.any():
+        try:
+            result[comparable] = op(values[comparable], other)
+        except TypeError:
+            # e.g. values that can't be ordered
+            comparable[:] = False
+    return result, comparable
+
+
+def _spread(result, comparable, codes):
+    """gives the masks of the lines satisfying and not satisfying a
+    comparison, from the comparison of the distinct values (the missing
+    values, whose code is -1, are in neither)"""
+    satisfied = np.append(result & comparable, False)
+    unsatisfied = np.append(~result & comparable, False)
+    return satisfied[codes], unsatisfied[codes]
+
+
+def _compare(header, label, op, value):
+    """gives the masks of the lines whose value in the column satisfies and
+    does not satisfy op with value"""
+    values = header.get_column_values(label)
+    if values.dtype.kind in 'biuf':
+        if _kind(value) != _array_kind(values):
+            return _nothing(len(values))
+        result = op(values, value)
+        known = _known(values)
+        return result & known, ~result & known
+    index = header.get_index(label, 'hash')
+    return _spread(*_compare_values(_uniques(index), op, value), index.codes)
+
+
+def _is_in(header, label, values):
+    """gives the masks of the lines whose value in the column is and is not
+    in values"""
+    column = header.get_column_values(label)
+    if column.dtype.kind in 'biuf':
+        kind = _array_kind(column)
+        result = np.isin(column, [v for v in values if _kind(v) == kind])
+        known = _known(column)
+        return result & known, ~result & known
+    index = header.get_index(label, 'hash')
+    # 1 and True are different values
+    values = set((_kind(v), v) for v in values)
+    uniques = _uniques(index)
+    result = np.fromiter(((_kind(u), u) in values for u in uniques),
+                         dtype=bool, count=len(uniques))
+    return _spread(result, np.ones(len(uniques), dtype=bool), index.codes)
+
+
+def _compare_columns(header, left, op, right):
+    """gives the masks of the lines whose values in the columns left and
+    right satisfy and do not satisfy op"""
+    left_values = header.get_column_values(left)
+    right_values = header.get_column_values(right)
+    if left_values.dtype.kind in 'biuf' and \
+            right_values.dtype.kind in 'biuf':
+        if _array_kind(left_values) != _array_kind(right_values):
+            return _nothing(len(left_values))
+        result = op(left_values, right_values)
+        known = _known(left_values) & _known(right_values)
+        return result & known, ~result & known
+    # the comparison is made once per pair of distinct values
+    left_index = header.get_index(left, 'hash')
+    right_index = header.get_index(right, 'hash')
+    known = (left_index.codes >= 0) & (right_index.codes >= 0)
+    n_right = right_index.n_values
+    pairs, inverse = np.unique(left_index.codes[known] * n_right +
+                               right_index.codes[known], return_inverse=True)
+    result, comparable = _compare_values(
+        _uniques(left_index)[pairs // n_right], op,
+        _uniques(right_index)[pairs % n_right])
+    satisfied, unsatisfied = _nothing(len(known))
+    satisfied[known] = (result & comparable)[inverse]
+    unsatisfied[known] = (~result & comparable)[inverse]
+    return satisfied, unsatisfied
+
+
+def _logical(header, label):
+    """gives the masks of the lines whose value in a logical column is True
+    and False"""
+    if header.get_column_descriptor(label).dimension_type != 'logical':
+        raise Exception("column " + str(label) + " is not logical")
+    return _compare(header, label, operator.eq, True)
+
+
+def _both(masks):
+    """gives the masks of the lines satisfying and not satisfying all the
+    conditions"""
+    return (np.logical_and.reduce([m[0] for m in masks]),
+            np.logical_or.reduce([m[1] for m in masks]))
+
+
+def _either(masks):
+    """gives the masks of the lines satisfying and not satisfying one of the
+    conditions"""
+    return (np.logical_or.reduce([m[0] for m in masks]),
+            np.logical_and.reduce([m[1] for m in masks]))
+
+
+class Predicate:
+    """ Expression over the columns of a categorical header.
+
+    The expression can use:
+        - the labels of the columns (between backquotes if they are not
+          names)
+        - numbers, strings, True, False and None
+        - the comparisons ==, !=, <, <=, >, >= (that can be chained, as in
+          18 <= age < 30), between a column and a value or two columns
+        - in and not in, with a list, tuple or set of values
+        - and, or, not and parentheses
+
+    **Parameters**
+
+    - expression:
+        the expression (type str)
+
+    **Attributes**
+
+    - expression:
+        the expression
+    - columns:
+        list of the labels of the columns used by the expression
+
+    **Methods**
+
+    - mask(header):
+        gives for each line of the header whether it satisfies the
+        expression (numpy array of bool)
+    - lines(header):
+        gives the lines of the header satisfying the expression (numpy array
+        of int, in increasing order)
+    """
+
+    def __init__(self, expression):
+        """Constructor of the class Predicate"""
+        if not isinstance(expression, str):
+            raise Exception("expression must be of type str")
+        self._expression = expression
+        self._names = {}
+        # the quoted labels are replaced by names that can be parsed
+        source = _QUOTED.sub(self._quote, expression)
+        try:
+            tree = ast.parse(source.strip(), mode='eval')
+        except SyntaxError:
+            raise Exception("invalid expression: " + expression)
+        self._columns = []
+        self._fun = self._compile(tree.body)
+
+    def _quote(self, match):
+        name = '_column_%d' % len(self._names)
+        self._names[name] = match.group(1)
+        return ' ' + name + ' '
+
+    @property
+    def expression(self):
+        """the expression"""
+        return self._expression
+
+    @property
+    def columns(self):
+        """list of the labels of the columns used by the expression"""
+        return list(self._columns)
+
+    def _operand(self, node):
+        """gives a value, a list of values or a _Column"""
+        if isinstance(node, _LITERALS):
+            return _literal(node)
+        elif isinstance(node, ast.Name):
+            label = self._names.get(node.id, node.id)
+            if label not in self._columns:
+                self._columns.append(label)
+            return _Column(label)
+        elif isinstance(node, ast.UnaryOp) and \
+                isinstance(node.op, (ast.USub, ast.UAdd)):
+            value = self._operand(node.operand)
+            if not _is_number(value):
+                raise Exception("only numbers can have a sign")
+            return -value if isinstance(node.op, ast.USub) else value
+        elif isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+            values = [self._operand(e) for e in node.elts]
+            if any(isinstance(v, (_Column, list)) for v in values):
+                raise Exception("lists must only contain values")
+            return values
+        raise Exception("invalid expression: " + self._expression)
+
+    def _compile_comparison(self, left, op, right):
+        """gives the function computing the masks of one comparison"""
+        if isinstance(op, (ast.In, ast.NotIn)):
+            if not (isinstance(left, _Column) and isinstance(right, list)):
+                raise Exception("in must be used as: column in [values]")
+            label = left.label
+            if isinstance(op, ast.In):
+                return lambda header: _is_in(header, label, right)
+            return lambda header: _is_in(header, label, right)[::-1]
+        op = _COMPARISONS.get(type(op))
+        if op is None:
+            raise Exception("invalid expression: " + self._expression)
+        if isinstance(left, list) or isinstance(right, list):
+            raise Exception("lists can only be used with in")
+        if isinstance(left, _Column) and isinstance(right, _Column):
+            return lambda header: _compare_columns(header, left.label, op,
+                                                   right.label)
+        elif isinstance(left, _Column):
+            return lambda header: _compare(header, left.label, op, right)
+        elif isinstance(right, _Column):
+            reversed_op = _REVERSED[op]
+            return lambda header: _compare(header, right.label, reversed_op,
+                                           left)
+        raise Exception("comparisons must use a column")
+
+    def _compile(self, node):
+        """gives the function computing the masks of the lines satisfying and
+        not satisfying an expression"""
+        if isinstance(node, ast.BoolOp):
+            funs = [self._compile(v) for v in node.values]
+            combine = _both if isinstance(node.op, ast.And) else _either
+            return lambda header: combine([fun(header) for fun in funs])
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            fun = self._compile(node.operand)
+            # the lines whose value is missing stay in neither mask
+            return lambda header: fun(header)[::-1]
+        elif isinstance(node, ast.Compare):
+            operands = [self._operand(node.left)] + \
+                [self._operand(c) for c in node.comparators]
+            # a < b < c is a < b and b < c
+            funs = [self._compile_comparison(operands[i], op,
+                                             operands[i + 1])
+                    for i, op in enumerate(node.ops)]
+            if len(funs) == 1:
+                return funs[0]
+            return lambda header: _both([fun(header) for fun in funs])
+        elif isinstance(node, ast.Name):
+            # a logical column
+            label = self._operand(node).label
+            return lambda header: _logical(header, label)
+        raise Exception("invalid expression: " + self._expression)
+
+    def mask(self, header):
+        """gives for each line of the header whether it satisfies the
+        expression"""
+        if not (isinstance(header, xdata.CategoricalHeader) and
+                header.n_column):
+            raise Exception("header must be a categorical header with values")
+        for label in self._columns:
+            header.get_column_values(label)
+        return np.asarray(self._fun(header)[0], dtype=bool)
+
+    def lines(self, header):
+        """gives the lines of the header satisfying the expression"""
+        return np.flatnonzero(self.mask(header))
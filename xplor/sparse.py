@@ -0,0 +1,366 @@
+"""sparse module is a module to store N dimensional data of which most cells
+are missing.
+
+Long-format data pivoted into a N dimensional array (e.g. country x age x sex
+x month) usually has no observation for most of the combinations. A
+SparseArray only stores the observed cells: their coordinates and their
+values, in the coordinate (COO) format. The cells are sorted in row-major
+order, so that the cells of a line of the first dimension are contiguous, as
+in the compressed sparse row (CSR) format, and are found by a binary search.
+
+A SparseArray can be used as the data of a Xdata instance. Slices and
+reductions are computed on the observed cells only (missing cells are
+ignored, as NaN are ignored by numpy.nanmean), and the data is only made
+dense for the slice to display.
+
+
+This module uses:
+    - numpy as np
+
+
+There is 1 class in this module:
+
+    - **SparseArray**:
+        This class stores the coordinates and the values of the observed
+        cells of a N dimensional array.
+"""
+
+# Authors: Elodie Ikkache CNRS <elodie.ikkache@student.ecp.fr>
+#          Thomas Deneux CNRS <thomas.deneux@unic.cnrs-gif.fr>
+#
+# version 1.0
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+class SparseArray:
+    """ N dimensional array storing only its observed cells.
+
+    **Parameters**
+
+    - coords:
+        coordinates of the observed cells, one line per dimension and one
+        column per cell
+        (type numpy.ndarray of int, or list of lists of int)
+    - values:
+        values of the observed cells (type 1 dimensional numpy.ndarray)
+    - shape:
+        number of elements in each dimension (type tuple of int)
+    - fill_value:
+        value of the missing cells when the array is made dense
+
+        (optional, default value is numpy.nan)
+
+    **Attributes**
+
+    - shape:
+        number of elements in each dimension
+    - ndim:
+        number of dimensions
+    - size:
+        number of cells (observed or not)
+    - dtype:
+        type of the values
+    - nnz:
+        number of observed cells
+    - density:
+        proportion of observed cells
+    - nbytes:
+        memory used by the coordinates and the values
+    - coords:
+        coordinates of the observed cells, sorted in row-major order
+    - values:
+        values of the observed cells
+    - fill_value:
+        value of the missing cells
+
+    **Methods**
+
+    - todense:
+        gives the dense numpy.ndarray, missing cells being fill_value
+    - copy:
+        gives a copy of the array
+    - transpose(axes):
+        permutes the dimensions
+    - index(axis, i):
+        gives the line i of dimension axis, the dimension being removed
+    - take(indices, axis):
+        gives the lines indices of dimension axis
+    - reduce(axis, method):
+        reduces the dimension(s) axis with method ('mean', 'sum', 'min',
+        'max' or 'count'), only the observed cells being used
+    - group(axis, groups, n_group, method):
+        reduces together the lines of dimension axis that belong to the same
+        group (groups gives the group of each line)
+    - with_values(values):
+        gives an array with the same observed cells and new values
+
+    *(static methods)*
+
+    - from_dense(array, fill_value=numpy.nan):
+        gives the SparseArray of the cells of array that are not fill_value
+
+    **Examples**
+
+     a = SparseArray([[0, 2], [1, 0]], [3.5, 4.], (3, 2))
+
+     a.todense()
+
+     a.reduce(1, 'mean')
+    """
+
+    METHODS = ['mean', 'sum', 'min', 'max', 'count']
+
+    def __init__(self, coords, values, shape, fill_value=np.nan):
+        """Constructor of the class SparseArray"""
+        try:
+            shape = tuple(int(n) for n in shape)
+        except (TypeError, ValueError):
+            raise Exception("shape must be a tuple of int")
+        if any(n < 0 for n in shape):
+            raise Exception("shape must be a tuple of non negative int")
+        values = np.asarray(values)
+        if values.ndim != 1:
+            raise Exception("values must be a 1 dimensional array")
+        try:
+            coords = np.asarray(coords, dtype=np.intp).reshape(
+                len(shape), len(values))
+        except (TypeError, ValueError):
+            raise Exception("coords must give one coordinate per dimension "
+                            "for each value")
+        for d in range(len(shape)):
+            if len(values) and (coords[d].min() < 0 or
+                                coords[d].max() >= shape[d]):
+                raise Exception("coords must be in [0, n_elem[ for each "
+                                "dimension")
+        linear = SparseArray._linear(coords, shape)
+        order = np.argsort(linear, kind='stable')
+        if (np.diff(linear[order]) == 0).any():
+            raise Exception("a cell can't be given several values")
+        self._coords = coords[:, order]
+        self._values = values[order]
+        self._shape = shape
+        self._fill_value = fill_value
+
+    @classmethod
+    def _from_sorted(cls, coords, values, shape, fill_value):
+        """creates an instance from coordinates that are already sorted and
+        checked"""
+        obj = cls.__new__(cls)
+        obj._coords = coords
+        obj._values = values
+        obj._shape = tuple(shape)
+        obj._fill_value = fill_value
+        return obj
+
+    @staticmethod
+    def _linear(coords, shape):
+        """gives the row-major index of each cell"""
+        if len(shape) == 0:
+            return np.zeros(coords.shape[1], dtype=np.intp)
+        return np.ravel_multi_index(tuple(coords), shape)
+
+    @property
+    def shape(self):
+        """number of elements in each dimension"""
+        return self._shape
+
+    @property
+    def ndim(self):
+        """number of dimensions"""
+        return len(self._shape)
+
+    @property
+    def size(self):
+        """number of cells (observed or not)"""
+        return int(np.prod(self._shape))
+
+    @property
+    def dtype(self):
+        """type of the values"""
+        return self._values.dtype
+
+    @property
+    def nnz(self):
+        """number of observed cells"""
+        return len(self._values)
+
+    @property
+    def density(self):
+        """proportion of observed cells"""
+        if self.size == 0:
+            return 0.
+        return self.nnz / self.size
+
+    @property
+    def nbytes(self):
+        """memory used by the coordinates and the values"""
+        return self._coords.nbytes + self._values.nbytes
+
+    @property
+    def coords(self):
+        """coordinates of the observed cells, sorted in row-major order"""
+        return self._coords
+
+    @property
+    def values(self):
+        """values of the observed cells"""
+        return self._values
+
+    @property
+    def fill_value(self):
+        """value of the missing cells"""
+        return self._fill_value
+
+    def __array__(self, dtype=None):
+        dense = self.todense()
+        if dtype is not None:
+            dense = dense.astype(dtype)
+        return dense
+
+    def todense(self):
+        """gives the dense numpy.ndarray"""
+        dtype = np.promote_types(self._values.dtype,
+                                 np.asarray(self._fill_value).dtype)
+        dense = np.full(self._shape, self._fill_value, dtype=dtype)
+        dense[tuple(self._coords)] = self._values
+        return dense
+
+    @staticmethod
+    def from_dense(array, fill_value=np.nan):
+        """gives the SparseArray of the cells of array that are not
+        fill_value"""
+        array = np.asarray(array)
+        if isinstance(fill_value, float) and np.isnan(fill_value):
+            observed = ~np.isnan(array)
+        else:
+            observed = array != fill_value
+        coords = np.array(np.nonzero(observed), dtype=np.intp).reshape(
+            array.ndim, -1)
+        # np.nonzero gives the cells in row-major order
+        return SparseArray._from_sorted(coords, array[observed], array.shape,
+                                        fill_value)
+
+    def copy(self):
+        """gives a copy of the array"""
+        return SparseArray._from_sorted(self._coords.copy(),
+                                        self._values.copy(), self._shape,
+                                        self._fill_value)
+
+    def with_values(self, values):
+        """gives an array with the same observed cells and new values"""
+        values = np.asarray(values)
+        if values.shape != self._values.shape:
+            raise Exception("there must be one value for each observed cell")
+        return SparseArray._from_sorted(self._coords, values, self._shape,
+                                        self._fill_value)
+
+    def _check_axis(self, axis):
+        if not isinstance(axis, (int, np.integer)):
+            raise Exception("axis must be of type int")
+        elif axis < 0 or axis >= self.ndim:
+            raise Exception("axis must correspond to an existing dimension")
+        return int(axis)
+
+    def _sorted(self, coords, values, shape):
+        """gives the instance with the cells sorted again"""
+        order = np.argsort(SparseArray._linear(coords, shape), kind='stable')
+        return SparseArray._from_sorted(coords[:, order], values[order],
+                                        shape, self._fill_value)
+
+    def transpose(self, axes=None):
+        """permutes the dimensions"""
+        if axes is None:
+            axes = list(range(self.ndim))[::-1]
+        axes = list(axes)
+        if sorted(axes) != list(range(self.ndim)):
+            raise Exception("axes is not a permutation of the dimensions")
+        shape = tuple(self._shape[a] for a in axes)
+        return self._sorted(self._coords[axes], self._values, shape)
+
+    def index(self, axis, i):
+        """gives the line i of dimension axis, the dimension being removed"""
+        axis = self._check_axis(axis)
+        if not 0 <= i < self._shape[axis]:
+            raise Exception("i must be in [0, n_elem[")
+        if axis == 0:
+            # the lines of the first dimension are contiguous
+            start, stop = np.searchsorted(self._coords[0], [i, i + 1])
+            selected = slice(start, stop)
+        else:
+            selected = self._coords[axis] == i
+        coords = np.delete(self._coords[:, selected], axis, axis=0)
+        shape = self._shape[:axis] + self._shape[axis + 1:]
+        # removing a dimension keeps the row-major order
+        return SparseArray._from_sorted(coords, self._values[selected], shape,
+                                        self._fill_value)
+
+    def take(self, indices, axis):
+        """gives the lines indices of dimension axis (in this order, a line
+        can be taken several times)"""
+        axis = self._check_axis(axis)
+        indices = np.asarray(indices, dtype=np.intp).reshape(-1)
+        if len(indices) and (indices.min() < 0 or
+                             indices.max() >= self._shape[axis]):
+            raise Exception("indices must be in [0, n_elem[")
+        # for each cell, the positions at which its line is taken
+        order = np.argsort(indices, kind='stable')
+        sorted_indices = indices[order]
+        lines = self._coords[axis]
+        left = np.searchsorted(sorted_indices, lines, 'left')
+        counts = np.searchsorted(sorted_indices, lines, 'right') - left
+        cells = np.repeat(np.arange(self.nnz), counts)
+        offsets = (np.arange(len(cells)) -
+                   np.repeat(np.cumsum(counts) - counts, counts))
+        coords = self._coords[:, cells]
+        coords[axis] = order[np.repeat(left, counts) + offsets]
+        shape = list(self._shape)
+        shape[axis] = len(indices)
+        return self._sorted(coords, self._values[cells], tuple(shape))
+
+    def reduce(self, axis, method='mean'):
+        """reduces the dimension(s) axis, missing cells are ignored"""
+        if isinstance(axis, (int, np.integer)):
+            axis = (axis,)
+        axis = [self._check_axis(a) for a in axis]
+        kept = [d for d in range(self.ndim) if d not in axis]
+        shape = tuple(self._shape[d] for d in kept)
+        return self._aggregate(self._coords[kept], shape, method)
+
+    def group(self, axis, groups, n_group, method='mean'):
+        """reduces together the lines of dimension axis that belong to the
+        same group, missing cells are ignored"""
+        axis = self._check_axis(axis)
+        groups = np.asarray(groups, dtype=np.intp)
+        if groups.shape != (self._shape[axis],):
+            raise Exception("groups must give the group of each line")
+        coords = self._coords.copy()
+        coords[axis] = groups[coords[axis]]
+        shape = list(self._shape)
+        shape[axis] = n_group
+        return self._aggregate(coords, tuple(shape), method)
+
+    def _aggregate(self, coords, shape, method):
+        """combines the values of the cells having the same coordinates"""
+        if method not in SparseArray.METHODS:
+            raise Exception("method must be 'mean', 'sum', 'min', 'max' or "
+                            "'count'")
+        linear = SparseArray._linear(coords, shape)
+        cells, first, inverse = np.unique(linear, return_index=True,
+                                          return_inverse=True)
+        n_cell = len(cells)
+        if method == 'count':
+            values = np.bincount(inverse, minlength=n_cell)
+        elif method in ['mean', 'sum']:
+            values = np.bincount(inverse, weights=self._values,
+                                 minlength=n_cell)
+            if method == 'mean':
+                values = values / np.bincount(inverse, minlength=n_cell)
+        else:
+            values = self._values[first].copy()
+            ufunc = np.minimum if method == 'min' else np.maximum
+            ufunc.at(values, inverse, self._values)
+        new_coords = coords[:, first].reshape(len(shape), n_cell)
+        return SparseArray._from_sorted(new_coords, values, shape,
+                                        self._fill_value)
@@ -0,0 +1,232 @@
+"""stream module is a module to display data while it is being acquired.
+
+During a live recording, samples are appended along a measure dimension
+(usually time) and the oldest ones are dropped, so that a window of fixed
+length is displayed. A StreamingXdata keeps the samples in a circular buffer
+of fixed capacity: a push only writes the new samples, the whole array is
+never reallocated.
+
+The buffer is mirrored (each sample is written at position i and at
+position i + capacity), so that the samples in the window are always
+contiguous in memory: the data of the StreamingXdata is a view of the
+buffer, and can be used by all the methods of Xdata (filters, reductions...)
+without being copied.
+
+
+This module uses:
+    - numpy as np
+    - threading
+
+    - xdata
+
+
+There is 1 class in this module:
+
+    - **StreamingXdata**:
+        StreamingXdata is a subclass of Xdata whose data is a window of fixed
+        capacity along a MeasureHeader, in which samples are pushed.
+"""
+
+# Authors: Elodie Ikkache CNRS <elodie.ikkache@student.ecp.fr>
+#          Thomas Deneux CNRS <thomas.deneux@unic.cnrs-gif.fr>
+#
+# version 1.0
+# -*- coding: utf-8 -*-
+
+import threading
+
+import numpy as np
+
+import xdata
+
+
+class StreamingXdata(xdata.Xdata):
+    """ Xdata instance in which samples are pushed along a measure dimension.
+
+    The dimension dim (described by a MeasureHeader, e.g. time) is a window
+    of at most capacity samples. Pushing samples writes them in a circular
+    buffer (the cost only depends on the number of samples pushed), drops
+    the oldest ones if the window is full, advances the start of the header
+    accordingly and notifies the listeners once.
+
+    The data is a view of the buffer: it is only valid until the next push.
+    Readers running in another thread than the one pushing the samples must
+    use snapshot.
+
+    **Parameters**
+
+    - name:
+        name of the dataset (type str)
+    - headers:
+        list of the headers describing each of the N dimensions, headers[dim]
+        must be a MeasureHeader whose start is the value of the first sample
+        to be pushed (its n_elem is not used, the stream is empty at first)
+    - dim:
+        number of the dimension in which samples are pushed (type int)
+    - capacity:
+        maximal number of samples in the window (type int)
+    - unit:
+        simple unit or list of conversion
+
+        (optional)
+    - calibration:
+        pair (scale, offset) if the samples are quantized
+
+        (optional)
+    - dtype:
+        type of the samples
+
+        (optional, default value is numpy.float64)
+
+    **Attributes**
+
+    (in addition to the attributes of Xdata)
+
+    - dim:
+        number of the dimension in which samples are pushed
+    - capacity:
+        maximal number of samples in the window
+    - n_pushed:
+        number of samples pushed since the creation of the stream
+
+    **Methods**
+
+    (in addition to the methods of Xdata)
+
+    - push(samples):
+        appends samples along dim (numpy array with the shape of the data,
+        except in dimension dim, or with one dimension less for a single
+        sample), the oldest samples being dropped
+    - snapshot:
+        gives a Xdata instance with a copy of the current window
+    - add_listener(fun):
+        fun(stream, n_new, n_dropped) will be called after each push
+    - remove_listener(fun):
+        stops notifying fun
+
+    **Examples**
+
+     channels = CategoricalHeader('channels', n_elem=4)
+
+     time = MeasureHeader('time', 0, 0, 0.001, 's')
+
+     stream = StreamingXdata('signal', [time, channels], 0, 5000)
+
+     stream.push(np.random.rand(100, 4))
+    """
+
+    def __init__(self,
+                 name,
+                 headers,
+                 dim,
+                 capacity,
+                 unit=None,
+                 calibration=None,
+                 dtype=np.float64):
+        """Constructor of the class StreamingXdata"""
+        if not isinstance(headers, list):
+            raise Exception("headers must be of type list")
+        elif not isinstance(dim, int):
+            raise Exception("dim must be of type int")
+        elif dim < 0 or dim >= len(headers):
+            raise Exception("dim must correspond to an existing dimension")
+        elif not isinstance(headers[dim], xdata.MeasureHeader):
+            raise Exception("samples can only be pushed along a "
+                            "MeasureHeader")
+        elif not isinstance(capacity, int) or capacity <= 0:
+            raise Exception("capacity must be a positive int")
+        for h in headers:
+            if not isinstance(h, xdata.Header):
+                raise Exception("headers must only contain header elements")
+        self._dim = dim
+        self._capacity = capacity
+        # the buffer is mirrored: the window is always a contiguous view
+        shape = [h.n_elem for h in headers]
+        shape[dim] = 2 * capacity
+        self._buffer = np.zeros(shape, dtype=dtype)
+        self._head = 0
+        self._count = 0
+        self._n_pushed = 0
+        self._first_start = headers[dim].start
+        self._lock = threading.Lock()
+        self._listeners = []
+        headers = list(headers)
+        headers[dim] = headers[dim].update_measure_header(n_elem=0)
+        xdata.Xdata.__init__(self, name, self._window(), headers, unit,
+                             calibration)
+
+    @property
+    def dim(self):
+        """number of the dimension in which samples are pushed"""
+        return self._dim
+
+    @property
+    def capacity(self):
+        """maximal number of samples in the window"""
+        return self._capacity
+
+    @property
+    def n_pushed(self):
+        """number of samples pushed since the creation of the stream"""
+        return self._n_pushed
+
+    def _window(self):
+        """gives the view of the buffer with the samples of the window"""
+        index = [slice(None)] * self._buffer.ndim
+        index[self._dim] = slice(self._head, self._head + self._count)
+        return self._buffer[tuple(index)]
+
+    def push(self, samples):
+        """appends samples along dim, the oldest samples being dropped"""
+        samples = np.asarray(samples)
+        dim = self._dim
+        if samples.ndim == self._buffer.ndim - 1:
+            samples = np.expand_dims(samples, dim)
+        expected = list(self._buffer.shape)
+        if samples.ndim == len(expected):
+            expected[dim] = samples.shape[dim]
+        if list(samples.shape) != expected:
+            raise Exception("samples must have the shape of the data, except "
+                            "in the dimension of the stream")
+        n_new = samples.shape[dim]
+        capacity = self._capacity
+        with self._lock:
+            # samples that would be dropped at once are not written
+            skipped = max(0, n_new - capacity)
+            new = np.moveaxis(samples, dim, 0)[skipped:]
+            buffer = np.moveaxis(self._buffer, dim, 0)
+            position = (self._head + self._count + skipped) % capacity
+            n_first = min(len(new), capacity - position)
+            for offset in [0, capacity]:
+                buffer[offset + position:offset + position + n_first] = \
+                    new[:n_first]
+                buffer[offset:offset + len(new) - n_first] = new[n_first:]
+            count = min(self._count + n_new, capacity)
+            n_dropped = self._count + n_new - count
+            self._head = (self._head + n_dropped) % capacity
+            self._count = count
+            self._n_pushed += n_new
+            # the header follows the window, the data is a new view
+            header = self._headers[dim]
+            start = (self._first_start +
+                     (self._n_pushed - count) * header.scale)
+            self._headers[dim] = header.update_measure_header(start=start,
+                                                              n_elem=count)
+            self._data = self._window()
+            self._version = next(xdata._xdata_versions)
+            self._statistics = None
+        for fun in list(self._listeners):
+            fun(self, n_new, n_dropped)
+
+    def snapshot(self):
+        """gives a Xdata instance with a copy of the current window"""
+        with self._lock:
+            return xdata.Xdata.copy(self)
+
+    def add_listener(self, fun):
+        """fun(stream, n_new, n_dropped) will be called after each push"""
+        self._listeners.append(fun)
+
+    def remove_listener(self, fun):
+        """stops notifying fun"""
+        self._listeners.remove(fun)
@@ -3,13 +3,51 @@
 
 The modules that need to be tested are:
     - xdata (shape of the data itself)
+    - bank (previously used units)
+    - column_index (lines of the headers having some values)
+    - parallel (computations on several cores)
+    - sparse (data with mostly missing cells)
+    - stream (data being acquired)
+    - ingest (samples received through a socket)
+    - instrumentation (time and memory used by the operations)
+    - memory (memory used by the versions of the data)
+    - benchmark (growth of the time with the size of the data)
+    - operation (filters and slicers)
+    - predicate (selection of the elements satisfying an expression)
+    - bitset (selections as sets of bits)
+    - list_display (choice of the elements selected by a filter)
+    - lazy (optimized graphs of operations on the data)
+    - arrow_interop (exchange of data with Apache Arrow)
     - view (display of the data and commands)
 
 This module uses:
+        json
         numpy
+        os
         pandas
+        tempfile
+        threading
+        socket
+        sys
+        tracemalloc
         unittest
 
+        arrow_interop
+        bank
+        benchmark
+        bitset
+        column_index
+        ingest
+        instrumentation
+        lazy
+        list_display
+        memory
+        operation
+        parallel
+        predicate
+        sparse
+        stream
+        view (if vispy is installed)
         xdata
 
 """
@@ -20,16 +58,71 @@ This module uses:
 # version 1.0
 # -*- coding: utf-8 -*-
 
+import json
 import numpy as np
+import os
 import pandas as pd
+import tempfile
+import socket
+import sys
+import threading
+import tracemalloc
 import unittest
 
 
+import arrow_interop
+import bank
+import benchmark
+import bitset
+import column_index
+import ingest
+import instrumentation
+import lazy
+import list_display
+import memory
+import operation
+import parallel
+import predicate
+import sparse
+import stream
 import xdata
+try:
+    # the display needs vispy, it is not tested without it
+    import view
+except ImportError:
+    view = None
+
+
+def detrend_line(line):
+    """removes the linear trend of each trace (used in the tests of
+    ProcessTransformer, which need a function defined at the top level)"""
+    t = np.arange(line.shape[-1])
+    result = np.empty(line.shape)
+    for i in range(line.shape[0]):
+        slope, offset = np.polyfit(t, line[i], 1)
+        result[i] = line[i] - (slope * t + offset)
+    return result
 
 
 class MyTestCase(unittest.TestCase):
 
+    def setUp(self):
+        # the shared unit bank is stored in a temporary file, so that the
+        # tests neither depend on nor modify the bank of the user
+        self._bank_dir = tempfile.TemporaryDirectory()
+        self._bank_path = os.environ.get('XPLOR_BANK')
+        os.environ['XPLOR_BANK'] = os.path.join(self._bank_dir.name,
+                                                'unit_bank.json')
+        bank._unit_bank = None
+
+    def tearDown(self):
+        if self._bank_path is None:
+            del os.environ['XPLOR_BANK']
+        else:
+            os.environ['XPLOR_BANK'] = self._bank_path
+        bank._unit_bank = None
+        self._bank_dir.cleanup()
+
     def test_xdata_module_DimensionDescription_class(self):
         p = xdata.DimensionDescription('prices', 'numeric', 'euros')
         r = xdata.DimensionDescription('race_times', 'numeric',
@@ -609,13 +702,26 @@ class MyTestCase(unittest.TestCase):
         self.assertEqual(fruits2.column_descriptors[2].dimension_type,
                          'string')
         self.assertEqual(fruits2.values.shape, (4, 3))
+
+        print("Test 17: testing group_lines method")
+        self.assertRaises(Exception, fruits.group_lines, 'unknown')
+        self.assertRaises(Exception, fruits.group_lines, 3)
+        groups, grouped = new_fruits.group_lines('colors')
+        self.assertEqual(list(groups), [0, 1, 2, 0])
+        self.assertEqual(grouped.n_elem, 3)
+        self.assertEqual(grouped.get_value(0, 'colors'), 'red')
+        self.assertEqual(grouped.get_value(0, 'fruits'), ['apple', 'cherry'])
+        self.assertEqual(grouped.get_value(1, 'fruits'), 'pear')
+        self.assertEqual(grouped.get_value(0, 'display'),
+                         xdata.Color((4, 4, 4)))
+        self.assertEqual(grouped.get_value(2, 'display'),
+                         xdata.Color((0, 0, 0)))
         print("\n")
 
     def test_xdata_module_MeasureHeader_class(self):
         x = xdata.MeasureHeader('x', 1, 6, 0.5, 'mm')
-        # TODO get unit from bank and also path when it fails to find a
-        # correspondence
-        # y = xdata.MeasureHeader('y', 1, 0, 0.5, 'mm', True)
+        y = xdata.MeasureHeader('y', 1, 0, 0.5, 'mm', True)
+        z = xdata.MeasureHeader('z', 1, 0, 0.5, 'unknown_unit', True)
         time = xdata.DimensionDescription('time', 'numeric', 's')
         t = xdata.MeasureHeader('time',
                                 0.6,
@@ -680,6 +786,14 @@ class MyTestCase(unittest.TestCase):
         self.assertRaises(Exception, xdata.MeasureHeader,
                           'time', 0, 10, 2, 4)
 
+        # units from the bank
+        self.assertEqual(y.unit, 'mm')
+        self.assertEqual(y.get_all_units()[0][0], {'unit': 'nm',
+                                                   'value': 10**(-6)})
+        self.assertEqual(len(y.get_all_units()[0]), 6)
+        self.assertEqual(z.get_all_units(), [[{'unit': 'unknown_unit',
+                                               'value': 1.0}]])
+
         print("Test 4: testing the __eq__ method")
         self.assertTrue(t == t2)
         self.assertFalse(x == t)
@@ -1195,6 +1309,412 @@ class MyTestCase(unittest.TestCase):
                           'dim_perm', [0, 2, 1], np.random.rand(5, 5, 3), None)
         print("\n")
 
+    def test_column_index_module_HashIndex_class(self):
+        sex = ['F', 'M', 'F', None, 'M', 'F', 'X', 'M']
+        age = [40, 23.5, 64, 70, np.nan, 52, 40, 18]
+        people = xdata.CategoricalHeader(
+            'people', ['sex', 'age'],
+            pd.DataFrame({0: sex, 1: age}))
+
+        def brute_force(header, column, low, high=None):
+            values = header.values[column]
+            if high is None:
+                return [i for i in range(header.n_elem)
+                        if values[i] == low]
+            return [i for i in range(header.n_elem)
+                    if not pd.isnull(values[i]) and low <= values[i] <= high]
+
+        print("Tests for the classes HashIndex and SortedIndex (module "
+              "column_index): \n")
+
+        print("Test 1: raising errors for arguments with wrong types")
+        self.assertRaises(Exception, people.get_index, 'sex', 'btree')
+        self.assertRaises(Exception, people.find_lines, 'height', 'F')
+        self.assertRaises(Exception, column_index.HashIndex, [[1], [2]])
+        self.assertRaises(Exception, column_index.SortedIndex, ['a', 1])
+        self.assertRaises(Exception, people.find_range, 'age', 'a', 'b')
+
+        print("Test 2: finding the lines by value and by range")
+        np.testing.assert_array_equal(people.find_lines('sex', 'F'),
+                                      [0, 2, 5])
+        np.testing.assert_array_equal(people.find_lines(0, 'Y'), [])
+        np.testing.assert_array_equal(people.find_range('age', 40, 64),
+                                      [0, 2, 5, 6])
+        np.testing.assert_array_equal(people.find_range('age', high=30),
+                                      [1, 7])
+        np.testing.assert_array_equal(people.find_range('sex', 'G', 'Z'),
+                                      [1, 4, 6, 7])
+        self.assertEqual(people.get_index('sex').n_values, 3)
+        self.assertTrue(people.get_index('sex') is people.get_index(0))
+        self.assertEqual(people.get_value(2, 'age'), 64)
+
+        print("Test 3: the indexes follow the updates of the header")
+        updates = [
+            ('perm', [7, 6, 5, 4, 3, 2, 1, 0], None),
+            ('chg', [1, 6], [pd.Series(['F', 45.]), pd.Series(['M', 12.])]),
+            ('new', None, [pd.Series(['X', 64.]), pd.Series(['F', 41.])]),
+            ('remove', [0, 5], [])]
+        people.get_index('age', 'hash')
+        for flag, ind, values in updates:
+            updated = people.update_categorical_header(flag, ind, values)
+            for kind in ['hash', 'sorted']:
+                self.assertTrue((0, kind) in updated._indexes)
+                self.assertTrue((1, kind) in updated._indexes)
+            for value in ['F', 'M', 'X']:
+                np.testing.assert_array_equal(
+                    updated.find_lines('sex', value),
+                    brute_force(updated, 0, value))
+            np.testing.assert_array_equal(updated.find_range('age', 40, 64),
+                                          brute_force(updated, 1, 40, 64))
+            np.testing.assert_array_equal(updated.find_lines('age', 40),
+                                          brute_force(updated, 1, 40))
+            np.testing.assert_array_equal(updated.find_range('sex', 'G'),
+                                          brute_force(updated, 0, 'G', 'Z'))
+            people = updated
+        # a copy shares the indexes
+        self.assertTrue(people.copy().get_index('sex') is
+                        people.get_index('sex'))
+        # an index that cannot follow the new values is dropped, the other
+        # errors are raised
+        things = xdata.CategoricalHeader(
+            'things', [xdata.DimensionDescription('value', 'mixed')],
+            pd.DataFrame([[1.], [2.], [3.]]))
+        things.get_index('value', 'sorted')
+        updated = things.update_categorical_header(
+            'new', None, [pd.Series(['a'])])
+        self.assertFalse((0, 'sorted') in updated._indexes)
+
+        class BrokenIndex:
+            def updated(self, flag, ind, new_values, n_elem):
+                raise ValueError("bug")
+
+        things._indexes[(0, 'hash')] = BrokenIndex()
+        self.assertRaises(ValueError, things.update_categorical_header,
+                          'perm', [2, 1, 0], None)
+
+        print("Test 4: the errors of the builds in the background")
+        mixed = xdata.CategoricalHeader(
+            'things', [xdata.DimensionDescription('value', 'mixed')],
+            pd.DataFrame([[1.], ['a'], [3.]]))
+        self.assertTrue(mixed.get_index('value', 'sorted', wait=False)
+                        is None)
+        # the caller waiting for the index gets the error
+        self.assertRaises(Exception, mixed.get_index, 'value', 'sorted')
+        self.assertEqual(mixed._building, {})
+        self.assertRaises(Exception, mixed.get_index, 'value', 'sorted')
+        print("\n")
+
+    def test_column_index_module_TextIndex_class(self):
+        names = ['Cell%04d' % i for i in range(3000)] + \
+            ['GeneABC', 'gene_abd', None, np.nan, 'ab', 'Straße']
+        genes = xdata.CategoricalHeader('genes', ['name'],
+                                        pd.DataFrame({0: names}))
+        queries = ['c', 'cell', 'cell01', 'cell0123', 'ell012', '12', 'ab',
+                   'gene', 'GENE_', 'strasse', 'xyz', '']
+
+        print("Tests for the class TextIndex (module column_index): \n")
+
+        print("Test 1: raising errors for arguments with wrong types")
+        index = column_index.TextIndex(names)
+        self.assertRaises(Exception, index.find, 12)
+        self.assertRaises(Exception, index.find, 'a', 'suffix')
+        self.assertRaises(Exception, column_index.scan_text, names, 'a',
+                          'suffix')
+        self.assertRaises(Exception, genes.search_lines, 'weight', 'a')
+
+        print("Test 2: finding the lines by prefix and by substring")
+        self.assertEqual(index.n_values, 3004)
+        np.testing.assert_array_equal(index.find_prefix('gene'),
+                                      [3000, 3001])
+        np.testing.assert_array_equal(index.find_substring('AB'),
+                                      [3000, 3001, 3004])
+        np.testing.assert_array_equal(index.find_prefix('Cell01'),
+                                      np.arange(100, 200))
+        for mode in ['prefix', 'substring']:
+            for query in queries:
+                np.testing.assert_array_equal(
+                    index.find(query, mode),
+                    column_index.scan_text(names, query, mode))
+        # typing one more character refines the previous results
+        for query in ['9', '99', '999', '9990', '0999']:
+            np.testing.assert_array_equal(
+                index.find(query),
+                column_index.scan_text(names, query))
+
+        print("Test 3: building the index in the background")
+        self.assertTrue(genes.get_index('name', 'text', wait=False) is None)
+        # the lines are scanned while the index is being built
+        np.testing.assert_array_equal(genes.search_lines('name', 'gene_'),
+                                      [3001])
+        index = genes.get_index('name', 'text')
+        self.assertTrue(genes.get_index(0, 'text', wait=False) is index)
+        self.assertEqual(genes._building, {})
+        np.testing.assert_array_equal(
+            genes.search_lines(0, 'cell29', 'prefix'), np.arange(2900, 3000))
+
+        print("Test 4: updating the index with the header")
+        perm = list(range(len(names)))[::-1]
+        reverse = genes.update_categorical_header('perm', perm, None)
+        np.testing.assert_array_equal(reverse.search_lines(0, 'gene'),
+                                      [4, 5])
+        self.assertTrue((0, 'text') in reverse._indexes)
+        removed = genes.update_categorical_header('remove', [0, 3000], None)
+        np.testing.assert_array_equal(removed.search_lines(0, 'gene'),
+                                      [2999])
+        new = genes.update_categorical_header(
+            'new', None, [pd.Series(['cell0001'])])
+        np.testing.assert_array_equal(new.search_lines(0, 'cell0001'),
+                                      [1, len(names)])
+        # a text that was not indexed: the index is built again
+        new = genes.update_categorical_header(
+            'new', None, [pd.Series(['neuron'])])
+        self.assertFalse((0, 'text') in new._indexes)
+        np.testing.assert_array_equal(new.search_lines(0, 'euro'),
+                                      [len(names)])
+
+        print("Test 5: searching the elements of a ListDisplay")
+        f = operation.Filter('genes')
+        display = list_display.ListDisplay(f, genes, n_visible=10)
+        np.testing.assert_array_equal(display.search('gene'), [3000, 3001])
+        # the window is shown from the first row found, within the list
+        self.assertEqual(display.model.first, len(names) - 10)
+        display.select_found('cell002')
+        self.assertEqual(tuple(f.selection), tuple(range(20, 30)))
+        self.assertEqual(len(display.select_found('xyz')), 0)
+        self.assertEqual(tuple(f.selection), tuple(range(20, 30)))
+        time = xdata.MeasureHeader('time', 0, 100, 0.5, 's')
+        np.testing.assert_array_equal(
+            list_display.ListDisplay(operation.Filter('time'),
+                                     time).search('49.5'), [99])
+        print("\n")
+
+    def test_xdata_module_Xdata_group_by_method(self):
+        t = xdata.MeasureHeader('time', 0, 5, 0.2, 's')
+        trials = xdata.CategoricalHeader(
+            'trials', ['condition', 'response'],
+            pd.DataFrame([['a', True], ['b', False], ['a', True],
+                          ['c', True], ['b', True], ['a', False]]))
+        data = np.arange(30.).reshape(5, 6)
+        dataset = xdata.Xdata('signal', data, [t, trials], 'mV')
+
+        print("Tests for the group_by method of Xdata (module xdata): \n")
+
+        print("Test 1: raising errors for arguments with wrong types")
+        self.assertRaises(Exception, dataset.group_by, 0, 'condition')
+        self.assertRaises(Exception, dataset.group_by, 2, 'condition')
+        self.assertRaises(Exception, dataset.group_by, 1, 'unknown')
+        self.assertRaises(Exception, dataset.group_by, 1, 'condition',
+                          'median')
+
+        print("Test 2: averaging the trials of each condition")
+        mean = dataset.group_by(1, 'condition')
+        self.assertEqual(mean.shape(), (5, 3))
+        self.assertEqual(mean.headers[0], t)
+        self.assertEqual(mean.headers[1].get_item_name([0, 1, 2]),
+                         ['a', 'b', 'c'])
+        self.assertEqual(mean.headers[1].get_value(1, 'response'),
+                         [False, True])
+        self.assertEqual(mean.headers[1].get_value(2, 'response'), True)
+        np.testing.assert_allclose(mean.data[:, 0],
+                                   data[:, [0, 2, 5]].mean(axis=1))
+        np.testing.assert_allclose(mean.data[:, 1],
+                                   data[:, [1, 4]].mean(axis=1))
+        np.testing.assert_allclose(mean.data[:, 2], data[:, 3])
+        self.assertEqual(mean.data_descriptor.unit, 'mV')
+
+        print("Test 3: other reductions")
+        np.testing.assert_allclose(dataset.group_by(1, 0, 'sum').data[:, 0],
+                                   data[:, [0, 2, 5]].sum(axis=1))
+        np.testing.assert_allclose(dataset.group_by(1, 0, 'min').data[:, 1],
+                                   data[:, 1])
+        np.testing.assert_allclose(dataset.group_by(1, 0, 'max').data[:, 1],
+                                   data[:, 4])
+        print("\n")
+
+    def test_xdata_module_Xdata_calibration_attribute(self):
+        raw = np.array([[-3, 10, 200], [40, -5, 6], [7, 8, 9], [1, 2, 3]],
+                       dtype=np.int16)
+        conditions = xdata.CategoricalHeader(
+            'trials', ['condition'], pd.DataFrame([['a'], ['b'], ['a'],
+                                                   ['b']]))
+        channels = xdata.MeasureHeader('channels', 0, 3, 1, 'mm')
+        dataset = xdata.Xdata('signal', raw, [conditions, channels], 'mV',
+                              (0.5, -1))
+        values = raw * 0.5 - 1
+        print("Tests for the calibration of quantized data (class Xdata): \n")
+
+        print("Test 1: raising errors for arguments with wrong types")
+        self.assertRaises(Exception, xdata.DimensionDescription, 'x',
+                          'string', None, (1, 0))
+        self.assertRaises(Exception, xdata.DimensionDescription, 'x',
+                          'numeric', None, 2)
+        self.assertRaises(Exception, xdata.DimensionDescription, 'x',
+                          'numeric', None, (0, 1))
+        self.assertRaises(Exception, xdata.Xdata, 'signal',
+                          np.array(['a', 'b']),
+                          [xdata.CategoricalHeader('x', n_elem=2)], None,
+                          (1, 0))
+
+        print("Test 2: the data is stored without conversion")
+        self.assertTrue(dataset.data is raw)
+        self.assertEqual(dataset.data_descriptor.calibration, (0.5, -1.))
+        np.testing.assert_allclose(dataset.values, values)
+        self.assertEqual(dataset.copy().data_descriptor,
+                         dataset.data_descriptor)
+        self.assertFalse(dataset.data_descriptor ==
+                         xdata.DimensionDescription('signal', 'numeric',
+                                                    'mV'))
+
+        print("Test 3: slices and reductions keep the calibration")
+        f = operation.Filter('channels', [2])
+        slice_2 = f.apply(dataset)
+        self.assertEqual(slice_2.data.dtype, np.int16)
+        np.testing.assert_allclose(slice_2.values, values[:, 2])
+        f.set_selection([0, 2])
+        np.testing.assert_allclose(f.apply(dataset).values,
+                                   values[:, [0, 2]].mean(axis=1))
+        for method in ['mean', 'sum', 'min', 'max']:
+            grouped = dataset.group_by(0, 'condition', method)
+            expected = getattr(np, method)(values[[0, 2]], axis=0)
+            np.testing.assert_allclose(grouped.values[0], expected)
+        negative = xdata.Xdata('signal', raw, [conditions, channels], 'mV',
+                               (-2, 0))
+        np.testing.assert_allclose(negative.group_by(0, 'condition',
+                                                     'min').values[1],
+                                   np.min(-2 * raw[[1, 3]], axis=0))
+        # the mean of int16 values does not overflow
+        big = xdata.Xdata('signal', np.full((4, 3), 30000, dtype=np.int16),
+                          [conditions, channels], None, (1, 0))
+        np.testing.assert_allclose(big.group_by(0, 'condition').values,
+                                   30000)
+
+        print("Test 4: the statistics are calibrated")
+        self.assertEqual(dataset.statistics.get_range(),
+                         (values.min(), values.max()))
+        self.assertAlmostEqual(dataset.statistics.get_statistics()['sum'],
+                               values.sum())
+        np.testing.assert_allclose(
+            dataset.statistics.get_statistics(1)['sum'], values.sum(axis=0))
+        self.assertEqual(negative.statistics.get_range(),
+                         (-2. * raw.max(), -2. * raw.min()))
+        print("\n")
+
+    def test_xdata_module_Xdata_contiguous_data_method(self):
+        data = np.random.rand(40, 30, 2)
+        cells = xdata.CategoricalHeader(
+            'cells', ['name'], pd.DataFrame({0: ['c%d' % i
+                                                 for i in range(40)]}))
+        dataset = xdata.Xdata('permuted', data,
+                              [cells, xdata.MeasureHeader('t', 0, 30, 1, 's'),
+                               xdata.CategoricalHeader('channels', n_elem=2)],
+                              'mV')
+
+        print("Tests for the method contiguous_data of the class Xdata "
+              "(module xdata): \n")
+
+        print("Test 1: permuting the dimensions gives a view")
+        self.assertTrue(dataset.is_contiguous)
+        self.assertTrue(dataset.contiguous_data() is dataset.data)
+        dataset.statistics.get_statistics(0)
+        permuted, flag = dataset.modify_dimensions('dim_perm', [2, 0, 1],
+                                                   None, None)
+        self.assertTrue(np.shares_memory(permuted.data, data))
+        self.assertFalse(permuted.is_contiguous)
+        self.assertTrue(permuted.headers[1] is cells)
+        self.assertEqual(permuted.memory_usage().owned, 0)
+        # the statistics of the lines follow their dimension
+        n_read = permuted.statistics.n_read
+        np.testing.assert_array_equal(
+            permuted.statistics.get_statistics(1)['max'],
+            data.max(axis=(1, 2)))
+        self.assertEqual(permuted.statistics.n_read, n_read)
+
+        print("Test 2: copying the data when it must be contiguous")
+        contiguous = permuted.contiguous_data()
+        self.assertTrue(contiguous.flags.c_contiguous)
+        np.testing.assert_array_equal(contiguous, data.transpose(2, 0, 1))
+        self.assertTrue(permuted.contiguous_data() is contiguous)
+        self.assertEqual(permuted.memory_usage().breakdown['caches']['owned'],
+                         contiguous.nbytes)
+        back = permuted.modify_dimensions('dim_perm', [1, 2, 0], None,
+                                          None)[0]
+        self.assertTrue(back.is_contiguous)
+        np.testing.assert_array_equal(back.data, data)
+        dense = np.zeros((4, 3))
+        dense[1, 2] = 5
+        sparse_data = xdata.Xdata(
+            'sparse', sparse.SparseArray.from_dense(dense, 0),
+            [xdata.MeasureHeader('x', 0, 4, 1, 'm'),
+             xdata.MeasureHeader('y', 0, 3, 1, 'm')], 'mV')
+        self.assertFalse(sparse_data.is_contiguous)
+        np.testing.assert_array_equal(sparse_data.contiguous_data(), dense)
+        print("\n")
+
+    def test_xdata_module_DataStatistics_class(self):
+        data = np.random.rand(50, 4)
+        data[3, 2] = np.nan
+        time = xdata.MeasureHeader('time', 0, 50, 0.1, 's')
+        channels = xdata.MeasureHeader('channels', 0, 4, 1, 'mm')
+        dataset = xdata.Xdata('signal', data, [time, channels], 'mV')
+        print("Tests for the class DataStatistics (module xdata): \n")
+
+        print("Test 1: raising errors for arguments with wrong types")
+        self.assertRaises(Exception, xdata.DataStatistics, [1, 2])
+        self.assertRaises(Exception, dataset.statistics.get_statistics, 2)
+        self.assertRaises(Exception, dataset.statistics.updated, data,
+                          'perm', 0, [])
+
+        print("Test 2: computing the statistics once")
+        statistics = dataset.statistics
+        self.assertEqual(statistics.n_read, 0)
+        self.assertEqual(statistics.get_range(),
+                         (np.nanmin(data), np.nanmax(data)))
+        self.assertEqual(statistics.get_statistics()['n_nan'], 1)
+        self.assertAlmostEqual(statistics.get_statistics()['sum'],
+                               np.nansum(data))
+        self.assertEqual(statistics.n_read, 200)
+        statistics.get_range()
+        self.assertEqual(statistics.n_read, 200)
+        lines = statistics.get_statistics(1)
+        np.testing.assert_allclose(lines['max'], np.nanmax(data, axis=0))
+        np.testing.assert_array_equal(lines['n_nan'], [0, 0, 1, 0])
+        self.assertEqual(statistics.n_read, 400)
+
+        print("Test 3: updating the statistics with the changed lines")
+        new_xdata, flag = dataset.update_xdata(
+            'chg', 0, [3, 7], [np.full(4, 5.), np.full(4, -5.)], time)
+        self.assertEqual(new_xdata.statistics.get_range(), (-5., 5.))
+        self.assertEqual(new_xdata.statistics.get_statistics()['n_nan'], 0)
+        self.assertEqual(new_xdata.statistics.n_read, 8)
+        self.assertAlmostEqual(new_xdata.statistics.get_statistics()['sum'],
+                               np.sum(new_xdata.data))
+        # the minimum of the other dimension must be read again
+        np.testing.assert_allclose(
+            new_xdata.statistics.get_statistics(1)['min'],
+            np.min(new_xdata.data, axis=0))
+        self.assertEqual(new_xdata.statistics.n_read, 208)
+
+        print("Test 4: updating the statistics with new lines")
+        longer = xdata.MeasureHeader('time', 0, 51, 0.1, 's')
+        new_xdata_2, flag = new_xdata.update_xdata(
+            'new', 0, None, [np.array([1., 2., np.nan, 9.])], longer)
+        statistics = new_xdata_2.statistics
+        self.assertEqual(statistics.get_range(), (-5., 9.))
+        self.assertEqual(statistics.get_statistics()['n_nan'], 1)
+        np.testing.assert_allclose(statistics.get_statistics(1)['max'],
+                                   np.nanmax(new_xdata_2.data, axis=0))
+        self.assertEqual(statistics.n_read, 8)
+
+        print("Test 5: updating the statistics with removed lines")
+        shorter = xdata.MeasureHeader('time', 0, 48, 0.1, 's')
+        new_xdata_3, flag = new_xdata_2.update_xdata(
+            'remove', 0, [3, 50, 7], [], shorter)
+        self.assertEqual(new_xdata_3.statistics.get_range(),
+                         (np.min(new_xdata_3.data), np.max(new_xdata_3.data)))
+        self.assertEqual(new_xdata_3.statistics.get_statistics()['n_nan'], 0)
+        self.assertEqual(new_xdata_3.statistics.n_read, 0)
+        print("\n")
+
     def test_xdata_module_create_dimension_description_function(self):
         print("Test for the create_dimension_description function \
         (module xdata) \n")
@@ -1227,12 +1747,1465 @@ class MyTestCase(unittest.TestCase):
         self.assertEqual(f.label, fdd.label)
         self.assertEqual(f.dimension_type, fdd.dimension_type)
 
+    def test_bank_module_UnitBank_class(self):
+        path = os.path.join(tempfile.mkdtemp(), 'bank', 'unit_bank.json')
+        b = bank.UnitBank(path)
+        print("Tests for the class UnitBank (module bank): \n")
+
+        print("Test 1: the bank is only loaded when a unit is looked for")
+        self.assertTrue(b._index is None)
+        self.assertTrue('ms' in b)
+        self.assertFalse(b._index is None)
+
+        print("Test 2: get_table method")
+        self.assertEqual(b.get_table('s'), [{'unit': 'us', 'value': 10**(-6)},
+                                            {'unit': 'ms', 'value': 0.001},
+                                            {'unit': 's', 'value': 1.0},
+                                            {'unit': 'min', 'value': 60.0},
+                                            {'unit': 'hour', 'value': 3600.0},
+                                            {'unit': 'day', 'value': 86400.0}])
+        self.assertEqual(b.get_table('kHz')[1], {'unit': 'kHz', 'value': 1})
+        self.assertTrue(b.get_table('inch') is None)
+        self.assertRaises(Exception, b.get_table, 3)
+
+        print("Test 3: add_table method, the bank is persistent")
+        b.add_table(['inch', 0.0254, 'foot', 0.3048, 'm', 1])
+        self.assertTrue(os.path.isfile(path))
+        foot = {d['unit']: d['value'] for d in b.get_table('foot')}
+        self.assertEqual(foot['foot'], 1.0)
+        self.assertAlmostEqual(foot['inch'], 1 / 12)
+        # the new table is merged with the metric one, which also contains 'm'
+        mm = {d['unit']: d['value'] for d in b.get_table('mm')}
+        self.assertEqual(mm['mm'], 1.0)
+        self.assertAlmostEqual(mm['inch'], 25.4)
+        self.assertAlmostEqual(mm['km'], 10 ** 6)
+        b2 = bank.UnitBank(path)
+        self.assertEqual(b2.get_table('inch'), b.get_table('inch'))
+        self.assertEqual(b2.get_table('mm'), b.get_table('mm'))
+        self.assertTrue('s' in b2)
+        # conversion values conflicting with the bank
+        self.assertRaises(Exception, b.add_table, ['inch', 0.03, 'm', 1])
+        self.assertAlmostEqual(
+            b.get_table('inch')[[d['unit'] for d in b.get_table('inch')]
+                                .index('m')]['value'], 1 / 0.0254)
+        b.add_table(['yard', 3, 'foot', 1])
+        self.assertAlmostEqual(
+            {d['unit']: d['value'] for d in b.get_table('m')}['yard'], 0.9144)
+        self.assertEqual(bank.UnitBank(path).get_table('yard'),
+                         b.get_table('yard'))
+        self.assertRaises(Exception, b.add_table, ['inch', 0.0254, 'foot'])
+        self.assertRaises(Exception, b.add_table, ['inch', 'foot'])
+
+        print("Test 4: check_bank_unit function")
+        self.assertEqual(xdata.check_bank_unit('ms')[1],
+                         {'unit': 'ms', 'value': 1.0})
+        self.assertTrue(xdata.check_bank_unit('unknown_unit') is None)
+        self.assertTrue(xdata.check_bank_unit(['ms', 1]) is None)
+        print("\n")
+
+    def test_sparse_module_SparseArray_class(self):
+        # countries x ages x months, most of the combinations are missing
+        dense = np.full((5, 4, 6), np.nan)
+        dense[0, 1, 2] = 3.
+        dense[0, 3, 2] = 5.
+        dense[2, 1, 0] = 7.
+        dense[4, 0, 5] = 1.
+        dense[4, 1, 5] = 2.
+        array = sparse.SparseArray.from_dense(dense)
+        countries = xdata.CategoricalHeader(
+            'country', ['continent'],
+            pd.DataFrame([['europe'], ['asia'], ['europe'], ['asia'],
+                          ['europe']]))
+        ages = xdata.CategoricalHeader('age', n_elem=4)
+        months = xdata.MeasureHeader('month', 0, 6, 1, 'month')
+        dataset = xdata.Xdata('unemployment', array,
+                              [countries, ages, months], None)
+        print("Tests for the class SparseArray (module sparse): \n")
+
+        print("Test 1: raising errors for arguments with wrong types")
+        self.assertRaises(Exception, sparse.SparseArray, [[0, 3]], [1, 2],
+                          (3,))
+        self.assertRaises(Exception, sparse.SparseArray, [[0, 0]], [1, 2],
+                          (3,))
+        self.assertRaises(Exception, sparse.SparseArray, [[0]], [1, 2], (3,))
+        self.assertRaises(Exception, array.reduce, 0, 'median')
+        self.assertRaises(Exception, array.index, 3, 0)
+        self.assertRaises(Exception, dataset.update_xdata, 'remove', 0, [0],
+                          None, countries)
+
+        print("Test 2: storing only the observed cells")
+        self.assertEqual((array.nnz, array.shape), (5, (5, 4, 6)))
+        self.assertAlmostEqual(array.density, 5 / 120)
+        np.testing.assert_array_equal(array.todense(), dense)
+        a = sparse.SparseArray([[2, 0], [0, 1]], [4., 3.5], (3, 2))
+        np.testing.assert_array_equal(a.coords, [[0, 2], [1, 0]])
+        np.testing.assert_array_equal(a.todense(),
+                                      [[np.nan, 3.5], [np.nan, np.nan],
+                                       [4., np.nan]])
+
+        print("Test 3: slicing and reducing without densifying")
+        np.testing.assert_array_equal(array.index(0, 4).todense(), dense[4])
+        np.testing.assert_array_equal(array.index(2, 2).todense(),
+                                      dense[:, :, 2])
+        np.testing.assert_array_equal(array.take([4, 0, 4], 0).todense(),
+                                      dense[[4, 0, 4]])
+        np.testing.assert_array_equal(array.transpose([2, 0, 1]).todense(),
+                                      dense.transpose(2, 0, 1))
+        np.testing.assert_allclose(array.reduce((0, 2), 'mean').todense(),
+                                   [1, 4, np.nan, 5])
+        np.testing.assert_array_equal(array.reduce(1, 'count').todense(),
+                                      [[np.nan, np.nan, 2, np.nan, np.nan,
+                                        np.nan],
+                                       [np.nan] * 6,
+                                       [1] + [np.nan] * 5,
+                                       [np.nan] * 6,
+                                       [np.nan] * 5 + [2]])
+
+        print("Test 4: slicing and grouping a sparse Xdata")
+        self.assertTrue(dataset.is_sparse)
+        f = operation.Filter('age', [1])
+        slice_1 = f.apply(dataset)
+        self.assertTrue(slice_1.is_sparse)
+        np.testing.assert_array_equal(slice_1.values, dense[:, 1])
+        f.set_selection([0, 1])
+        np.testing.assert_allclose(f.apply(dataset).values[4], [np.nan] * 5 +
+                                   [1.5])
+        grouped = dataset.group_by(0, 'continent', 'sum')
+        self.assertTrue(grouped.is_sparse)
+        np.testing.assert_allclose(grouped.values[0, 1], [7, np.nan, 3,
+                                                          np.nan, np.nan, 2])
+        permuted = dataset.modify_dimensions('dim_perm', [2, 0, 1], None,
+                                             None)[0]
+        np.testing.assert_array_equal(permuted.values,
+                                      dense.transpose(2, 0, 1))
+        self.assertEqual(dataset.statistics.get_range(), (1., 7.))
+        self.assertEqual(dataset.statistics.get_statistics()['n_nan'], 115)
+        self.assertEqual(dataset.statistics.n_read, 5)
+        print("\n")
+
+    def test_stream_module_StreamingXdata_class(self):
+        time = xdata.MeasureHeader('time', 2, 0, 0.5, 's')
+        channels = xdata.CategoricalHeader('channels', n_elem=3)
+        signal = stream.StreamingXdata('signal', [channels, time], 1, 4,
+                                       'mV')
+        events = []
+        signal.add_listener(lambda s, n_new, n_dropped:
+                            events.append((n_new, n_dropped)))
+        samples = np.arange(30.).reshape(3, 10)
+        print("Tests for the class StreamingXdata (module stream): \n")
+
+        print("Test 1: raising errors for arguments with wrong types")
+        self.assertRaises(Exception, stream.StreamingXdata, 'signal',
+                          [channels, time], 0, 4)
+        self.assertRaises(Exception, stream.StreamingXdata, 'signal',
+                          [channels, time], 1, 0)
+        self.assertRaises(Exception, signal.push, np.zeros((2, 1)))
+        self.assertEqual(signal.shape(), (3, 0))
+
+        print("Test 2: pushing samples until the window is full")
+        signal.push(samples[:, :3])
+        np.testing.assert_array_equal(signal.data, samples[:, :3])
+        self.assertEqual(signal.headers[1].n_elem, 3)
+        version = signal.version
+        signal.push(samples[:, 3])
+        self.assertTrue(signal.version != version)
+        np.testing.assert_array_equal(signal.data, samples[:, :4])
+        self.assertEqual(events, [(3, 0), (1, 0)])
+
+        print("Test 3: the oldest samples are dropped")
+        signal.push(samples[:, 4:7])
+        np.testing.assert_array_equal(signal.data, samples[:, 3:7])
+        self.assertEqual(signal.headers[1].start, 2 + 3 * 0.5)
+        self.assertEqual(signal.headers[1].get_value(0), 3.5)
+        self.assertEqual(events[-1], (3, 3))
+        # the window is a view of the buffer, even when it wraps around
+        self.assertTrue(np.shares_memory(signal.data, signal._buffer))
+        signal.push(samples[:, 7:8])
+        np.testing.assert_array_equal(signal.data, samples[:, 4:8])
+        # pushing more samples than the capacity
+        signal.push(np.concatenate((samples, samples), axis=1)[:, 5:11])
+        np.testing.assert_array_equal(signal.data,
+                                      samples[:, [7, 8, 9, 0]])
+        self.assertEqual(signal.n_pushed, 14)
+        self.assertEqual(signal.headers[1].start, 2 + 10 * 0.5)
+        self.assertEqual(len(events), 5)
+
+        print("Test 4: the window can be filtered and copied")
+        snapshot = signal.snapshot()
+        self.assertFalse(isinstance(snapshot, stream.StreamingXdata))
+        np.testing.assert_array_equal(snapshot.data, signal.data)
+        self.assertEqual(signal.statistics.get_range(), (0., 29.))
+        np.testing.assert_array_equal(
+            operation.Filter('channels', [1]).apply(signal).data,
+            samples[1, [7, 8, 9, 0]])
+        signal.push(samples[:, 1] * 100)
+        self.assertEqual(signal.statistics.get_range(), (0., 2100.))
+        np.testing.assert_array_equal(snapshot.data[:, 0], samples[:, 7])
+        # the cached slices do not change with the next pushes
+        cache = operation.SliceCache()
+        slicer = operation.Slicer(signal, [operation.Filter('channels', [1])],
+                                  cache=cache)
+        slicer.update()
+        cached = cache.get(signal, slicer.filter_states)
+        values = cached.data.copy()
+        signal.push(samples[:, :4] + 1000)
+        np.testing.assert_array_equal(cached.data, values)
+        print("\n")
+
+    def test_ingest_module_IngestServer_class(self):
+        time = xdata.MeasureHeader('time', 0, 0, 0.001, 's')
+        channels = xdata.CategoricalHeader('channels', n_elem=2)
+        signal = stream.StreamingXdata('signal', [channels, time], 1, 1000)
+        samples = np.arange(200.).reshape(2, 100)
+        print("Tests for the class IngestServer (module ingest): \n")
+
+        print("Test 1: raising errors for arguments with wrong types")
+        self.assertRaises(Exception, ingest.IngestServer, 'signal')
+        self.assertRaises(Exception, ingest.IngestServer, signal, 0)
+        self.assertRaises(Exception, ingest.IngestServer, signal, 10, 10,
+                          'push')
+
+        print("Test 2: receiving frames through a TCP socket")
+        server = ingest.IngestServer(signal, batch_size=64, max_blocks=2)
+        host, port = server.start(('127.0.0.1', 0))
+        with socket.create_connection((host, port)) as producer:
+            for i in range(0, 100, 10):
+                producer.sendall(ingest.encode_frame(samples[:, i:i + 10],
+                                                     1))
+        self.assertTrue(server.wait(100, 5))
+        server.stop()
+        self.assertEqual(server.n_frames, 10)
+        self.assertTrue(1 <= server.n_batches <= 10)
+        self.assertTrue(server.error is None)
+        np.testing.assert_array_equal(signal.data, samples)
+        self.assertEqual(signal.n_pushed, 100)
+
+        print("Test 3: batches can be delivered to another function")
+        # the frames are split so that no batch exceeds batch_size
+        batches = []
+        server = ingest.IngestServer(signal, batch_size=16,
+                                     deliver=batches.append)
+        host, port = server.start(('127.0.0.1', 0))
+        with socket.create_connection((host, port)) as producer:
+            producer.sendall(ingest.encode_frame(samples[:, :50], 1) +
+                             ingest.encode_frame(samples[:, 50:53], 1))
+        self.assertTrue(server.wait(53, 5))
+        server.stop()
+        self.assertTrue(all(b.shape[1] <= 16 for b in batches))
+        np.testing.assert_array_equal(np.concatenate(batches, axis=1),
+                                      samples[:, :53])
+        # the samples whose delivery failed are not counted as pushed
+
+        def fail(batch):
+            raise Exception("the display is closed")
+
+        server = ingest.IngestServer(signal, deliver=fail)
+        host, port = server.start(('127.0.0.1', 0))
+        with socket.create_connection((host, port)) as producer:
+            producer.sendall(ingest.encode_frame(samples[:, :10], 1))
+        self.assertFalse(server.wait(10, 0.5))
+        server.stop()
+        self.assertEqual(server.n_samples, 0)
+        self.assertTrue(server.error is not None)
+
+        batches = []
+        if hasattr(socket, 'AF_UNIX'):
+            path = os.path.join(tempfile.mkdtemp(), 'ingest.sock')
+            family, address = socket.AF_UNIX, path
+        else:
+            family, address = socket.AF_INET, ('127.0.0.1', 0)
+        server = ingest.IngestServer(signal, batch_size=1000,
+                                     deliver=batches.append)
+        address = server.start(address)
+        with socket.socket(family) as producer:
+            producer.connect(address)
+            producer.sendall(ingest.encode_frame(samples[:, :30].T, 0) +
+                             ingest.encode_frame(samples[:, 30:50].T, 0))
+            # a truncated frame is reported
+            producer.sendall(ingest.FRAME_HEADER.pack(4) + b'123')
+        self.assertTrue(server.wait(50, 5))
+        for i in range(500):
+            if server.error is not None:
+                break
+            threading.Event().wait(0.01)
+        server.stop()
+        np.testing.assert_array_equal(np.concatenate(batches, axis=1),
+                                      samples[:, :50])
+        self.assertTrue(server.error is not None)
+        self.assertEqual(signal.n_pushed, 100)
+        print("\n")
+
+    def test_instrumentation_module_Registry_class(self):
+        data = np.random.rand(300, 4)
+        time = xdata.MeasureHeader('time', 0, 300, 0.1, 's')
+        channels = xdata.CategoricalHeader(
+            'channels', ['area'], pd.DataFrame([['V1'], ['V2'], ['V1'],
+                                                ['V4']]))
+        dataset = xdata.Xdata('signal', data, [time, channels], 'mV')
+        registry = instrumentation.get_registry()
+        registry.reset()
+        print("Tests for the class Registry (module instrumentation): \n")
+
+        print("Test 1: nothing is recorded by default")
+        self.assertFalse(registry.enabled)
+        dataset.copy()
+        self.assertEqual(registry.report(), [])
+        self.assertEqual(registry.summary(), "no instrumented call")
+
+        print("Test 2: recording the calls by operation and flag")
+        instrumentation.enable()
+        try:
+            dataset.update_xdata('chg', 0, [3], [np.zeros(4)], time)
+            dataset.update_xdata('chg', 0, [5], [np.ones(4)], time)
+            dataset.update_xdata('remove', 0, [0], [],
+                                 time.update_measure_header(n_elem=299))
+            dataset.group_by(1, 'area', 'max')
+            copied = dataset.copy()
+        finally:
+            instrumentation.disable()
+        chg = registry.get('Xdata.update_xdata', 'chg')
+        self.assertEqual(chg['count'], 2)
+        self.assertEqual(chg['copied'], 2 * data.nbytes)
+        self.assertEqual(registry.get('Xdata.update_xdata',
+                                      'remove')['count'], 1)
+        self.assertEqual(registry.get('Xdata.group_by', 'max')['count'], 1)
+        self.assertTrue(registry.get('Xdata.update_xdata', 'new') is None)
+        # update_xdata copies the data too
+        copy = registry.get('Xdata.copy')
+        self.assertEqual(copy['copied'], copy['count'] * data.nbytes)
+        # the constructors called by the operations are recorded too
+        self.assertTrue(registry.get('Xdata.__init__')['count'] >= 5)
+        np.testing.assert_array_equal(copied.data, data)
+
+        print("Test 3: measuring the memory allocated")
+        registry.reset()
+        instrumentation.enable(trace_memory=True)
+        try:
+            self.assertTrue(registry.trace_memory)
+            kept = dataset.copy()
+        finally:
+            instrumentation.disable()
+        self.assertFalse(registry.trace_memory)
+        self.assertTrue(registry.get('Xdata.copy')['allocated'] >=
+                        kept.data.nbytes)
+        self.assertFalse(tracemalloc.is_tracing())
+        # the tracing started by the user is not stopped
+        tracemalloc.start()
+        try:
+            instrumentation.enable(trace_memory=True)
+            instrumentation.disable()
+            self.assertTrue(tracemalloc.is_tracing())
+        finally:
+            tracemalloc.stop()
+
+        print("Test 4: reporting the records")
+        rows = registry.report()
+        self.assertTrue(all(rows[i]['time'] >= rows[i + 1]['time']
+                            for i in range(len(rows) - 1)))
+        self.assertTrue('Xdata.copy' in registry.summary())
+        registry.reset()
+        self.assertEqual(registry.report(), [])
+        print("\n")
+
+    def test_instrumentation_module_FrameProfiler_class(self):
+        print("Tests for the class FrameProfiler (module instrumentation): "
+              "\n")
+
+        print("Test 1: raising errors for arguments with wrong types")
+        self.assertRaises(Exception, instrumentation.FrameProfiler, 0)
+        profiler = instrumentation.FrameProfiler(n_frames=3)
+        self.assertRaises(Exception, profiler.end_frame)
+        self.assertRaises(Exception, profiler.record, 'draw', 0.01)
+        profiler.start_frame()
+        self.assertRaises(Exception, profiler.record, 'render', 0.01)
+
+        print("Test 2: measuring the stages of the frames")
+        calls = []
+        profiler.add_hook(lambda stage, duration: calls.append(stage))
+        profiler.record('slice', 0.002)
+        with profiler.stage('decimation'):
+            np.sort(np.random.rand(1000))
+        profiler.record('draw', 0.01)
+        profiler.record('draw', 0.005)
+        frame = profiler.end_frame()
+        self.assertFalse(profiler.in_frame)
+        self.assertEqual(calls, ['slice', 'decimation', 'draw', 'draw',
+                                 'total'])
+        self.assertAlmostEqual(frame['draw'], 0.015)
+        self.assertEqual(frame['upload'], 0.)
+        self.assertTrue(frame['decimation'] > 0)
+        for i in range(4):
+            profiler.start_frame()
+            profiler.record('upload', 0.001 * (i + 1))
+            profiler.end_frame()
+        # only the latest frames are kept
+        self.assertEqual([f['upload'] for f in profiler.frames],
+                         [0.002, 0.003, 0.004])
+
+        print("Test 3: summarizing the frames")
+        counts, edges = profiler.histogram('upload')
+        self.assertEqual(counts.sum(), 3)
+        self.assertEqual(len(edges), len(counts) + 1)
+        statistics = profiler.statistics()
+        self.assertAlmostEqual(statistics['gl']['max'], 0.004)
+        self.assertAlmostEqual(statistics['numpy']['max'], 0.)
+        self.assertAlmostEqual(statistics['upload']['median'], 0.003)
+        self.assertTrue('gl 3.0 ms' in profiler.overlay_text())
+        path = os.path.join(tempfile.mkdtemp(), 'frames.json')
+        profiler.dump(path)
+        with open(path) as f:
+            self.assertEqual(len(json.load(f)['frames']), 3)
+        profiler.reset()
+        self.assertEqual(profiler.statistics(), {})
+        self.assertEqual(profiler.overlay_text(), "no frame")
+        print("\n")
+
+    @unittest.skipIf(view is None, "vispy is not installed")
+    def test_view_module_ViewDisplay_class(self):
+        class Event:
+            # stands for the draw event of a canvas
+            def __init__(self):
+                self.callbacks = []
+
+            def connect(self, fun, position='first'):
+                if position == 'first':
+                    self.callbacks.insert(0, fun)
+                else:
+                    self.callbacks.append(fun)
+
+            def __call__(self):
+                for fun in self.callbacks:
+                    fun(None)
+
+        class Context:
+            def __init__(self):
+                self.n_finish = 0
+
+            def finish(self):
+                self.n_finish += 1
+
+            def flush_commands(self):
+                pass
+
+        class Events:
+            def __init__(self):
+                self.draw = Event()
+
+        class Canvas:
+            def __init__(self):
+                self.events = Events()
+                self.context = Context()
+
+        class Line:
+            def set_data(self, pos):
+                self.pos = pos
+
+        trace = np.random.rand(10000)
+        signal = xdata.Xdata('signal', trace,
+                             [xdata.MeasureHeader('time', 0, 10000, 0.001,
+                                                  's')], None)
+        display = view.ViewDisplay(None)
+        canvas = Canvas()
+        line = Line()
+        display.connect_canvas(canvas)
+        print("Tests for the class ViewDisplay (module view): \n")
+
+        print("Test 1: the traces are decimated to the pixels")
+        x, y = view.decimate(trace, 100)
+        self.assertEqual((len(x), len(y)), (200, 200))
+        self.assertEqual((y.min(), y.max()), (trace.min(), trace.max()))
+        x, y = view.decimate(trace[:150], 100)
+        np.testing.assert_array_equal(y, trace[:150])
+
+        print("Test 2: nothing is measured unless profiling")
+        self.assertFalse(display.profiling)
+        display.show_slice(signal, line, 100)
+        self.assertEqual(line.pos.shape, (200, 2))
+        canvas.events.draw()
+        self.assertEqual(canvas.context.n_finish, 0)
+        self.assertEqual(display.profiler.frames, [])
+
+        print("Test 3: each stage of a frame is measured while profiling")
+        self.assertRaises(Exception, display.set_profiling, 1)
+        display.set_profiling(True)
+        display.show_slice(signal, line, 100)
+        canvas.events.draw()
+        self.assertEqual(canvas.context.n_finish, 1)
+        frame = display.profiler.frames[-1]
+        self.assertTrue(frame['decimation'] > 0)
+        self.assertTrue(frame['upload'] > 0)
+        self.assertTrue(frame['total'] >= frame['draw'] + frame['swap'])
+        display.set_profiling(False)
+        canvas.events.draw()
+        self.assertEqual(canvas.context.n_finish, 1)
+        self.assertEqual(len(display.profiler.frames), 1)
+        print("\n")
+
+    def test_memory_module_VersionTracker_class(self):
+        data = np.random.rand(100, 4)
+        time = xdata.MeasureHeader('time', 0, 100, 0.1, 's')
+        channels = xdata.CategoricalHeader(
+            'channels', ['area'], pd.DataFrame([['V1'], ['V2'], ['V1'],
+                                                ['V4']]))
+        dataset = xdata.Xdata('memory test', data, [time, channels], 'mV')
+        tracker = memory.get_tracker()
+        print("Tests for the class VersionTracker (module memory): \n")
+
+        print("Test 1: the bytes of a single version are owned")
+        usage = dataset.memory_usage()
+        self.assertEqual(usage.version, dataset.version)
+        self.assertEqual(usage.shared, 0)
+        self.assertEqual(usage.breakdown['data']['owned'], data.nbytes)
+        self.assertTrue(usage.breakdown['headers']['owned'] > 0)
+        self.assertEqual(usage.breakdown['caches']['owned'], 0)
+        dataset.statistics.get_statistics(1)
+        self.assertTrue(dataset.memory_usage().breakdown['caches']['owned']
+                        > 0)
+        # the value columns and the indexes of the columns are listed
+        names = [b['name'] for b in dataset.memory_usage().buffers]
+        self.assertTrue('channels/area' in names)
+        self.assertFalse('channels/area hash index' in names)
+        caches = dataset.memory_usage().breakdown['caches']['owned']
+        dataset.headers[1].find_lines('area', 'V1')
+        usage_indexed = dataset.memory_usage()
+        self.assertTrue('channels/area hash index' in
+                        [b['name'] for b in usage_indexed.buffers])
+        self.assertTrue(usage_indexed.breakdown['caches']['owned'] > caches)
+
+        print("Test 2: views and headers are shared between versions")
+        transposed, flag = dataset.modify_dimensions('dim_perm', [1, 0],
+                                                     None, None)
+        shared = dataset.memory_usage()
+        self.assertEqual(shared.breakdown['data']['shared'], data.nbytes)
+        self.assertEqual(transposed.memory_usage().breakdown['data'],
+                         {'owned': 0, 'shared': data.nbytes})
+        self.assertEqual(usage.total, usage.owned + usage.shared)
+        self.assertTrue('memory test' in shared.disp())
+
+        print("Test 3: listing the live versions")
+        versions = tracker.live_versions('memory test')
+        self.assertEqual([x.version for x in versions],
+                         [dataset.version, transposed.version])
+        report = tracker.report('memory test')
+        self.assertEqual(len(report), 2)
+        self.assertTrue(report[0].owned >= report[1].owned)
+        # the report gives the same accounting as each instance alone
+        for u in report:
+            x = [v for v in versions if v.version == u.version][0]
+            self.assertEqual(u.buffers, x.memory_usage().buffers)
+        self.assertTrue(tracker.total_bytes() >= data.nbytes)
+
+        print("Test 4: finding what keeps a version alive")
+        class Window:
+            pass
+        holder = Window()
+        holder.displayed = transposed
+        self.assertTrue(any(h is holder
+                            for h in tracker.get_holders(transposed)))
+        del transposed, holder, versions, x
+        self.assertEqual(len(tracker.live_versions('memory test')), 1)
+        self.assertEqual(dataset.memory_usage().shared, 0)
+        print("\n")
+
+    def test_benchmark_module_run_function(self):
+        print("Tests for the function run (module benchmark): \n")
+
+        print("Test 1: measuring the times of a suite")
+        results = benchmark.run('HeaderEquality', max_size=10 ** 4, repeat=2,
+                                min_time=0.001)
+        self.assertEqual(list(results['benchmarks']),
+                         ['HeaderEqualitySuite.time_equality'])
+        equality = results['benchmarks']['HeaderEqualitySuite.time_equality']
+        self.assertEqual(equality['params'][0], [10 ** 3, 10 ** 4])
+        self.assertEqual(len(equality['measures']), 4)
+        for measure in equality['measures']:
+            self.assertEqual(measure['status'], 'ok')
+            self.assertTrue(measure['time'] > 0)
+        self.assertEqual(len(equality['exponents']), 2)
+        self.assertTrue('HeaderEqualitySuite.time_equality' in
+                        benchmark.format_results(results))
+
+        print("Test 2: the bigger sizes are not run after a timeout")
+        slow = benchmark.run('TypeInference', max_size=10 ** 4, timeout=0.)
+        statuses = [m['status'] for m in slow['benchmarks'][
+            'TypeInferenceSuite.time_create_dimension_description'][
+            'measures']]
+        self.assertEqual(statuses, ['ok'] * 3 + ['timeout'] * 3)
+
+        print("Test 3: saving and comparing the results")
+        path = benchmark.save(results, os.path.join(tempfile.mkdtemp(),
+                                                    'results.json'))
+        with open(path) as f:
+            saved = json.load(f)
+        self.assertEqual(benchmark.compare(results, saved), [])
+        for measure in saved['benchmarks'][
+                'HeaderEqualitySuite.time_equality']['measures'][:2]:
+            measure['time'] *= 3
+        changes = benchmark.compare(results, saved)
+        self.assertEqual(len(changes), 2)
+        self.assertAlmostEqual(changes[0][4], 3.)
+        print("\n")
+
+    def test_parallel_module_ThreadReducer_class(self):
+        data = np.random.rand(40, 7, 30)
+        data[3, 2, :] = np.nan
+        # chunks of at least one byte: the reductions are always split
+        reducer = parallel.ThreadReducer(n_workers=4, min_chunk_size=1)
+        serial = parallel.ThreadReducer(n_workers=1)
+        print("Tests for the class ThreadReducer (module parallel): \n")
+
+        print("Test 1: raising errors for arguments with wrong types")
+        self.assertRaises(Exception, parallel.ThreadReducer, 0)
+        self.assertRaises(Exception, reducer.reduce, [1, 2], 0)
+        self.assertRaises(Exception, reducer.reduce, data, 0, 'median')
+        self.assertRaises(Exception, reducer.bin_reduce, data, 3, 2)
+        self.assertRaises(Exception, reducer.bin_reduce, data, 0, 0)
+
+        print("Test 2: reduce method gives the same result as numpy")
+        for method, fun in parallel.REDUCTIONS.items():
+            for axis in [0, 1, 2, (0, 2), (0, 1, 2)]:
+                np.testing.assert_allclose(reducer.reduce(data, axis, method),
+                                           fun(data, axis=axis))
+                np.testing.assert_allclose(serial.reduce(data, axis, method),
+                                           fun(data, axis=axis))
+
+        print("Test 3: bin_reduce method")
+        binned = reducer.bin_reduce(data, 2, 4, 'sum')
+        self.assertEqual(binned.shape, (40, 7, 8))
+        np.testing.assert_allclose(binned[:, :, 1],
+                                   data[:, :, 4:8].sum(axis=2))
+        np.testing.assert_allclose(binned[:, :, 7],
+                                   data[:, :, 28:].sum(axis=2))
+        np.testing.assert_allclose(reducer.bin_reduce(data, 0, 40),
+                                   data.mean(axis=0, keepdims=True))
+        reducer.shutdown()
+
+        print("Test 4: dimensions removed by Xdata.modify_dimensions are "
+              "averaged")
+        headers = [xdata.CategoricalHeader('a', n_elem=40),
+                   xdata.CategoricalHeader('b', n_elem=7),
+                   xdata.MeasureHeader('t', 0, 30, 1)]
+        dataset = xdata.Xdata('data', data, headers, None)
+        (dim_rm, flag) = dataset.modify_dimensions('dim_rm', [1], None, None)
+        self.assertEqual(dim_rm.shape(), (40, 30))
+        np.testing.assert_allclose(dim_rm.data, data.mean(axis=1))
+        self.assertRaises(Exception, dataset.modify_dimensions, 'dim_rm', [3],
+                          None, None)
+        print("\n")
+
+    @unittest.skipIf(sys.version_info < (3, 8),
+                     "shared memory needs python 3.8 or later")
+    def test_parallel_module_ProcessTransformer_class(self):
+        data = np.random.rand(6, 3, 50) + np.arange(50)
+        transformer = parallel.ProcessTransformer(n_workers=2)
+        print("Tests for the class ProcessTransformer (module parallel): \n")
+
+        print("Test 1: raising errors for arguments with wrong types")
+        self.assertRaises(Exception, parallel.ProcessTransformer, 0)
+        self.assertRaises(Exception, transformer.transform, [1], np.abs, 0)
+        self.assertRaises(Exception, transformer.transform, data, 3, 0)
+        self.assertRaises(Exception, transformer.transform, data, np.abs, 3)
+
+        print("Test 2: transform method")
+        detrended = transformer.transform(data, detrend_line, 0)
+        self.assertEqual(detrended.shape, data.shape)
+        for i in range(6):
+            np.testing.assert_allclose(detrended[i], detrend_line(data[i]))
+        self.assertEqual(transformer.transform(data, np.floor, 1,
+                                               np.int16).dtype, np.int16)
+        transformer.shutdown()
+
+        print("Test 3: transform method of Xdata")
+        headers = [xdata.CategoricalHeader('trials', n_elem=6),
+                   xdata.CategoricalHeader('cells', n_elem=3),
+                   xdata.MeasureHeader('time', 0, 50, 0.1, 's')]
+        dataset = xdata.Xdata('signal', data, headers, 'mV')
+        new_dataset = dataset.transform(detrend_line, 0)
+        np.testing.assert_allclose(new_dataset.data, detrended)
+        self.assertEqual(new_dataset.headers[2], headers[2])
+        self.assertRaises(Exception, dataset.transform, detrend_line, 3)
+        print("\n")
+
+    def test_operation_module_Slicer_class(self):
+        t = xdata.MeasureHeader('time', 0, 10, 0.1, 's')
+        cells = xdata.CategoricalHeader('cells', n_elem=4)
+        trials = xdata.CategoricalHeader('trials', n_elem=5)
+        data = np.random.rand(10, 4, 5)
+        dataset = xdata.Xdata('signal', data, [t, cells, trials], 'mV')
+        print("Tests for the classes Filter and Slicer (module operation): "
+              "\n")
+
+        print("Test 1: raising errors for arguments with wrong types")
+        self.assertRaises(Exception, operation.Filter, 1)
+        self.assertRaises(Exception, operation.Filter, 'cells', [])
+        self.assertRaises(Exception, operation.Filter, 'cells', [-1])
+        self.assertRaises(Exception, operation.Slicer, data)
+        self.assertRaises(Exception, operation.Slicer, dataset, [1])
+        self.assertRaises(Exception, operation.Filter('unknown').apply,
+                          dataset)
+        self.assertRaises(Exception, operation.Filter('cells', [4]).apply,
+                          dataset)
+
+        print("Test 2: filters select and average elements")
+        f_cells = operation.Filter('cells')
+        self.assertEqual(f_cells.state, ('cells', (0,)))
+        np.testing.assert_allclose(f_cells.apply(dataset).data, data[:, 0, :])
+        f_trials = operation.Filter('trials', [1, 3])
+        np.testing.assert_allclose(f_trials.apply(dataset).data,
+                                   data[:, :, [1, 3]].mean(axis=2))
+        self.assertEqual(f_trials.apply(dataset).headers[1].label, 'cells')
+
+        print("Test 3: the slicer computes the slice when filters change")
+        slices = []
+        slicer = operation.Slicer(dataset, [f_cells], callback=slices.append)
+        slicer.add_filter(f_trials)
+        self.assertEqual(slicer.filter_states, [('cells', (0,)),
+                                                ('trials', (1, 3))])
+        np.testing.assert_allclose(slicer.slice.data,
+                                   data[:, 0, [1, 3]].mean(axis=1))
+        f_cells.set_selection([2])
+        np.testing.assert_allclose(slices[-1].data,
+                                   data[:, 2, [1, 3]].mean(axis=1))
+        f_trials.set_active(False)
+        self.assertEqual(slicer.slice.shape(), (10, 5))
+        slicer.remove_filter(f_trials)
+        f_trials.set_active(True)
+        self.assertEqual(len(slices), 4)
+        print("\n")
+
+    def test_operation_module_SliceWorker_class(self):
+        worker = operation.SliceWorker()
+        started = threading.Event()
+        release = threading.Event()
+        computed = []
+        delivered = []
+
+        def slow(is_cancelled):
+            started.set()
+            release.wait()
+            computed.append('slow')
+            return 'slow'
+
+        def make_compute(name):
+            def compute(is_cancelled):
+                computed.append(name)
+                return name
+            return compute
+
+        print("Tests for the class SliceWorker (module operation): \n")
+
+        print("Test 1: only the latest request is delivered")
+        self.assertRaises(Exception, worker.submit, 3)
+        self.assertEqual(worker.submit(slow, delivered.append), 1)
+        started.wait()
+        # the requests made while 'slow' is computed supersede each other
+        worker.submit(make_compute('a'), delivered.append)
+        worker.submit(make_compute('b'), delivered.append)
+        self.assertTrue(worker.busy)
+        release.set()
+        self.assertTrue(worker.wait(5))
+        self.assertEqual(computed, ['slow', 'b'])
+        self.assertEqual(delivered, ['b'])
+        self.assertEqual(worker.get_result(), (3, 'b'))
+
+        print("Test 2: cancelling a computation in progress")
+        started.clear()
+        release.clear()
+
+        def cancellable(is_cancelled):
+            started.set()
+            release.wait()
+            if is_cancelled():
+                raise operation.CancelledError()
+            return 'cancellable'
+
+        worker.submit(cancellable, delivered.append)
+        started.wait()
+        worker.cancel()
+        release.set()
+        self.assertTrue(worker.wait(5))
+        self.assertEqual(delivered, ['b'])
+        worker.submit(lambda is_cancelled: 1 / 0)
+        self.assertTrue(worker.wait(5))
+        self.assertTrue(isinstance(worker.error[1], ZeroDivisionError))
+
+        print("Test 3: slices computed in the background by the slicer")
+        headers = [xdata.CategoricalHeader('cells', n_elem=4),
+                   xdata.CategoricalHeader('trials', n_elem=5)]
+        data = np.random.rand(4, 5)
+        dataset = xdata.Xdata('signal', data, headers, None)
+        f_trials = operation.Filter('trials')
+        slicer = operation.Slicer(dataset, [f_trials], worker)
+        for i in range(5):
+            f_trials.set_selection([i])
+        self.assertTrue(worker.wait(5))
+        np.testing.assert_allclose(slicer.slice.data, data[:, 4])
+        worker.shutdown()
+        self.assertRaises(Exception, worker.submit, make_compute('c'))
+        print("\n")
+
+    def test_operation_module_SlicePrefetcher_class(self):
+        headers = [xdata.MeasureHeader('time', 0, 20, 0.1, 's'),
+                   xdata.CategoricalHeader('trials', n_elem=10)]
+        data = np.random.rand(20, 10)
+        dataset = xdata.Xdata('signal', data, headers, None)
+        f_trials = operation.Filter('trials')
+        cache = operation.SliceCache(max_items=8)
+        small_cache = operation.SliceCache(max_bytes=3 * 8 * 20)
+        worker = operation.SliceWorker()
+        slicer = operation.Slicer(dataset, [f_trials], worker, cache=cache)
+        print("Tests for the classes SliceCache and SlicePrefetcher (module "
+              "operation): \n")
+
+        print("Test 1: raising errors for arguments with wrong types")
+        self.assertRaises(Exception, operation.SliceCache, -1)
+        self.assertRaises(Exception, operation.SliceCache, max_items=0)
+        self.assertRaises(Exception, operation.SlicePrefetcher,
+                          operation.Slicer(dataset, [f_trials]), f_trials)
+        self.assertRaises(Exception, operation.SlicePrefetcher, slicer,
+                          operation.Filter('trials'))
+        self.assertRaises(Exception, operation.SlicePrefetcher, slicer,
+                          f_trials, 3, 2)
+
+        print("Test 2: the slice cache keeps the latest slices")
+        slicer.update()
+        self.assertTrue(worker.wait(5))
+        self.assertTrue((dataset, [('trials', (0,))]) in cache)
+        self.assertFalse((dataset.copy(), [('trials', (0,))]) in cache)
+        for i in range(10):
+            cache.put(dataset, [('other', (i,))], None)
+        self.assertEqual(len(cache), 8)
+        self.assertFalse((dataset, [('trials', (0,))]) in cache)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        # the budget is given in bytes, a slice here uses 8 * 20 bytes
+        slice_0 = f_trials.apply(dataset)
+        self.assertTrue(dataset.version != dataset.copy().version)
+        for i in range(4):
+            small_cache.put(dataset, [('trials', (i,))], slice_0)
+        self.assertEqual(len(small_cache), 3)
+        self.assertEqual(small_cache.n_bytes, 3 * 8 * 20)
+        self.assertTrue(small_cache.get(dataset, [('trials', (0,))]) is None)
+        self.assertTrue(small_cache.get(dataset, [('trials', (1,))])
+                        is slice_0)
+        small_cache.put(dataset, [('trials', (4,))], slice_0)
+        # 1 was used recently, 2 is the least recently used
+        self.assertTrue((dataset, [('trials', (1,))]) in small_cache)
+        self.assertFalse((dataset, [('trials', (2,))]) in small_cache)
+        self.assertEqual((small_cache.hits, small_cache.misses), (1, 1))
+        small_cache.put(dataset, [('big',)], dataset)
+        self.assertFalse((dataset, [('big',)]) in small_cache)
+        # a slice computed once and then found is one miss and one hit
+        counted = operation.SliceCache()
+        counted_slicer = operation.Slicer(
+            dataset, [operation.Filter('trials')], cache=counted)
+        counted_slicer.update()
+        self.assertEqual((counted.hits, counted.misses), (0, 1))
+        counted_slicer.update()
+        self.assertEqual((counted.hits, counted.misses), (1, 1))
+
+        print("Test 3: the next slices are computed in advance")
+        prefetcher = operation.SlicePrefetcher(slicer, f_trials, depth=2,
+                                               max_depth=2)
+        self.assertEqual(prefetcher.predict(0), [1])
+        for i in [0, 1, 2]:
+            f_trials.set_selection([i])
+        self.assertEqual(prefetcher.direction, 1)
+        self.assertTrue(prefetcher.wait(5))
+        self.assertTrue((dataset, [('trials', (3,))]) in cache)
+        self.assertTrue((dataset, [('trials', (4,))]) in cache)
+        self.assertFalse((dataset, [('trials', (5,))]) in cache)
+        # stepping backward by two
+        f_trials.set_selection([8])
+        f_trials.set_selection([6])
+        self.assertEqual((prefetcher.direction, prefetcher.step), (-1, 2))
+        self.assertEqual(prefetcher.predict(6), [4, 2])
+        self.assertEqual(prefetcher.predict(1), [])
+        self.assertTrue(prefetcher.wait(5))
+        # the next step is served by the cache, without the worker
+        hits = cache.hits
+        f_trials.set_selection([4])
+        self.assertEqual(cache.hits, hits + 1)
+        np.testing.assert_allclose(slicer.slice.data, data[:, 4])
+        # so is turning the filter off and on again
+        f_trials.set_active(False)
+        self.assertTrue(worker.wait(5))
+        f_trials.set_active(True)
+        self.assertEqual(cache.hits, hits + 2)
+        np.testing.assert_allclose(slicer.slice.data, data[:, 4])
+        # the selections given as bitsets are predicted as bitsets
+        f_trials.set_selection(bitset.Bitset(10, [5]))
+        self.assertTrue(worker.wait(5))
+        self.assertTrue(prefetcher.wait(5))
+        self.assertTrue((dataset, [('trials', bitset.Bitset(10, [6]))])
+                        in cache)
+        hits = cache.hits
+        f_trials.set_selection(bitset.Bitset(10, [6]))
+        self.assertEqual(cache.hits, hits + 1)
+        np.testing.assert_allclose(slicer.slice.data, data[:, 6])
+        prefetcher.stop()
+        worker.shutdown()
+        print("\n")
+
+    def test_operation_module_SliceGraph_class(self):
+        headers = [xdata.MeasureHeader('time', 0, 6, 0.1, 's'),
+                   xdata.CategoricalHeader('trials', n_elem=4),
+                   xdata.CategoricalHeader('channels', n_elem=3)]
+        data = np.random.rand(6, 4, 3)
+        dataset = xdata.Xdata('signal', data, headers, None)
+        graph = operation.SliceGraph()
+        f_trials = operation.Filter('trials', [1, 2])
+        f_channels = operation.Filter('channels', [2])
+        f_time = operation.Filter('time', [3])
+        print("Tests for the class SliceGraph (module operation): \n")
+
+        print("Test 1: raising errors for arguments with wrong types")
+        self.assertRaises(Exception, operation.SliceGraph, 'cache')
+        self.assertRaises(Exception, operation.Slicer, dataset, [f_trials],
+                          None, None, None, 'graph')
+        self.assertRaises(Exception, operation.Slicer, dataset, [f_trials],
+                          None, None, operation.SliceCache(), graph)
+
+        print("Test 2: the filters in common are only applied once")
+        window_1 = operation.Slicer(dataset, [f_trials, f_channels],
+                                    graph=graph)
+        window_2 = operation.Slicer(dataset, [f_trials, f_time], graph=graph)
+        self.assertTrue(window_1.cache is graph.cache)
+        window_1.update()
+        self.assertEqual(graph.n_computed, 2)
+        window_2.update()
+        self.assertEqual(graph.n_computed, 3)
+        np.testing.assert_allclose(window_1.slice.data,
+                                   data[:, 1:3, 2].mean(axis=1))
+        np.testing.assert_allclose(window_2.slice.data,
+                                   data[3, 1:3, :].mean(axis=0))
+        # changing the last filter of one window reuses the common part
+        f_channels.set_selection([0])
+        self.assertEqual(graph.n_computed, 4)
+        # changing the common filter is computed once for both windows
+        f_trials.set_selection([0])
+        self.assertEqual(graph.n_computed, 7)
+        np.testing.assert_allclose(window_2.slice.data, data[3, 0, :])
+
+        print("Test 3: a result being computed is waited for")
+        states = [('trials', (3,)), ('channels', (1,))]
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(graph.get_slice(dataset, states)))
+            for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(graph.n_computed, 9)
+        for r in results:
+            np.testing.assert_allclose(r.data, data[:, 3, 1])
+        self.assertTrue(operation.get_slice_graph() is
+                        operation.get_slice_graph())
+        print("\n")
+
+    def test_list_display_module_ListDisplay_class(self):
+        n = 500000
+        cells = xdata.CategoricalHeader(
+            'cells', ['cell_id'],
+            pd.DataFrame({0: ['cell%06d' % i for i in range(n)]}))
+        time = xdata.MeasureHeader('time', 0, 1000, 0.5, 's')
+        calls = []
+
+        class CountingHeader(xdata.CategoricalHeader):
+            def get_item_name(self, line):
+                calls.append(line)
+                return xdata.CategoricalHeader.get_item_name(self, line)
+
+        print("Tests for the classes ListModel and ListDisplay (module "
+              "list_display): \n")
+
+        print("Test 1: raising errors for arguments with wrong types")
+        self.assertRaises(Exception, cells.get_item_name, range(n - 1, n + 1))
+        self.assertRaises(Exception, time.get_item_name, range(-1, 2))
+        self.assertRaises(Exception, list_display.ListModel, 'cells')
+        self.assertRaises(Exception, list_display.ListModel, cells, 0)
+        self.assertRaises(Exception, list_display.ListDisplay,
+                          operation.Filter('time'), cells)
+
+        print("Test 2: reading a range of lines at once")
+        self.assertEqual(cells.get_item_name(range(3, 6)),
+                         ['cell000003', 'cell000004', 'cell000005'])
+        self.assertEqual(cells.get_item_name(range(6, 3, -2)),
+                         ['cell000006', 'cell000004'])
+        self.assertEqual(cells.get_item_name(range(0)), [])
+        self.assertEqual(time.get_item_name(range(0, 4)),
+                         time.get_item_name([0, 1, 2, 3]))
+        self.assertEqual(xdata.CategoricalHeader(
+            'empty', n_elem=3).get_item_name(range(3)), ['0', '1', '2'])
+
+        print("Test 3: only the visible rows are read")
+        counting = CountingHeader(
+            'cells', ['cell_id'], pd.DataFrame({0: cells.values[0]}))
+        model = list_display.ListModel(counting, n_visible=20,
+                                       page_size=100, n_pages=2)
+        self.assertEqual(calls, [])
+        rows = model.get_rows()
+        self.assertEqual(rows[0], (0, 'cell000000'))
+        self.assertEqual(len(rows), 20)
+        self.assertEqual(calls, [range(0, 100)])
+        model.set_window(90)
+        self.assertEqual([r for r, _ in model.get_rows()],
+                         list(range(90, 110)))
+        self.assertEqual(calls[1:], [range(100, 200)])
+        model.set_window(10)
+        model.get_rows()
+        self.assertEqual(model.n_reads, 2)
+        model.set_window(250)
+        model.get_rows()
+        model.set_window(0)
+        model.get_rows()
+        self.assertEqual(model.n_reads, 3)
+        # the second page was the least recently used one
+        model.set_window(100)
+        model.get_rows()
+        self.assertEqual(model.n_reads, 4)
+        model.set_window(n + 10)
+        self.assertEqual(model.first, n - 20)
+        self.assertEqual(model.get_rows()[-1], (n - 1, 'cell499999'))
+        self.assertEqual(list_display.ListModel(time, 5).get_rows()[1],
+                         (1, '0.5'))
+
+        print("Test 4: selecting elements in the list")
+        f = operation.Filter('cells')
+        display = list_display.ListDisplay(f, cells, n_visible=10)
+        self.assertEqual(display.get_rows()[0], (0, 'cell000000', True))
+        display.click(3)
+        self.assertEqual(f.selection, (3,))
+        display.click(5, extend=True)
+        self.assertEqual(f.selection, (3, 5))
+        display.click(3, extend=True)
+        display.click(5, extend=True)
+        self.assertEqual(f.selection, (5,))
+        self.assertEqual([r[2] for r in display.get_rows()[4:7]],
+                         [False, True, False])
+        self.assertRaises(Exception, display.click, n)
+        # the display follows the changes of the filter
+        f.set_selection([123456])
+        self.assertEqual(display.model.first, 123456)
+        display.close()
+        f.set_selection([0])
+        self.assertEqual(display.model.first, 123456)
+        print("\n")
+
+    def test_predicate_module_Predicate_class(self):
+        age = [40, 23.5, 64, 70, np.nan, 52, 40, 18]
+        sex = ['F', 'M', 'F', None, 'M', 'F', 'X', 'M']
+        country = ['France', 'Italy', 'Peru', 'France', 'Spain', 'Italy',
+                   'Peru', 'France']
+        height = [1.6, 1.8, 1.55, 1.7, 1.9, 1.65, 1.75, 1.85]
+        people = xdata.CategoricalHeader(
+            'people', ['age', 'sex', 'country', 'body height', 'code'],
+            pd.DataFrame({0: age, 1: sex, 2: country, 3: height,
+                          4: ['a', 1, 'b', 2, 'c', 3, 'd', 4]}))
+        data = xdata.Xdata('data', np.arange(16.).reshape(8, 2),
+                           [people, xdata.MeasureHeader('t', 0, 2, 1, 's')],
+                           'mV')
+
+        def lines(expression):
+            return predicate.Predicate(expression).lines(people).tolist()
+
+        print("Tests for the class Predicate (module predicate) and the "
+              "class PredicateFilter (module operation): \n")
+
+        print("Test 1: raising errors for arguments with wrong types")
+        self.assertRaises(Exception, predicate.Predicate, 12)
+        self.assertRaises(Exception, predicate.Predicate, 'age >=')
+        self.assertRaises(Exception, predicate.Predicate, 'age + 1 > 2')
+        self.assertRaises(Exception, predicate.Predicate, 'f(age)')
+        self.assertRaises(Exception, predicate.Predicate, 'age > [1, 2]')
+        self.assertRaises(Exception, predicate.Predicate, 'age in country')
+        self.assertRaises(Exception, predicate.Predicate, '1 < 2')
+        self.assertRaises(Exception, lines, 'weight > 2')
+        self.assertRaises(Exception, predicate.Predicate('age > 2').mask,
+                          xdata.MeasureHeader('t', 0, 2, 1, 's'))
+        self.assertRaises(Exception, operation.PredicateFilter, people,
+                          'age > 100')
+        # a bare label must be a logical column
+        self.assertRaises(Exception, lines, 'country')
+        self.assertRaises(Exception, lines, 'age > 40 and not sex')
+
+        print("Test 2: selecting the lines satisfying an expression")
+        self.assertEqual(lines("age >= 40 and sex == 'F'"), [0, 2, 5])
+        self.assertEqual(lines("sex == 'M' or country in ['Peru']"),
+                         [1, 2, 4, 6, 7])
+        self.assertEqual(lines("not (20 <= age < 60)"), [2, 3, 7])
+        self.assertEqual(lines("sex not in ('F', 'X')"), [1, 4, 7])
+        self.assertEqual(lines("50 < age"), [2, 3, 5])
+        self.assertEqual(lines("country > 'Italy'"), [2, 4, 6])
+        self.assertEqual(lines("`body height` > 1.7 and -1 < age"),
+                         [1, 6, 7])
+        self.assertEqual(lines("age == 40 and `body height` < age"),
+                         [0, 6])
+        # the values that can't be compared are ignored
+        self.assertEqual(lines("code >= 2"), [3, 5, 7])
+        self.assertEqual(lines("code == 'a' or code in [3]"), [0, 5])
+        self.assertEqual(lines("sex == None"), [])
+        self.assertEqual(lines("age != 'x'"), [])
+        self.assertEqual(lines("not (age < 'x')"), [])
+        self.assertEqual(lines("code != 'a'"), [2, 4, 6])
+        self.assertEqual(lines("not (code == 'a') or code < 3"), [1, 2, 3, 4, 6])
+        self.assertEqual(lines("code == `body height` or country > sex"),
+                         [0, 2, 4, 5])
+        self.assertEqual(lines("not (sex < country) and sex != code"), [6])
+        # missing values satisfy neither a comparison nor its negation
+        self.assertEqual(lines("age != 40"), [1, 2, 3, 5, 7])
+        self.assertEqual(lines("not (age >= 40)"), [1, 7])
+        self.assertEqual(lines("not (sex == 'F' or age > 60)"), [1, 6, 7])
+        self.assertEqual(lines("sex == 'M' or not (age < 60)"),
+                         [1, 2, 3, 4, 7])
+        self.assertEqual(lines("age == age"), [0, 1, 2, 3, 5, 6, 7])
+        # logical columns
+        animals = xdata.CategoricalHeader(
+            'animals', ['alive', 'age'],
+            pd.DataFrame({0: pd.Series([True, False, True, False],
+                                       dtype=object),
+                          1: [3, 5, 8, 1]}))
+        self.assertEqual(predicate.Predicate(
+            "alive and age > 4").lines(animals).tolist(), [2])
+        self.assertEqual(predicate.Predicate(
+            "not alive").lines(animals).tolist(), [1, 3])
+        self.assertEqual(predicate.Predicate(
+            "alive == 1").lines(animals).tolist(), [])
+        self.assertEqual(predicate.Predicate(
+            "age > 30 and `body height` < 2").columns, ['age', 'body height'])
+
+        print("Test 3: filtering the data with a predicate")
+        f = operation.PredicateFilter(people, "sex == 'F' and age < 60")
+        self.assertEqual(tuple(f.selection), (0, 5))
+        slicer = operation.Slicer(data, [f])
+        slicer.update()
+        np.testing.assert_array_equal(slicer.slice.data, [5., 6.])
+        f.set_expression("country == 'Peru'")
+        self.assertEqual(f.expression, "country == 'Peru'")
+        np.testing.assert_array_equal(slicer.slice.data, [8., 9.])
+        self.assertRaises(Exception, f.set_expression, "age > 100")
+        self.assertEqual(tuple(f.selection), (2, 6))
+        reverse = people.update_categorical_header(
+            'perm', list(range(8))[::-1], None)
+        f.set_header(reverse)
+        self.assertEqual(tuple(f.selection), (1, 5))
+        self.assertRaises(Exception, f.set_header,
+                          xdata.CategoricalHeader('other', ['country'],
+                                                  pd.DataFrame({0: ['Peru']})))
+
+        print("Test 4: selecting among many lines")
+        n = 10 ** 6
+        many = xdata.CategoricalHeader(
+            'many', ['value', 'group'],
+            pd.DataFrame({0: np.arange(n) % 100,
+                          1: np.array(['a', 'b', 'c', 'd'] * (n // 4),
+                                      dtype=object)}))
+        found = predicate.Predicate(
+            "value < 10 and group in ['a', 'c']").lines(many)
+        self.assertEqual(len(found), n // 20)
+        self.assertTrue(np.all(found % 2 == 0))
+        print("\n")
+
+    def test_bitset_module_Bitset_class(self):
+        n = 200
+        a = bitset.Bitset(n, [0, 3, 63, 64, 130, 199])
+        b = bitset.Bitset.from_range(n, 60, 140)
+        data = xdata.Xdata('data', np.arange(2. * n).reshape(n, 2),
+                           [xdata.MeasureHeader('trials', 0, n, 1, 'no unit'),
+                            xdata.MeasureHeader('t', 0, 2, 1, 's')], 'mV')
+
+        print("Tests for the class Bitset (module bitset): \n")
+
+        print("Test 1: raising errors for arguments with wrong types")
+        self.assertRaises(Exception, bitset.Bitset, -1)
+        self.assertRaises(Exception, bitset.Bitset, n, [n])
+        self.assertRaises(Exception, bitset.Bitset, n, [0.5])
+        self.assertRaises(Exception, bitset.Bitset.from_mask, [0, 1])
+        self.assertRaises(Exception, bitset.Bitset.from_range, n, 10, 5)
+        self.assertRaises(Exception, a.union, [1, 2])
+        self.assertRaises(Exception, operation.Filter, 'trials',
+                          bitset.Bitset(n))
+
+        print("Test 2: set operations")
+        self.assertEqual(a.count, 6)
+        self.assertEqual(len(b), 80)
+        self.assertEqual((a.first, a.last), (0, 199))
+        self.assertEqual(bitset.Bitset(n).first, None)
+        self.assertEqual((a | b).count, 83)
+        self.assertEqual((a & b).lines().tolist(), [63, 64, 130])
+        self.assertEqual(list(a - b), [0, 3, 199])
+        self.assertEqual((a ^ b).count, 80)
+        self.assertEqual((~a).count, n - 6)
+        self.assertEqual(len(~bitset.Bitset(70)), 70)
+        self.assertTrue(64 in a and 65 not in a and n not in a)
+        mask = np.random.rand(n) > 0.5
+        np.testing.assert_array_equal(
+            bitset.Bitset.from_mask(mask).mask(), mask)
+        # the same elements give the same key, whatever n_elem
+        self.assertEqual(bitset.Bitset(10, [1, 2]),
+                         bitset.Bitset(1000, [1, 2]))
+        self.assertEqual(hash(bitset.Bitset(10, [1, 2])),
+                         hash(bitset.Bitset(1000, [1, 2])))
+        self.assertNotEqual(a, b)
+        big = bitset.Bitset.from_range(10 ** 7, 10, 10 ** 7 - 10)
+        self.assertEqual((big - a).count, 10 ** 7 - 20 - 4)
+        self.assertEqual((big & ~a).count, 186)
+
+        print("Test 3: converting to a slice or to line numbers")
+        self.assertEqual(b.to_index(), slice(60, 140))
+        self.assertTrue(b.is_contiguous)
+        self.assertFalse(a.is_contiguous)
+        np.testing.assert_array_equal(a.to_index(), [0, 3, 63, 64, 130, 199])
+
+        print("Test 4: filtering with a bitset")
+        f = operation.Filter('trials', b)
+        slicer = operation.Slicer(data, [f])
+        slicer.update()
+        np.testing.assert_allclose(slicer.slice.data,
+                                   data.data[60:140].mean(axis=0))
+        f.set_selection(a)
+        np.testing.assert_allclose(slicer.slice.data,
+                                   data.data[a.lines()].mean(axis=0))
+        f.set_selection(bitset.Bitset(n, [5]))
+        np.testing.assert_allclose(slicer.slice.data, data.data[5])
+        self.assertEqual(operation.Filter('trials', [1, 2]).get_bitset(n),
+                         bitset.Bitset(n, [1, 2]))
+        shared = operation.Filter('trials', [1, 2]).get_bitset(n) | \
+            f.get_bitset(n)
+        self.assertEqual(list(shared), [1, 2, 5])
+        # the slicer applies the filter when its selection changes
+        self.assertRaises(Exception, f.set_selection,
+                          bitset.Bitset(n + 10, [n + 5]))
+        print("\n")
+
+    def test_lazy_module_LazyArray_class(self):
+        data = np.random.rand(40, 30, 6)
+        x = xdata.Xdata('data', data,
+                        [xdata.MeasureHeader('x', 0, 40, 1, 'mm'),
+                         xdata.MeasureHeader('y', 0, 30, 1, 'mm'),
+                         xdata.MeasureHeader('trials', 0, 6, 1, 'no unit')],
+                        'mV')
+        a = lazy.LazyArray(x)
+
+        print("Tests for the class LazyArray (module lazy): \n")
+
+        print("Test 1: raising errors for arguments with wrong types")
+        self.assertRaises(Exception, lazy.LazyArray, [1, 2])
+        self.assertRaises(Exception, a.select, 3, 0)
+        self.assertRaises(Exception, a.select, 0, 40)
+        self.assertRaises(Exception, a.select, 0, [0.5])
+        self.assertRaises(Exception, a.reduce, 0, 'median')
+        self.assertRaises(Exception, a.bin, 0, 0)
+        self.assertRaises(Exception, a.filter, 2, [])
+        self.assertRaises(Exception, a.__add__, a[0])
+
+        print("Test 2: the operations give the same result as numpy")
+        np.testing.assert_allclose(a[3:30:2, -1].compute(),
+                                   data[3:30:2, -1])
+        np.testing.assert_allclose(a[5:35][::3][2:].compute(),
+                                   data[5:35][::3][2:])
+        np.testing.assert_allclose(a[[4, 1, 7]][1:].compute(),
+                                   data[[4, 1, 7]][1:])
+        np.testing.assert_allclose(a.filter(2, [1, 3, 4]).compute(),
+                                   data[:, :, [1, 3, 4]].mean(axis=2))
+        np.testing.assert_allclose(a.filter(2, [2]).compute(),
+                                   data[:, :, 2])
+        np.testing.assert_allclose(
+            a.filter(2, bitset.Bitset(6, [0, 1, 2])).compute(),
+            data[:, :, :3].mean(axis=2))
+        np.testing.assert_allclose(a.reduce((0, 1), 'max').compute(),
+                                   data.max(axis=(0, 1)))
+        np.testing.assert_allclose(
+            a.reduce(2, 'sum').reduce(0, 'sum').compute(),
+            data.sum(axis=(0, 2)))
+        binned = np.concatenate((data[:36].reshape(9, 4, 30, 6).mean(axis=1),
+                                 data[36:].mean(axis=0, keepdims=True)))
+        np.testing.assert_allclose(a.bin(0, 4).compute(), binned)
+        np.testing.assert_allclose((2 * np.log(a + 1) - a / 2).compute(),
+                                   2 * np.log(data + 1) - data / 2)
+        np.testing.assert_allclose((-a[0] ** 2).compute(), -data[0] ** 2)
+        np.testing.assert_allclose((1 - a).apply(np.sqrt).compute(),
+                                   np.sqrt(1 - data))
+
+        print("Test 3: only the region that is asked is read")
+        # filter, zoom and binning of an image, as in a view
+        image = (a.filter(2, [0, 5]) * 10)[4:36].bin(0, 4).bin(1, 3)
+        full = (data[:, :, [0, 5]].mean(axis=2) * 10)[4:36]
+        full = full.reshape(8, 4, 10, 3).mean(axis=(1, 3))
+        self.assertEqual(image.shape, (8, 10))
+        np.testing.assert_allclose(image.compute(), full)
+        self.assertEqual(image.n_read, 32 * 30 * 2)
+        np.testing.assert_allclose(image.compute((slice(2, 4), 5)),
+                                   full[2:4, 5])
+        # 2 bins of 4 lines, 1 bin of 3 columns, 2 trials
+        self.assertEqual(image.n_read, 8 * 3 * 2)
+        np.testing.assert_allclose(image.compute((-1, -1)), full[-1, -1])
+        self.assertEqual(image.n_read, 4 * 3 * 2)
+        # the selections are applied on the data, before the other
+        # operations
+        plan = image[1:3, 2].plan().splitlines()
+        self.assertEqual([line.split()[0] for line in plan],
+                         ['select', 'mean', 'mean', 'multiply', 'mean',
+                          'select', 'select', 'select', 'data'])
+        self.assertEqual(plan[-2].strip(), "select 8:16 on dimension 0")
+        self.assertEqual(plan[-3].strip(), "select 6:9 on dimension 1")
+        # consecutive selections are merged
+        plan = a[2:30][1:20:2][3].plan().splitlines()
+        self.assertEqual(plan, ["select 9 on dimension 0",
+                                "    data (40, 30, 6)"])
+        # reductions with the same method are made at once
+        self.assertEqual(len(a.reduce(0).reduce(0).plan().splitlines()), 2)
+        self.assertEqual(len(a.reduce(0, 'std').reduce(0, 'std')
+                             .plan().splitlines()), 3)
+        print("\n")
+
+    @unittest.skipIf(arrow_interop.pa is None, "pyarrow is not installed")
+    def test_arrow_interop_module_xdata_to_arrow_function(self):
+        pa = arrow_interop.pa
+        n = 1000
+        conditions = xdata.CategoricalHeader(
+            'trials', ['condition', 'rate'],
+            pd.DataFrame({0: ['go', 'stop', 'go', 'wait'] * (n // 4),
+                          1: np.linspace(0, 1, n)}))
+        channels = xdata.CategoricalHeader(
+            'channels', ['name'], pd.DataFrame({0: ['a', 'b', 'c']}))
+        data = np.random.rand(n, 3, 20)
+        x = xdata.Xdata('voltage', data,
+                        [conditions, channels,
+                         xdata.MeasureHeader('time', 0, 20, 0.1, 's')],
+                        'mV')
+
+        print("Tests for the functions of the module arrow_interop: \n")
+
+        print("Test 1: raising errors for arguments with wrong types")
+        self.assertRaises(Exception, arrow_interop.header_to_arrow,
+                          x.headers[2])
+        self.assertRaises(Exception, arrow_interop.xdata_to_arrow, data)
+        self.assertRaises(Exception, arrow_interop.xdata_from_arrow,
+                          pa.record_batch([pa.array(['a'])], names=['a']))
+        self.assertRaises(Exception, arrow_interop.header_from_arrow,
+                          pa.record_batch([pa.array([1])], names=['a']))
+        self.assertRaises(Exception, arrow_interop.xdata_from_tensor, data,
+                          'voltage')
+
+        print("Test 2: categorical headers")
+        batch = arrow_interop.header_to_arrow(conditions)
+        self.assertTrue(pa.types.is_dictionary(batch.column(0).type))
+        self.assertEqual(batch.column(0).dictionary.to_pylist(),
+                         ['go', 'stop', 'wait'])
+        self.assertEqual(batch.schema.names, ['condition', 'rate'])
+        header = arrow_interop.header_from_arrow(batch)
+        self.assertTrue(header == conditions)
+        # the numeric column shares the buffer of the Arrow array (pandas
+        # older than 1.5 copies the columns of a DataFrame), the hash index
+        # is given by the dictionary
+        sharing = tuple(int(v) for v in pd.__version__.split('.')[:2]) >= \
+            (1, 5)
+        if sharing:
+            self.assertTrue(np.shares_memory(header.values[1].values,
+                                             conditions.values[1].values))
+        self.assertEqual(set(header._indexes), {(0, 'hash')})
+        # so do several numeric columns
+        numbers = pa.record_batch([pa.array(np.arange(5.)),
+                                   pa.array(np.arange(5.) * 2)],
+                                  names=['x', 'y'])
+        points = arrow_interop.header_from_arrow(numbers, 'points')
+        np.testing.assert_array_equal(points.values[1].values,
+                                      np.arange(5.) * 2)
+        if sharing:
+            for j in range(2):
+                self.assertTrue(np.shares_memory(
+                    points.values[j].values, numbers.column(j).to_numpy()))
+        np.testing.assert_array_equal(header.find_lines(0, 'stop'),
+                                      np.arange(1, n, 4))
+        # arrays given by another pipeline
+        header = arrow_interop.header_from_arrow(
+            pa.table({'cell': ['x', None, 'x'], 'depth': pa.array(
+                [1, 2, 3], pa.int32()), 'ok': [True, False, None]}),
+            'cells')
+        self.assertEqual([c.dimension_type for c in
+                          header.column_descriptors],
+                         ['string', 'numeric', 'logical'])
+        self.assertEqual(header.get_value(2, 'cell'), 'x')
+        self.assertEqual(header.get_value(1, 'cell'), None)
+        np.testing.assert_array_equal(header.find_lines('cell', 'x'), [0, 2])
+        self.assertEqual(header.values[1].dtype, np.int64)
+        self.assertEqual(header.get_value(1, 'ok'), False)
+        empty = arrow_interop.header_from_arrow(arrow_interop.header_to_arrow(
+            xdata.CategoricalHeader('lines', n_elem=5)))
+        self.assertEqual(empty.n_elem, 5)
+
+        print("Test 3: conversion of a Xdata to a record batch and back")
+        batch = arrow_interop.xdata_to_arrow(x)
+        self.assertEqual(batch.num_rows, n)
+        self.assertEqual(batch.schema.names, ['condition', 'rate', 'voltage'])
+        y = arrow_interop.xdata_from_arrow(batch)
+        self.assertEqual(y.name, 'voltage')
+        self.assertEqual(y.data_descriptor.unit, 'mV')
+        np.testing.assert_array_equal(y.data, data)
+        self.assertTrue(np.shares_memory(y.data, data))
+        for d in range(3):
+            self.assertTrue(y.headers[d] == x.headers[d])
+        # the data of a table given by another pipeline
+        y = arrow_interop.xdata_from_arrow(pa.table(
+            {'cell': ['x', 'y'], 'trace': pa.FixedSizeListArray.from_arrays(
+                pa.array(np.arange(6.)), 3)}))
+        self.assertEqual(y.shape(), (2, 3))
+        self.assertEqual(y.name, 'trace')
+        self.assertEqual(y.headers[0].get_item_name(1), 'y')
+
+        print("Test 4: conversion of a Xdata to a tensor and back")
+        permuted, flag = x.modify_dimensions('dim_perm', [2, 0, 1], None,
+                                             None)
+        tensor = arrow_interop.xdata_to_tensor(permuted)
+        self.assertEqual(tensor.dim_names, ['time', 'trials', 'channels'])
+        y = arrow_interop.xdata_from_tensor(tensor, 'voltage',
+                                            permuted.headers, 'mV')
+        np.testing.assert_array_equal(y.data, permuted.data)
+        self.assertTrue(np.shares_memory(y.data, data))
+        y = arrow_interop.xdata_from_tensor(tensor, 'voltage')
+        self.assertEqual(y.headers[1].label, 'trials')
+        self.assertTrue(y.headers[1].is_undifferentiated)
+        print("\n")
+
 
 if __name__ == "__main__":
     first_test = MyTestCase()
+    first_test.setUp()
     first_test.test_xdata_module_DimensionDescription_class()
     first_test.test_xdata_module_CategoricalHeader_class()
     first_test.test_xdata_module_MeasureHeader_class()
     first_test.test_xdata_module_Xdata_class()
+    first_test.test_column_index_module_HashIndex_class()
+    first_test.test_column_index_module_TextIndex_class()
+    first_test.test_xdata_module_Xdata_group_by_method()
+    first_test.test_xdata_module_Xdata_contiguous_data_method()
+    first_test.test_xdata_module_DataStatistics_class()
+    first_test.test_xdata_module_Xdata_calibration_attribute()
     first_test.test_xdata_module_create_dimension_description_function()
+    first_test.test_bank_module_UnitBank_class()
+    first_test.test_sparse_module_SparseArray_class()
+    first_test.test_stream_module_StreamingXdata_class()
+    first_test.test_ingest_module_IngestServer_class()
+    first_test.test_instrumentation_module_Registry_class()
+    first_test.test_instrumentation_module_FrameProfiler_class()
+    if view is not None:
+        first_test.test_view_module_ViewDisplay_class()
+    first_test.test_memory_module_VersionTracker_class()
+    first_test.test_benchmark_module_run_function()
+    first_test.test_parallel_module_ThreadReducer_class()
+    if sys.version_info >= (3, 8):
+        first_test.test_parallel_module_ProcessTransformer_class()
+    first_test.test_operation_module_Slicer_class()
+    first_test.test_operation_module_SliceWorker_class()
+    first_test.test_operation_module_SlicePrefetcher_class()
+    first_test.test_operation_module_SliceGraph_class()
+    first_test.test_list_display_module_ListDisplay_class()
+    first_test.test_predicate_module_Predicate_class()
+    first_test.test_bitset_module_Bitset_class()
+    first_test.test_lazy_module_LazyArray_class()
+    if arrow_interop.pa is not None:
+        first_test.test_arrow_interop_module_xdata_to_arrow_function()
+    first_test.tearDown()
 
@@ -9,9 +9,13 @@ that will be applied on the data.
 
 
 This module uses:
+    - contextlib
     - numpy as np
+    - time
     - vispy
 
+    - instrumentation
+
 There are 2 classes in this module:
 
     - **Window**:
@@ -22,6 +26,13 @@ There are 2 classes in this module:
         This class handles the display of the axis, labels, and graphs (and
         their position).
 
+There are 2 functions in this module:
+    - **decimate**:
+        decimate reduces the points of a trace to the minimum and maximum of
+        each column of pixels.
+    - **main**:
+        main creates the window of xplor and starts the app.
+
 """
 
 # Authors: Elodie Ikkache CNRS <elodie.ikkache@student.ecp.fr>
@@ -30,117 +41,17 @@ There are 2 classes in this module:
 # version 1.0
 # -*- coding: utf-8 -*-
 
+import contextlib
+import time
 
+import numpy as np
 from vispy import scene
 from vispy import app
 
+# the time of each stage of the frames is measured
+import instrumentation
 
 
-# creating the canvas of window
-canvas = scene.SceneCanvas(title="xplor your data",
-                           size=(800, 600),
-                           position=(500, 100),
-                           show=True,
-                           app='PyQt5',
-                           resizable=True,
-                           #later shared
-                           always_on_top=True,
-                           bgcolor='gray')
-# display the canevas
-canvas.show()
-
-# creating the grid to place the elements
-global_grid = canvas.central_widget.add_grid()
-
-# visually separating the control from the display
-w, h = canvas.size
-
-control_zone = global_grid.add_widget(row=0, col=0)
-control_zone.bgcolor = "#999999"
-
-control_display = global_grid.add_widget(row=0, col=1)
-control_display.bgcolor = "#efefef"
-
-control_zone.width_min = w/6
-control_zone.width_max = w/6
-
-# display zone
-
-display_grid = control_display.add_grid()
-
-# adding a title
-display_title = scene.Label("name of the xdata element", color="#0026b0")
-display_title.height_max = 60
-display_grid.add_widget(display_title, row=0, col=3)
-
-
-display_note = scene.Label("Display:", color="black")
-display_note.height_max = 60
-display_grid.add_widget(display_note, row=0, col=0)
-
-
-# ading the data axis
-data_axis = scene.AxisWidget(orientation='left',
-                             axis_label='unit of data',
-                             axis_font_size=10,
-                             axis_label_margin=30,
-                             tick_label_margin=5,
-                             text_color="black")
-data_axis.width_max = 50
-display_grid.add_widget(data_axis, row=3, col=5)
-
-# adding labels
-xy_label = scene.Label("xy label", color="#0026b0")
-x_main_label = scene.Label("x main label", color="#0026b0")
-x_sub_label = scene.Label("x sub_label", color="#0026b0")
-y_main_label = scene.Label("y main label", color="#0026b0")
-y_sub_label = scene.Label("y sub_label", color="#0026b0")
-
-display_grid.add_widget(xy_label, row=1, col=3)
-display_grid.add_widget(x_main_label, row=3, col=0)
-display_grid.add_widget(x_sub_label, row=3, col=1)
-display_grid.add_widget(y_main_label, row=6, col=3)
-display_grid.add_widget(y_sub_label, row=5, col=3)
-
-# add the axis for x and y
-x_axis = scene.AxisWidget(orientation='left',
-                             axis_label='x axis unit',
-                             axis_font_size=10,
-                             axis_label_margin=30,
-                             tick_label_margin=5,
-                             text_color="black")
-x_axis.width_max = 50
-display_grid.add_widget(x_axis, row=3, col=2)
-
-y_axis = scene.AxisWidget(orientation='bottom',
-                             axis_label='y axis unit',
-                             axis_font_size=10,
-                             axis_label_margin=30,
-                             tick_label_margin=5,
-                             text_color="black")
-display_grid.add_widget(y_axis, row=4, col=3)
-
-# adding zoom
-x_zoom = display_grid.add_widget(row=3, col=4)
-x_zoom.bgcolor = "black"
-x_zoom.width_min = 20
-x_zoom.width_max = 20
-
-y_zoom = display_grid.add_widget(row=2, col=3)
-y_zoom.bgcolor = "black"
-y_zoom.height_min = 20
-y_zoom.height_max = 20
-
-# adding the widget to display all the graphs in a grid
-viewzone = display_grid.add_widget(row=3, col=3)
-viewzone.border_color = "blue"
-viewzone.width_min = w/2
-viewzone.width_max = w/2
-viewzone.height_min = w/2
-viewzone.height_max = w/2
-
-# start the app
-app.run()
 
 
 class ViewDisplay:
@@ -169,4 +80,271 @@ class ViewDisplay:
         The graph(s) or images of xdata to be displayed on the window's canvas.
     - axis :
         The axis lnked to the view (headers' information) matrices
+    - profiler :
+        FrameProfiler (module instrumentation) measuring each stage of the
+        rendering: 'slice', 'decimation', 'upload', 'draw' and 'swap'
+    - profiling :
+        True if the frames are measured (False by default: measuring the
+        GPU stages waits for the GPU at each draw)
+
+    **Methods**
+
+    - set_profiling(profiling):
+        starts or stops measuring the frames
+    - start_frame:
+        starts measuring a frame (called when a slice is received or before
+        the first draw)
+    - measure(stage):
+        context manager measuring a stage of the current frame while
+        profiling, e.g. with display.measure('decimation'): ...
+    - show_slice(new_slice, visual, n_pixels):
+        decimates a 1D slice to n_pixels columns and uploads the points to
+        visual (e.g. a vispy Line), measuring the 'slice', 'decimation' and
+        'upload' stages
+    - end_frame:
+        ends the current frame and refreshes the overlay
+    - add_render_hook(fun):
+        fun(stage, duration) will be called at the end of each stage
+    - remove_render_hook(fun):
+        stops calling fun
+    - connect_canvas(canvas):
+        measures the 'draw' and 'swap' stages of each draw of canvas while
+        profiling
+    - show_profile(parent):
+        starts profiling and adds to parent (a widget of the canvas) a text
+        showing the frame times, updated after each frame
+    - dump_profile(path):
+        writes the times of the latest frames in a JSON file
     """
+
+    def __init__(self, window):
+        """Constructor of the class ViewDisplay"""
+        self.window = window
+        self.profiler = instrumentation.FrameProfiler()
+        self._overlay = None
+        self._draw_start = None
+        self._profiling = False
+
+    @property
+    def profiling(self):
+        """True if the frames are measured"""
+        return self._profiling
+
+    def set_profiling(self, profiling):
+        """starts or stops measuring the frames"""
+        if not isinstance(profiling, bool):
+            raise Exception("profiling must be a boolean")
+        self._profiling = profiling
+        if not profiling:
+            self.profiler.cancel_frame()
+            self._draw_start = None
+
+    def start_frame(self):
+        """starts measuring a frame"""
+        self.profiler.start_frame()
+
+    @contextlib.contextmanager
+    def measure(self, stage):
+        """context manager measuring a stage of the current frame"""
+        if not self._profiling:
+            yield
+            return
+        if not self.profiler.in_frame:
+            self.profiler.start_frame()
+        with self.profiler.stage(stage):
+            yield
+
+    def show_slice(self, new_slice, visual, n_pixels):
+        """decimates a 1D slice to n_pixels columns and uploads the points to
+        visual"""
+        if new_slice.get_n_dimensions() != 1:
+            raise Exception("only 1D slices are drawn as a trace")
+        with self.measure('slice'):
+            values = new_slice.values
+        with self.measure('decimation'):
+            x, y = decimate(values, n_pixels)
+        with self.measure('upload'):
+            visual.set_data(pos=np.column_stack((x, y)).astype(np.float32))
+
+    def end_frame(self):
+        """ends the current frame and refreshes the overlay"""
+        frame = self.profiler.end_frame()
+        if self._overlay is not None:
+            self._overlay.text = self.profiler.overlay_text()
+        return frame
+
+    def add_render_hook(self, fun):
+        """fun(stage, duration) will be called at the end of each stage"""
+        self.profiler.add_hook(fun)
+
+    def remove_render_hook(self, fun):
+        """stops calling fun"""
+        self.profiler.remove_hook(fun)
+
+    def connect_canvas(self, canvas):
+        """measures the 'draw' and 'swap' stages of each draw of canvas while
+        profiling"""
+        def on_draw_start(event):
+            if not self._profiling:
+                return
+            if not self.profiler.in_frame:
+                self.profiler.start_frame()
+            self._draw_start = time.perf_counter()
+
+        def on_draw_end(event):
+            if not self._profiling or self._draw_start is None:
+                return
+            self.profiler.record('draw',
+                                 time.perf_counter() - self._draw_start)
+            self._draw_start = None
+            # waiting for the GPU to execute the commands, as the swap of
+            # the buffers does (this stalls the pipeline, hence only while
+            # profiling)
+            with self.profiler.stage('swap'):
+                canvas.context.finish()
+                canvas.context.flush_commands()
+            self.end_frame()
+
+        canvas.events.draw.connect(on_draw_start, position='first')
+        canvas.events.draw.connect(on_draw_end, position='last')
+
+    def show_profile(self, parent):
+        """starts profiling and adds to parent a text showing the frame
+        times"""
+        self.set_profiling(True)
+        self._overlay = scene.Label(self.profiler.overlay_text(),
+                                    color="black", font_size=8)
+        parent.add_widget(self._overlay)
+
+    def dump_profile(self, path):
+        """writes the times of the latest frames in a JSON file"""
+        self.profiler.dump(path)
+
+
+def decimate(values, n_pixels):
+    """reduces a trace to the minimum and maximum of each of n_pixels
+    columns, gives the positions (in samples) and the values of the points
+    (the trace is kept if it has less than two points per column)"""
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if n <= 2 * n_pixels:
+        return np.arange(n, dtype=float), values
+    edges = np.linspace(0, n, n_pixels + 1).astype(int)
+    lows = np.minimum.reduceat(values, edges[:-1])
+    highs = np.maximum.reduceat(values, edges[:-1])
+    # both points of a column are drawn at its center
+    x = np.repeat((edges[:-1] + edges[1:] - 1) / 2, 2)
+    return x, np.column_stack((lows, highs)).ravel()
+
+
+def main():
+    """creates the window of xplor and starts the app"""
+    # creating the canvas of window
+    canvas = scene.SceneCanvas(title="xplor your data",
+                               size=(800, 600),
+                               position=(500, 100),
+                               show=True,
+                               app='PyQt5',
+                               resizable=True,
+                               #later shared
+                               always_on_top=True,
+                               bgcolor='gray')
+    # display the canevas
+    canvas.show()
+
+    # creating the grid to place the elements
+    global_grid = canvas.central_widget.add_grid()
+
+    # visually separating the control from the display
+    w, h = canvas.size
+
+    control_zone = global_grid.add_widget(row=0, col=0)
+    control_zone.bgcolor = "#999999"
+
+    control_display = global_grid.add_widget(row=0, col=1)
+    control_display.bgcolor = "#efefef"
+
+    control_zone.width_min = w/6
+    control_zone.width_max = w/6
+
+    # display zone
+
+    display_grid = control_display.add_grid()
+
+    # adding a title
+    display_title = scene.Label("name of the xdata element", color="#0026b0")
+    display_title.height_max = 60
+    display_grid.add_widget(display_title, row=0, col=3)
+
+
+    display_note = scene.Label("Display:", color="black")
+    display_note.height_max = 60
+    display_grid.add_widget(display_note, row=0, col=0)
+
+
+    # ading the data axis
+    data_axis = scene.AxisWidget(orientation='left',
+                                 axis_label='unit of data',
+                                 axis_font_size=10,
+                                 axis_label_margin=30,
+                                 tick_label_margin=5,
+                                 text_color="black")
+    data_axis.width_max = 50
+    display_grid.add_widget(data_axis, row=3, col=5)
+
+    # adding labels
+    xy_label = scene.Label("xy label", color="#0026b0")
+    x_main_label = scene.Label("x main label", color="#0026b0")
+    x_sub_label = scene.Label("x sub_label", color="#0026b0")
+    y_main_label = scene.Label("y main label", color="#0026b0")
+    y_sub_label = scene.Label("y sub_label", color="#0026b0")
+
+    display_grid.add_widget(xy_label, row=1, col=3)
+    display_grid.add_widget(x_main_label, row=3, col=0)
+    display_grid.add_widget(x_sub_label, row=3, col=1)
+    display_grid.add_widget(y_main_label, row=6, col=3)
+    display_grid.add_widget(y_sub_label, row=5, col=3)
+
+    # add the axis for x and y
+    x_axis = scene.AxisWidget(orientation='left',
+                                 axis_label='x axis unit',
+                                 axis_font_size=10,
+                                 axis_label_margin=30,
+                                 tick_label_margin=5,
+                                 text_color="black")
+    x_axis.width_max = 50
+    display_grid.add_widget(x_axis, row=3, col=2)
+
+    y_axis = scene.AxisWidget(orientation='bottom',
+                                 axis_label='y axis unit',
+                                 axis_font_size=10,
+                                 axis_label_margin=30,
+                                 tick_label_margin=5,
+                                 text_color="black")
+    display_grid.add_widget(y_axis, row=4, col=3)
+
+    # adding zoom
+    x_zoom = display_grid.add_widget(row=3, col=4)
+    x_zoom.bgcolor = "black"
+    x_zoom.width_min = 20
+    x_zoom.width_max = 20
+
+    y_zoom = display_grid.add_widget(row=2, col=3)
+    y_zoom.bgcolor = "black"
+    y_zoom.height_min = 20
+    y_zoom.height_max = 20
+
+    # adding the widget to display all the graphs in a grid
+    viewzone = display_grid.add_widget(row=3, col=3)
+    viewzone.border_color = "blue"
+    viewzone.width_min = w/2
+    viewzone.width_max = w/2
+    viewzone.height_min = w/2
+    viewzone.height_max = w/2
+
+    # start the app
+    app.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,10 +7,19 @@ This module uses:
     - pandas as pd
     - numpy as np
     - operator
+    - itertools
+    - threading
+    - concurrent.futures
     - abc
+    - bank
+    - column_index
+    - instrumentation
+    - memory
+    - parallel
+    - sparse
 
 
-There are 6 classes in this module:
+There are 7 classes in this module:
     
     - **Color**:
         This class allows defining colors, either as RGB values or using
@@ -42,6 +51,11 @@ There are 6 classes in this module:
         equally spaced sample in a continuous dimension such as time or space.
         In which case, there is only one subdimension (i.e. only one column).
                       
+    - **DataStatistics**:
+        DataStatistics keeps the min, max, number of NaN and sum of the data
+        of a Xdata instance, for each line of a dimension, so that they can be
+        updated when a few lines change.
+
     - **Xdata**:
         Xdata is used to store the data. Xdata is a container for an ND
         (N dimensional) array with all the values/data, as well as all of the
@@ -56,7 +70,8 @@ There are 2 functions in this class:
         pandas.core.series.Series.
     - **check_bank_unit**:
         The functions checks if this unit is in one of the conversion tables of
-        the bank. If so, it returns the conversion table, else, it returns None
+        the bank (module bank). If so, it returns the conversion table, else,
+        it returns None
 """
 
 # Authors: Elodie Ikkache CNRS <elodie.ikkache@student.ecp.fr>
@@ -71,8 +86,26 @@ import pandas as pd
 from abc import ABC, abstractmethod
 # itemgetter is used to sort a list of dictionaries
 from operator import itemgetter
+# count gives the version numbers of Xdata instances
+import itertools
+# the text indexes of the columns are built in the background
+import threading
+from concurrent.futures import Future
 from pprint import pprint
 
+# the bank of conversion tables is only loaded when a unit is checked
+import bank
+# the lines having some values are found with indexes of the columns
+import column_index
+# reductions of big arrays are computed in a pool of threads
+import parallel
+# data with mostly missing cells is stored as a SparseArray
+import sparse
+# the time and memory used by the operations can be recorded
+import instrumentation
+# the live Xdata instances are tracked to account for their memory
+import memory
+
 
 class Color:
     """ Defines colors.
@@ -154,6 +187,14 @@ class DimensionDescription:
         (type str or list)
         
         optional (default value = None)
+    - calibration:
+        for numerical dimensions whose values are stored quantized (e.g. as
+        int16 coming from an instrument), pair (scale, offset) giving the
+        values in the unit: value = scale * stored_value + offset
+
+        (type tuple)
+
+        optional (default value = None, the values are stored as they are)
  
     
     **Attributes**
@@ -168,6 +209,9 @@ class DimensionDescription:
         (type str)
     - all_units:
         list of dictionaries for unit conversions
+    - calibration:
+        pair (scale, offset) to get the values from the stored values, or
+        None
 
     **Methods**
 
@@ -176,6 +220,8 @@ class DimensionDescription:
         of the correct dimension_type (merging lines for instance)
     - copy:
         to copy a DimensionDescription instance
+    - calibrate(values):
+        gives the values from the stored (possibly quantized) values
         
     *(static methods)*
 
@@ -203,7 +249,8 @@ class DimensionDescription:
     def __init__(self,
                  label,
                  dimension_type,
-                 unit=None):
+                 unit=None,
+                 calibration=None):
         """Constructor of the class DimensionDescription"""
 
         # Checking arguments and setting properties.
@@ -271,6 +318,24 @@ class DimensionDescription:
                             "the conversion indicator (e.g. "
                             "['mm', 10**(-3), 'm', 1])")
 
+        # only 'numeric' dimensions can be stored quantized
+        if calibration is None:
+            self._calibration = None
+        elif dimension_type != 'numeric':
+            raise Exception("only numeric DimensionDescriptions can have a"
+                            " calibration")
+        elif not (isinstance(calibration, (tuple, list)) and
+                  len(calibration) == 2):
+            raise Exception("calibration must be a pair (scale, offset)")
+        else:
+            try:
+                scale, offset = float(calibration[0]), float(calibration[1])
+            except (TypeError, ValueError):
+                raise Exception("scale and offset must be numerical scalars")
+            if scale == 0:
+                raise Exception("the scale of the calibration can't be 0")
+            self._calibration = (scale, offset)
+
         self._check_type_fun = None
 
     # Attributes label, dimension_type, unit and all_units can be seen but not
@@ -295,9 +360,16 @@ class DimensionDescription:
         """conversion table (type list of dict)"""
         return self._all_units
 
+    @property
+    def calibration(self):
+        """pair (scale, offset) to get the values from the stored values, or
+        None"""
+        return self._calibration
+
     def __eq__(self, other):
         return ((self._label == other._label) and (self._unit == other._unit)
-                and (self._all_units == other._all_units))
+                and (self._all_units == other._all_units)
+                and (self._calibration == other._calibration))
 
     def set_dim_type_to_mixed(self):
         """change the dimension_type to mixed"""
@@ -311,8 +383,17 @@ class DimensionDescription:
             obj._all_units = None
         else:
             obj._all_units = self._all_units.copy()
+        obj._calibration = self._calibration
         return obj
 
+    def calibrate(self, values):
+        """gives the values from the stored values (they are returned as they
+        are if there is no calibration)"""
+        if self._calibration is None:
+            return values
+        scale, offset = self._calibration
+        return np.asarray(values) * scale + offset
+
     def check_type(self, x, raise_error=False):
         """check that a given value satisfies dimension_type"""
 
@@ -438,6 +519,13 @@ def create_dimension_description(label, column=None):
     return DimensionDescription(label, dimension_type)
 
 
+def _check_line_range(lines, n_elem):
+    """checks that all the lines of a range are in [0, n_elem["""
+    if len(lines) and (min(lines[0], lines[-1]) < 0 or
+                       max(lines[0], lines[-1]) >= n_elem):
+        raise Exception("line_num must be in [0, n_elem[")
+
+
 class Header(ABC):
     """ This abstract class allows the creation of headers for the different 
     dimensions of a dataset.
@@ -500,8 +588,8 @@ class Header(ABC):
         python, we have decided that to access the first element of the
         column, line_num must be equal to 0.
     - get_item_name(line_num):
-        line_num can here be an integer or a list of integer. The function
-        returns the corresponding values of the first column.
+        line_num can here be an integer, a list of integer or a range. The
+        function returns the corresponding values of the first column.
     - copy:
         creates a copy of the header
                 
@@ -650,8 +738,8 @@ class Header(ABC):
 
     @abstractmethod
     def get_item_name(self, line_num):
-        """get the value(s) of the line(s) in line_num (it can be an int or a list
-        of int), of the first column"""
+        """get the value(s) of the line(s) in line_num (it can be an int, a list
+        of int or a range), of the first column"""
         pass
 
     @abstractmethod
@@ -751,13 +839,19 @@ class CategoricalHeader(Header):
         python, we have decided that to access the first element of the
         column, line_num must be equal to 0.
     - get_item_name(line_num):
-        line_num can here be an integer or a list of integer. The function
-        returns the corresponding values of the first column
+        line_num can here be an integer, a list of integer or a range. The
+        function returns the corresponding values of the first column
     - copy:
         creates a copy of the categorical header
 
     *(other methods)*
 
+    - get_column_values(column):
+        gives the values of the column defined by its label or number (numpy
+        array)
+    - get_column_descriptor(column):
+        gives the DimensionDescription of the column defined by its label or
+        number
     - add_column(column_descriptor, values):
         column_descriptor must be of type str or DimensionDescription
         values must be of type pandas.core.series.Series this method allows
@@ -778,9 +872,33 @@ class CategoricalHeader(Header):
         When merging some data, the corresponding header's lines must be
         merged as well. merge_lines returns for each column all the
         encountered values with no repetitions in the from of a pandas Series.
+    - group_lines(column):
+        gives for each line the number of its group (lines having the same
+        value in column) and the header in which the lines of each group are
+        merged, as merge_lines would do it.
+    - get_index(column, kind='hash', wait=True):
+        gives the index of column (HashIndex for kind 'hash', SortedIndex
+        for kind 'sorted', TextIndex for kind 'text', module column_index),
+        built the first time it is needed and updated by
+        update_categorical_header with the flags 'perm', 'chg', 'new' and
+        'remove'. If wait is False, the index is built in a background
+        thread and None is returned until it is ready (if the build fails,
+        the error is raised by the next call with wait True)
+    - find_lines(column, value):
+        gives the lines whose value in column is value (numpy array of int),
+        using the hash index
+    - find_range(column, low=None, high=None):
+        gives the lines whose value in column is in [low, high] (numbers or
+        strings), using the sorted index
+    - search_lines(column, text, mode='substring'):
+        gives the lines whose value in column starts with (mode 'prefix') or
+        contains (mode 'substring') text, ignoring the case, using the text
+        index (it is built in the background, the lines are scanned
+        meanwhile)
     """
 
     # noinspection PyMissingConstructor
+    @instrumentation.instrumented('CategoricalHeader.__init__')
     def __init__(self,
                  label,
                  column_descriptors=None,
@@ -844,6 +962,24 @@ class CategoricalHeader(Header):
         self._label = label
         self._values = values
         self._column_descriptors = column_descriptors
+        # number of each column label and indexes, built when needed
+        self._column_numbers = None
+        self._indexes = {}
+        self._building = {}
+
+    @classmethod
+    def _from_columns(cls, label, column_descriptors, values, indexes=None):
+        """gives a header whose values are already known to satisfy the
+        column descriptors (e.g. read from typed columns), without checking
+        them line by line"""
+        obj = cls.__new__(cls)
+        obj._label = label
+        obj._values = values
+        obj._column_descriptors = column_descriptors
+        obj._column_numbers = None
+        obj._indexes = {} if indexes is None else indexes
+        obj._building = {}
+        return obj
 
     # private property but with get access
     @property
@@ -918,24 +1054,21 @@ class CategoricalHeader(Header):
             else:
                 raise Exception("not implemented yet (should return the whole "
                                 "line)")  # TODO
-        if isinstance(column, int):
-            if column >= self.n_column or column < 0:
-                raise Exception("column is a str or an int in [0, n_col[")
-            return self._values[column][line]
-        elif isinstance(column, str):
-            for j in range(self.n_column):
-                if column == self._column_descriptors[j].label:
-                    return self._values[j][line]
-            raise Exception("column is either the label of a column or it's"
-                            "number (int)")
-        else:
-            raise Exception("column is either the label of a column or it's"
-                            "number (int)")
-        # if it is a string
+        return self._values[self._get_column_number(column)][line]
+
+    def get_column_values(self, column):
+        """gives the values of the column defined by its label or number, as a
+        numpy array"""
+        return self._values[self._get_column_number(column)].values
+
+    def get_column_descriptor(self, column):
+        """gives the DimensionDescription of the column defined by its label
+        or number"""
+        return self._column_descriptors[self._get_column_number(column)]
 
     def get_item_name(self, line):
-        """get the value(s) of the line(s) in line_num (it can be an int or a list
-        of int), of the first column"""
+        """get the value(s) of the line(s) in line_num (it can be an int, a list
+        of int or a range), of the first column"""
         # this function is the same for both the headers, but it could be
         # modified to choose witch column we want for categorical headers
         if isinstance(line, int):
@@ -950,8 +1083,18 @@ class CategoricalHeader(Header):
                 return [self.get_value(i, 0) for i in line]
             else:
                 return [str(i) for i in line]
+        elif isinstance(line, range):
+            # a window of lines (e.g. the visible rows of a list) is read at
+            # once
+            _check_line_range(line, self.n_elem)
+            if self.n_column:
+                return self._values.iloc[np.asarray(line, dtype=np.int64),
+                                         0].tolist()
+            else:
+                return [str(i) for i in line]
         else:
-            raise Exception("line_num must be an int or a list of int")
+            raise Exception("line_num must be an int, a list of int or a "
+                            "range")
 
     def add_column(self, column_descriptor, values):
         """this method allows to add a column to a categorical header"""
@@ -977,6 +1120,8 @@ class CategoricalHeader(Header):
                                  column_descriptors,
                                  new_values))
 
+    @instrumentation.instrumented(
+        'CategoricalHeader.update_categorical_header', 'flag')
     def update_categorical_header(self, flag, ind, values):
         """updates the values of a categorical header"""
         # flag 'all': all the values can change, they are all given
@@ -1026,9 +1171,10 @@ class CategoricalHeader(Header):
                     for i in range(j):
                         new_descriptors[i].check_type(s[i], True)
                     new_values = new_values.append(s, ignore_index=True)
-                return CategoricalHeader(self._label,
-                                         new_descriptors,
-                                         values=new_values)
+                return self._carry_indexes(
+                    CategoricalHeader(self._label, new_descriptors,
+                                      values=new_values),
+                    flag, None, values)
             else:
                 raise Exception("ind must be empty or the list of all the "
                                 "indices that have changed")
@@ -1065,9 +1211,9 @@ class CategoricalHeader(Header):
                                 values[i][cc])):
                         new_descriptors[i].set_dim_type_to_mixed()
                 new_values.iloc[ind[i]] = values[i]
-            return CategoricalHeader(self._label,
-                                     new_descriptors,
-                                     new_values)
+            return self._carry_indexes(
+                CategoricalHeader(self._label, new_descriptors, new_values),
+                flag, ind, values)
         # flag 'remove': suppress some lines
         elif flag == 'remove':
             if not isinstance(ind, list):
@@ -1085,9 +1231,10 @@ class CategoricalHeader(Header):
             new_values = self._values.copy()
             new_values = new_values.drop(new_values.index[ind])
             new_values = new_values.reset_index(drop=True)
-            return CategoricalHeader(self._label,
-                                     self._column_descriptors,
-                                     new_values)
+            return self._carry_indexes(
+                CategoricalHeader(self._label, self._column_descriptors,
+                                  new_values),
+                flag, ind, None)
         # flag 'perm': change the lines order
         elif flag == 'perm':
             if (values is not None) & (values != []):
@@ -1105,9 +1252,10 @@ class CategoricalHeader(Header):
                     raise Exception("all indices must be integers")
                 new_values = new_values.append(self._values.iloc[ind[i]])
                 new_values = new_values.reset_index(drop=True)
-            return CategoricalHeader(self._label,
-                                     self._column_descriptors,
-                                     new_values)
+            return self._carry_indexes(
+                CategoricalHeader(self._label, self._column_descriptors,
+                                  new_values),
+                flag, ind, None)
         # flag 'chg&new': combination of 'chg' and 'new'
         elif flag == 'chg&new':
             if not isinstance(ind, list):
@@ -1228,6 +1376,7 @@ class CategoricalHeader(Header):
         raise Exception("the given flag must be 'all', 'perm', 'chg', 'new'"
                         " 'remove', 'chg&new', or 'chg&rm'")
 
+    @instrumentation.instrumented('CategoricalHeader.merge_lines')
     def merge_lines(self, ind):
         """creating the values (pandas Series) for merged lines"""
         if not isinstance(ind, list):
@@ -1258,13 +1407,206 @@ class CategoricalHeader(Header):
                 merge[j] = Color((red/n, green/n, blue/n))
         return pd.Series(merge)
 
+    def _get_column_number(self, column):
+        """gives the number of a column defined by its label or number"""
+        if isinstance(column, int):
+            if column >= self.n_column or column < 0:
+                raise Exception("column is a str or an int in [0, n_col[")
+            return column
+        elif isinstance(column, str):
+            if self._column_numbers is None:
+                # the first column with this label, as a scan would find it
+                self._column_numbers = {}
+                for j in range(self.n_column - 1, -1, -1):
+                    self._column_numbers[
+                        self._column_descriptors[j].label] = j
+            if column in self._column_numbers:
+                return self._column_numbers[column]
+        raise Exception("column is either the label of a column or it's"
+                        "number (int)")
+
+    def get_index(self, column, kind='hash', wait=True):
+        """gives the index of column ('hash', 'sorted' or 'text'), built the
+        first time it is needed (in the background if wait is False, None
+        being returned until it is built)"""
+        j = self._get_column_number(column)
+        if kind not in ['hash', 'sorted', 'text']:
+            raise Exception("kind must be 'hash', 'sorted' or 'text'")
+        index = self._indexes.get((j, kind))
+        if index is not None:
+            return index
+        if not wait:
+            if (j, kind) not in self._building:
+                future = Future()
+                self._building[(j, kind)] = future
+                threading.Thread(target=self._build_index,
+                                 args=(j, kind, future), daemon=True,
+                                 name="index " + self._label).start()
+            return None
+        future = self._building.get((j, kind))
+        if future is not None:
+            try:
+                return future.result()
+            except Exception:
+                # the next call builds the index again
+                self._building.pop((j, kind), None)
+                raise
+        return self._build_index(j, kind)
+
+    def _build_index(self, j, kind, future=None):
+        """builds the index of the column number j and gives it, future
+        receiving the index or the error of a build in the background"""
+        try:
+            if kind == 'hash':
+                index = column_index.HashIndex(self._values[j])
+            elif kind == 'sorted':
+                index = column_index.SortedIndex(self._values[j])
+            else:
+                index = column_index.TextIndex(self._values[j])
+        except Exception as e:
+            if future is None:
+                raise
+            # raised by get_index to the caller waiting for the index
+            future.set_exception(e)
+            return None
+        # the index is stored before the build is forgotten, so that it is
+        # never built twice
+        self._indexes[(j, kind)] = index
+        if future is not None:
+            self._building.pop((j, kind), None)
+            future.set_result(index)
+        return index
+
+    def find_lines(self, column, value):
+        """gives the lines whose value in column is value"""
+        return self.get_index(column, 'hash').lookup(value)
+
+    def find_range(self, column, low=None, high=None):
+        """gives the lines whose value in column is in [low, high]"""
+        return self.get_index(column, 'sorted').lookup_range(low, high)
+
+    def search_lines(self, column, text, mode='substring'):
+        """gives the lines whose value in column starts with (mode 'prefix')
+        or contains (mode 'substring') text, the case being ignored"""
+        index = self.get_index(column, 'text', wait=False)
+        if index is None:
+            # the index is being built: going through the lines is slower,
+            # but the user does not wait
+            return column_index.scan_text(
+                self._values[self._get_column_number(column)], text, mode)
+        return index.find(text, mode)
+
+    def _carry_indexes(self, new_header, flag, ind, lines):
+        """gives new_header with the indexes of the header updated with the
+        flag 'perm', 'chg', 'new' or 'remove' (lines are the changed or new
+        lines)"""
+        for (j, kind), index in list(self._indexes.items()):
+            new_values = None if lines is None else [s[j] for s in lines]
+            try:
+                new_header._indexes[(j, kind)] = index.updated(
+                    flag, ind, new_values, self.n_elem)
+            except column_index.IndexUpdateError:
+                # e.g. a string in a sorted numeric column: the index will
+                # be built again if it is needed
+                pass
+        return new_header
+
+    def group_lines(self, column):
+        """gives the group number of each line (lines with the same value in
+        column) and the header with the lines of each group merged"""
+        key = self._get_column_number(column)
+        if self.n_elem == 0:
+            raise Exception("there are no lines to group")
+        try:
+            groups, keys = pd.factorize(self._values[key], sort=False)
+        except TypeError:
+            raise Exception("the values of column can't be used to group "
+                            "lines")
+        if (groups < 0).any():
+            raise Exception("column must not contain missing values")
+        n_group = len(keys)
+        # first line of each group, to take the values that are the same for
+        # all the lines of the group
+        first = np.full(n_group, self.n_elem, dtype=np.int64)
+        np.minimum.at(first, groups, np.arange(self.n_elem))
+
+        new_values = pd.DataFrame(index=range(n_group))
+        for j in range(self.n_column):
+            column_values = self._values[j]
+            if j == key:
+                new_values[j] = column_values.values[first]
+            elif self._column_descriptors[j].dimension_type == 'color':
+                new_values[j] = self._merge_colors(column_values, groups,
+                                                   n_group)
+            else:
+                new_values[j] = self._merge_column(column_values, groups,
+                                                   n_group, first)
+        header = CategoricalHeader(self._label,
+                                   [d.copy() for d in
+                                    self._column_descriptors],
+                                   new_values)
+        return groups, header
+
+    @staticmethod
+    def _merge_column(column_values, groups, n_group, first):
+        """for each group, the value of its lines if it is the same for all,
+        else the list of the encountered values with no repetitions"""
+        try:
+            codes, uniques = pd.factorize(column_values, sort=False)
+        except TypeError:
+            codes = None
+        if codes is None or (codes < 0).any():
+            # values that can't be hashed: back to merge_lines behavior
+            merged = [[] for _ in range(n_group)]
+            for i, g in enumerate(groups):
+                if not (column_values[i] in merged[g]):
+                    merged[g].append(column_values[i])
+            return pd.Series([m[0] if len(m) == 1 else m for m in merged],
+                             dtype=object)
+        # distinct (group, value) pairs, sorted by group and, within a
+        # group, in the order in which the values are encountered
+        pairs, first_line = np.unique(
+            groups.astype(np.int64) * len(uniques) + codes, return_index=True)
+        pair_groups = pairs // len(uniques)
+        order = np.lexsort((first_line, pair_groups))
+        pairs = pairs[order]
+        pair_groups = pair_groups[order]
+        n_distinct = np.bincount(pair_groups, minlength=n_group)
+        if (n_distinct == 1).all():
+            return pd.Series(column_values.values[first])
+        pair_values = uniques.take(pairs % len(uniques))
+        starts = np.concatenate(([0], np.cumsum(n_distinct)))
+        merged = []
+        for g in range(n_group):
+            if n_distinct[g] == 1:
+                merged.append(pair_values[starts[g]])
+            else:
+                merged.append(list(pair_values[starts[g]:starts[g + 1]]))
+        return pd.Series(merged, dtype=object)
+
+    @staticmethod
+    def _merge_colors(column_values, groups, n_group):
+        """for each group, the average of the encountered colors"""
+        rgb = np.array([c.rgb for c in column_values], dtype=np.int64)
+        # distinct (group, color) pairs, as in merge_lines
+        pairs = np.unique(np.column_stack((groups, rgb)), axis=0)
+        n_distinct = np.bincount(pairs[:, 0], minlength=n_group)
+        mean = np.column_stack([np.bincount(pairs[:, 0], pairs[:, k + 1],
+                                            minlength=n_group) / n_distinct
+                                for k in range(3)])
+        return pd.Series([Color(m) for m in mean], dtype=object)
+
+    @instrumentation.instrumented('CategoricalHeader.copy')
     def copy(self):
         """creates a copy of a categoricalHeader: note that the list of column
         descriptor elements is a 'simple copy' as its elements themselves
         are only shallow copied"""
-        return CategoricalHeader(self._label,
-                                 self._column_descriptors.copy(),
-                                 self._values.copy())
+        header = CategoricalHeader(self._label,
+                                   self._column_descriptors.copy(),
+                                   self._values.copy())
+        # the indexes are never modified, they can be shared
+        header._indexes = dict(self._indexes)
+        return header
 
 
 class MeasureHeader(Header):
@@ -1363,8 +1705,8 @@ class MeasureHeader(Header):
         python, we have decided that to access the first element of the
         column, line_num must be equal to 0.
     - get_item_name(line_num):
-        line_num can here be an integer or a list of integer. The function
-        returns the corresponding values of the first column.
+        line_num can here be an integer, a list of integer or a range. The
+        function returns the corresponding values of the first column.
 
     *(other methods)*
 
@@ -1376,6 +1718,7 @@ class MeasureHeader(Header):
     """
 
     # noinspection PyMissingConstructor
+    @instrumentation.instrumented('MeasureHeader.__init__')
     def __init__(self,
                  label,
                  start,
@@ -1538,8 +1881,8 @@ class MeasureHeader(Header):
         return self._start + line * self._scale
 
     def get_item_name(self, line_num):
-        """get the value(s) of the line(s) in line_num (it can be an int or a list
-        of int), of the first column"""
+        """get the value(s) of the line(s) in line_num (it can be an int, a list
+        of int or a range), of the first column"""
         if isinstance(line_num, int):
             if line_num >= self._n_elem or line_num < 0:
                 raise Exception("line_num must be in [0, n_elem[")
@@ -1553,7 +1896,11 @@ class MeasureHeader(Header):
                     raise Exception("line_num must be in [0, n_elem[")
                 item_names += [self.get_value(n)]
             return item_names
-        raise Exception("line_num must be an int or a list of int")
+        elif isinstance(line_num, range):
+            _check_line_range(line_num, self._n_elem)
+            return (self._start + np.asarray(line_num, dtype=np.int64)
+                    * self._scale).tolist()
+        raise Exception("line_num must be an int, a list of int or a range")
 
     def update_measure_header(self,
                               start=None,
@@ -1579,6 +1926,7 @@ class MeasureHeader(Header):
                              scale,
                              column_descriptors=self._column_descriptors[0]))
 
+    @instrumentation.instrumented('MeasureHeader.copy')
     def copy(self):
         """creates a copy of a measure header"""
         descriptor = self.column_descriptors[0].copy()
@@ -1589,6 +1937,222 @@ class MeasureHeader(Header):
                              column_descriptors=descriptor)
 
 
+def _line_statistics(data, dim):
+    """gives the min, max, number of NaN and sum of each line of dimension
+    dim of data (NaN are ignored by min, max and sum)"""
+    axes = tuple(k for k in range(data.ndim) if k != dim)
+    n_line = data.shape[dim]
+    if isinstance(data, sparse.SparseArray):
+        # only the observed cells are read, missing cells count as NaN
+        lines = data.coords[dim]
+        values = data.values.astype(float)
+        observed = ~np.isnan(values)
+        n_value = data.size // n_line if n_line else 0
+        low = np.full(n_line, np.nan)
+        high = np.full(n_line, np.nan)
+        np.fmin.at(low, lines, values)
+        np.fmax.at(high, lines, values)
+        return {'min': low,
+                'max': high,
+                'n_nan': n_value - np.bincount(lines[observed],
+                                               minlength=n_line),
+                'sum': np.bincount(lines[observed],
+                                   weights=values[observed],
+                                   minlength=n_line)}
+    if data.size == 0:
+        return {'min': np.full(n_line, np.nan),
+                'max': np.full(n_line, np.nan),
+                'n_nan': np.zeros(n_line, dtype=int),
+                'sum': np.zeros(n_line)}
+    # fmin and fmax ignore NaN, without the warnings of nanmin and nanmax
+    return {'min': np.fmin.reduce(data, axis=axes),
+            'max': np.fmax.reduce(data, axis=axes),
+            'n_nan': np.isnan(data).sum(axis=axes),
+            'sum': np.nansum(data, axis=axes)}
+
+
+class DataStatistics:
+    """ Summary statistics of the data of a Xdata instance.
+
+    The statistics (min, max, number of NaN and sum of the values, NaN being
+    ignored by min, max and sum) are computed for each line of a dimension,
+    the first time they are needed. The global statistics are obtained by
+    combining the statistics of the lines of any dimension that is already
+    computed, which allows to rescale the axis of the data without reading
+    the data again.
+
+    When a Xdata instance is updated with the flags 'chg', 'new' or
+    'remove', the statistics of the new instance are derived from the ones
+    of the old instance: only the lines that are changed or added are read.
+
+    The statistics of quantized data are computed on the stored values, and
+    calibrated when they are given.
+
+    **Parameters**
+
+    - data:
+        N dimensional numpy.ndarray (or SparseArray) of the data
+    - calibration:
+        pair (scale, offset) of the calibration of the data
+
+        (optional)
+
+    **Attributes**
+
+    - n_read:
+        number of values of the data read to compute the statistics
+
+    **Methods**
+
+    - get_statistics(dim=None):
+        gives a dictionary {'min', 'max', 'n_nan', 'sum'} of the statistics
+        of the whole data (dim is None), or of each line of dimension dim
+        (numpy arrays)
+    - get_range:
+        gives the minimum and maximum of the data
+    - updated(new_data, flag, dim, ind):
+        gives the statistics of the data updated by update_xdata with the
+        flag 'chg', 'new' or 'remove' on dimension dim, ind being the list of
+        changed or removed lines
+    """
+
+    def __init__(self, data, calibration=None):
+        """Constructor of the class DataStatistics"""
+        if not isinstance(data, (np.ndarray, sparse.SparseArray)):
+            raise Exception("data must be of type numpy.ndarray or "
+                            "SparseArray")
+        self._data = data
+        self._calibration = calibration
+        # statistics of the lines of each dimension already computed
+        self._lines = {}
+        self._n_read = 0
+
+    @property
+    def n_read(self):
+        """number of values of the data read to compute the statistics"""
+        return self._n_read
+
+    def _get_lines(self, dim):
+        if dim not in self._lines:
+            self._lines[dim] = _line_statistics(self._data, dim)
+            if isinstance(self._data, sparse.SparseArray):
+                self._n_read += self._data.nnz
+            else:
+                self._n_read += self._data.size
+        return self._lines[dim]
+
+    def get_statistics(self, dim=None):
+        """gives the statistics of the whole data or of the lines of dim"""
+        if dim is not None:
+            if not isinstance(dim, int):
+                raise Exception("dim must be None or of type int")
+            elif dim < 0 or dim >= self._data.ndim:
+                raise Exception("dim must correspond to an existing dimension")
+            n_line = self._data.shape[dim]
+            return self._calibrate(
+                {key: value.copy()
+                 for key, value in self._get_lines(dim).items()},
+                self._data.size // n_line if n_line else 0)
+        if self._data.ndim == 0:
+            value = np.asarray(self._data).item()
+            is_nan = bool(np.isnan(value))
+            statistics = {'min': value, 'max': value, 'n_nan': int(is_nan),
+                          'sum': 0 if is_nan else value}
+        else:
+            if len(self._lines) == 0:
+                # the lines of the first dimension are the chunks of the data
+                lines = self._get_lines(0)
+            else:
+                lines = next(iter(self._lines.values()))
+            if len(lines['min']) == 0:
+                statistics = {'min': np.nan, 'max': np.nan, 'n_nan': 0,
+                              'sum': 0}
+            else:
+                statistics = {'min': np.fmin.reduce(lines['min']),
+                              'max': np.fmax.reduce(lines['max']),
+                              'n_nan': int(lines['n_nan'].sum()),
+                              'sum': lines['sum'].sum()}
+        return self._calibrate(statistics, self._data.size)
+
+    def _calibrate(self, statistics, n_value):
+        """gives the statistics of the calibrated values from the ones of the
+        stored values (n_value values for each line)"""
+        if self._calibration is None:
+            return statistics
+        scale, offset = self._calibration
+        low = statistics['min'] * scale + offset
+        high = statistics['max'] * scale + offset
+        if scale < 0:
+            low, high = high, low
+        return {'min': low, 'max': high, 'n_nan': statistics['n_nan'],
+                'sum': (statistics['sum'] * scale +
+                        (n_value - statistics['n_nan']) * offset)}
+
+    def get_range(self):
+        """gives the minimum and maximum of the data"""
+        statistics = self.get_statistics()
+        return statistics['min'], statistics['max']
+
+    def updated(self, new_data, flag, dim, ind):
+        """gives the statistics of new_data, obtained by an update of the
+        data with flag 'chg', 'new' or 'remove' on dimension dim, or with
+        flag 'dim_perm' (dim being the permutation)"""
+        new_statistics = DataStatistics(new_data, self._calibration)
+        if flag == 'dim_perm':
+            # the lines of the dimension dim[i] are the lines of dimension i
+            for i, k in enumerate(dim):
+                if k in self._lines:
+                    new_statistics._lines[i] = self._lines[k]
+            return new_statistics
+        if flag not in ['chg', 'new', 'remove']:
+            raise Exception("flag must be 'chg', 'new', 'remove' or "
+                            "'dim_perm'")
+        for k, lines in self._lines.items():
+            if k == dim:
+                if flag == 'chg':
+                    lines = {key: value.copy()
+                             for key, value in lines.items()}
+                    block = np.take(new_data, ind, axis=dim)
+                    changed = _line_statistics(block, dim)
+                    new_statistics._n_read += block.size
+                    for key in lines:
+                        lines[key][ind] = changed[key]
+                elif flag == 'new':
+                    n_old = len(lines['min'])
+                    block = np.take(new_data,
+                                    range(n_old, new_data.shape[dim]),
+                                    axis=dim)
+                    added = _line_statistics(block, dim)
+                    new_statistics._n_read += block.size
+                    lines = {key: np.concatenate((lines[key], added[key]))
+                             for key in lines}
+                else:
+                    lines = {key: np.delete(value, ind)
+                             for key, value in lines.items()}
+                new_statistics._lines[k] = lines
+            elif flag == 'new':
+                # the lines of the other dimensions are merged with the
+                # statistics of the added part
+                n_old = self._data.shape[dim]
+                block = np.take(new_data, range(n_old, new_data.shape[dim]),
+                                axis=dim)
+                added = _line_statistics(block, k)
+                new_statistics._n_read += block.size
+                new_statistics._lines[k] = {
+                    'min': np.fmin(lines['min'], added['min']),
+                    'max': np.fmax(lines['max'], added['max']),
+                    'n_nan': lines['n_nan'] + added['n_nan'],
+                    'sum': lines['sum'] + added['sum']}
+            # the minimum and maximum of the lines of the other dimensions
+            # can not be known without reading them again after 'chg' and
+            # 'remove': they will be computed when needed
+        return new_statistics
+
+
+# version numbers of the Xdata instances (unlike id, they are never reused)
+_xdata_versions = itertools.count()
+
+
 class Xdata:
     """This class allows the creation of a ND dataset, with headers for each
     dimension and a name.
@@ -1608,22 +2172,47 @@ class Xdata:
     - name:
         name of the dataset (type str)
     - data:
-        N dimensional numpy array with the data itself
+        N dimensional numpy array with the data itself (or SparseArray, of
+        module sparse, if most cells are missing: slices and reductions
+        ignore the missing cells, and values gives the dense array)
     - headers:
         list of the headers describing each of the N dimensions
     - unit:
         simple unit or list of conversion
+    - calibration:
+        pair (scale, offset) if data is stored quantized (e.g. the int16
+        values given by an instrument), the values being scale * data +
+        offset: data is kept as it is, without conversion
+
+        (optional)
 
     **Attributes**
 
     - data:
-        N dimensional numpy.ndarray with the data itself
+        N dimensional numpy.ndarray with the data itself (the stored values,
+        before calibration)
+    - values:
+        N dimensional numpy.ndarray of the calibrated values (it is data
+        itself if there is no calibration and data is not sparse)
+    - is_sparse:
+        True if data is a SparseArray
+    - is_contiguous:
+        True if data is a C-contiguous numpy array (views, e.g. after
+        'dim_perm', are not)
     - headers:
         list of the headers describing each of the N dimensions
     - name:
         name of the dataset (type str)
     - data_descriptor:
         DimensionDescription instance describing the dataset
+    - version:
+        number identifying this instance: each new Xdata instance (e.g. the
+        ones returned by update_xdata) has a different version, so it can be
+        used as a key for the results computed from the data
+    - statistics:
+        DataStatistics instance giving the min, max, number of NaN and sum
+        of the data (e.g. to scale the data axis), computed when first
+        needed and updated from the changes made by update_xdata
 
     **Methods**
 
@@ -1635,6 +2224,14 @@ class Xdata:
         for each dimension)
     - copy:
         creates a copy of a Xdata instance
+    - contiguous_data:
+        gives data as a C-contiguous numpy array, for the consumers that
+        need it (upload to the GPU, export to a file...): the data is copied
+        once, the first time, if it is a view or sparse
+    - memory_usage:
+        gives the bytes of the data, headers and caches of the instance that
+        it owns or shares with the other live instances (MemoryUsage of
+        module memory)
     - update_data(new_data):
         Simply changing some values in data by giving a whole new numpy array.
         Those changes can change the length of measure headers or categorical
@@ -1697,7 +2294,11 @@ class Xdata:
 
         - new_data:
             full numpy.array with the whole data (except for flag
-            'dim_perm')
+            'dim_perm', and for flag 'dim_rm' for which the removed
+            dimensions are averaged if new_data is None)
+
+            (with flag 'dim_perm' and no new_data, the new instance shares
+            the headers and the buffer of the data, with permuted strides)
 
         - new_headers:
             list of the new headers
@@ -1707,20 +2308,38 @@ class Xdata:
         therefore the data) new headers do not represent the same thing as
         before. This method also allows to change the number of dimensions.
         It returns a new Xdata instance. TODO : change the returns part
+
+    - group_by(dim, column, method='mean'):
+        merges the lines of the categorical dimension dim that have the same
+        value in column (e.g. all the trials of a condition), the data of
+        each group being reduced with method ('mean', 'sum', 'min' or
+        'max'). The header lines are merged as with merge_lines. It returns
+        a new Xdata instance.
+
+    - transform(fun, dim):
+        applies the function fun to each line of dimension dim (e.g. each
+        trace of a recording), in a pool of processes sharing the memory of
+        the data (fun must be defined at the top level of a module). It
+        returns a new Xdata instance.
     """
+    @instrumentation.instrumented('Xdata.__init__')
     def __init__(self,
                  name,
                  data,
                  headers,
-                 unit):
+                 unit,
+                 calibration=None):
         """Constructor of the class Xdata"""
+        self._version = next(_xdata_versions)
         # name must be a string
         if not isinstance(name, str):
             raise Exception("name must be of type str")
         self._name = name
-        # data must be a numpy array and headers a list with the same length
-        if not isinstance(data, np.ndarray):
-            raise Exception("data must be of type numpy.ndarray")
+        # data must be a numpy array (or a sparse array) and headers a list
+        # with the same length
+        if not isinstance(data, (np.ndarray, sparse.SparseArray)):
+            raise Exception("data must be of type numpy.ndarray or "
+                            "SparseArray")
         elif not isinstance(headers, list):
             raise Exception("headers must be of type list")
         elif len(headers) != len(data.shape):
@@ -1735,9 +2354,17 @@ class Xdata:
         self._headers = headers
         # unit must allow creation of a DimensionDescription instance
         if isinstance(unit, str) or isinstance(unit, list) or (unit is None):
-            self._data_descriptor = DimensionDescription(name, 'numeric', unit)
+            self._data_descriptor = DimensionDescription(name, 'numeric', unit,
+                                                         calibration)
         else:
             raise Exception("unit must a string or a list of conversion")
+        if not (calibration is None or np.issubdtype(data.dtype, np.number)):
+            raise Exception("only numerical data can have a calibration")
+        # the statistics are only computed when they are needed
+        self._statistics = None
+        # contiguous copy of a view of the data, made when it is needed
+        self._contiguous = None
+        memory.get_tracker().register(self)
 
     @property
     def name(self):
@@ -1755,11 +2382,60 @@ class Xdata:
         """ND numpy.array of numerical data"""
         return self._data
 
+    @property
+    def values(self):
+        """ND numpy.array of the calibrated values"""
+        if isinstance(self._data, sparse.SparseArray):
+            return self._data_descriptor.calibrate(self._data.todense())
+        return self._data_descriptor.calibrate(self._data)
+
+    @property
+    def is_sparse(self):
+        """True if the data is stored as a SparseArray"""
+        return isinstance(self._data, sparse.SparseArray)
+
+    @property
+    def is_contiguous(self):
+        """True if data is a C-contiguous numpy array"""
+        return isinstance(self._data, np.ndarray) and \
+            self._data.flags.c_contiguous
+
+    def contiguous_data(self):
+        """gives data as a C-contiguous numpy array, copied the first time
+        it is needed if data is a view (e.g. after 'dim_perm') or sparse"""
+        if self.is_contiguous:
+            return self._data
+        if self._contiguous is None:
+            if self.is_sparse:
+                self._contiguous = self._data.todense()
+            else:
+                self._contiguous = np.ascontiguousarray(self._data)
+        return self._contiguous
+
     @property
     def data_descriptor(self):
         """DimensionDescription instance to describe the content of data"""
         return self._data_descriptor
 
+    @property
+    def version(self):
+        """number identifying this instance of Xdata"""
+        return self._version
+
+    @property
+    def statistics(self):
+        """DataStatistics instance summarizing the data"""
+        if self._statistics is None:
+            self._statistics = DataStatistics(
+                self._data, self._data_descriptor.calibration)
+        return self._statistics
+
+    def _derive_statistics(self, new_xdata, flag, dim, ind):
+        """gives new_xdata the statistics derived from the ones of self"""
+        if self._statistics is not None:
+            new_xdata._statistics = self._statistics.updated(
+                new_xdata._data, flag, dim, ind)
+
     def get_n_dimensions(self):
         """gives the number of dimensions of the data"""
         return len(self.headers)
@@ -1768,6 +2444,7 @@ class Xdata:
         """gives the number of element in each dimension"""
         return self.data.shape
 
+    @instrumentation.instrumented('Xdata.copy')
     def copy(self):
         """gives a copy of a Xdata instance"""
         data = self.data.copy()
@@ -1781,8 +2458,14 @@ class Xdata:
             for i in self.data_descriptor.all_units:
                 unit.append(i['unit'])
                 unit.append(i['value'])
-        return Xdata(self.name, data, headers, unit)
+        return Xdata(self.name, data, headers, unit,
+                     self.data_descriptor.calibration)
 
+    def memory_usage(self):
+        """gives the bytes owned and shared with the other live instances"""
+        return memory.get_memory_usage(self)
+
+    @instrumentation.instrumented('Xdata.update_data')
     def update_data(self, new_data):
         """Creating a new Xdata instance, with updated data and the same
         headers as before (except for the length of some measure headers and
@@ -1824,6 +2507,7 @@ class Xdata:
         return new_xdata
         # TODO : notify instead of returns
 
+    @instrumentation.instrumented('Xdata.update_xdata', 'flag')
     def update_xdata(self, flag, dim, ind, data_slices, modified_header):
         """creates a new Xdata instance with the same attributes as the
         previous one, except for lines changed both in the data and the
@@ -1832,6 +2516,9 @@ class Xdata:
             raise Exception("dim is of type int")
         elif (dim < 0) or (dim >= self.get_n_dimensions()):
             raise Exception("dim must correspond to an existing dimension")
+        if self.is_sparse:
+            raise Exception("update_xdata does not modify sparse data, "
+                            "use update_data or modify_dimensions")
         nd = self.get_n_dimensions()
         old_header = self.headers[dim]
         # for flag 'all': the whole content of the header has been modified
@@ -1969,6 +2656,7 @@ class Xdata:
                 new_xdata._data[tuple(change_slice)] = data_slices[i]
             # ...and replace the header
             new_xdata._headers[dim] = modified_header
+            self._derive_statistics(new_xdata, flag, dim, ind)
             return new_xdata, flag
 
         elif flag == 'new':
@@ -2039,6 +2727,7 @@ class Xdata:
                 new_data[dim] = self._headers[dim].n_elem + i
                 slice_of_data = np.array([data_slices[i]])
                 new_xdata._data[tuple(new_data)] = slice_of_data
+            self._derive_statistics(new_xdata, flag, dim, ind)
             return new_xdata, flag
 
         elif flag == 'remove':
@@ -2084,6 +2773,7 @@ class Xdata:
             # Now lets replace the header
             new_xdata._headers[dim] = modified_header
             new_xdata._data = np.delete(new_xdata._data, ind, dim)
+            self._derive_statistics(new_xdata, flag, dim, ind)
             return new_xdata, flag
 
         elif flag == 'chg&new':
@@ -2340,6 +3030,7 @@ class Xdata:
                         "'chg&new' or 'chg&rm'")
         # TODO : notify instead of returns
 
+    @instrumentation.instrumented('Xdata.modify_dimensions', 'flag')
     def modify_dimensions(self, flag, dim, new_data, new_headers):
         """creates a new Xdata instance with changes for the dimensions"""
         if flag == 'global':
@@ -2355,7 +3046,8 @@ class Xdata:
                 for i in self.data_descriptor.all_units:
                     unit.append(i['unit'])
                     unit.append(i['value'])
-            new_xdata = Xdata(self.name, new_data, new_headers, unit)
+            new_xdata = Xdata(self.name, new_data, new_headers, unit,
+                              self.data_descriptor.calibration)
             return new_xdata, flag
 
         elif flag == 'dim_chg':
@@ -2373,7 +3065,8 @@ class Xdata:
                     for i in self.data_descriptor.all_units:
                         unit.append(i['unit'])
                         unit.append(i['value'])
-                new_xdata = Xdata(self.name, new_data, headers, unit)
+                new_xdata = Xdata(self.name, new_data, headers, unit,
+                                  self.data_descriptor.calibration)
                 return new_xdata, flag
             except:
                 raise Exception("incorrect arguments")
@@ -2396,7 +3089,8 @@ class Xdata:
                     for i in self.data_descriptor.all_units:
                         unit.append(i['unit'])
                         unit.append(i['value'])
-                new_xdata = Xdata(self.name, new_data, headers, unit)
+                new_xdata = Xdata(self.name, new_data, headers, unit,
+                                  self.data_descriptor.calibration)
                 return new_xdata, flag
             except:
                 raise Exception("incorrect arguments")
@@ -2404,6 +3098,19 @@ class Xdata:
             if not (new_headers is None or new_headers == []):
                 raise Exception("when removing dimensions, no new dimension "
                                 "must be given")
+            # if the new data is not given, the removed dimensions are
+            # averaged (in a pool of threads, see module parallel)
+            if new_data is None:
+                try:
+                    if self.is_sparse:
+                        # the missing cells are ignored
+                        new_data = self.data.reduce(tuple(dim), 'mean')
+                    else:
+                        new_data = parallel.reduce(self.data, tuple(dim),
+                                                   'mean')
+                except:
+                    raise Exception("dim must be the list of the dimensions "
+                                    "to remove")
             try:
                 headers = []
                 if len(dim) != self.get_n_dimensions() - len(new_data.shape):
@@ -2419,7 +3126,8 @@ class Xdata:
                     for i in self.data_descriptor.all_units:
                         unit.append(i['unit'])
                         unit.append(i['value'])
-                new_xdata = Xdata(self.name, new_data, headers, unit)
+                new_xdata = Xdata(self.name, new_data, headers, unit,
+                                  self.data_descriptor.calibration)
                 return new_xdata, flag
             except:
                 raise Exception("incorrect arguments")
@@ -2431,13 +3139,18 @@ class Xdata:
                 if i not in dim:
                     raise Exception("dim is not a permutation of the "
                                     "dimensions")
-            # now lets build the headers and the data if they are not given
+            # now lets build the headers and the data if they are not given:
+            # the headers are never modified, they are shared, and the data
+            # is a view of the same buffer with permuted strides (the
+            # consumers needing contiguous data use contiguous_data)
             if new_headers is None:
-                new_headers = []
-                for d in dim:
-                    new_headers.append(self.headers[d].copy())
-            if new_data is None:
-                new_data = np.transpose(self.data, dim)
+                new_headers = [self.headers[d] for d in dim]
+            permuted = new_data is None
+            if permuted:
+                if self.is_sparse:
+                    new_data = self.data.transpose(dim)
+                else:
+                    new_data = np.transpose(self.data, dim)
             # if new_headers or new_data is given, it's not checked in order to
             # save some computation time
             if self.data_descriptor.all_units is None:
@@ -2448,30 +3161,139 @@ class Xdata:
                     unit.append(i['unit'])
                     unit.append(i['value'])
             try:
-                new_xdata = Xdata(self.name, new_data, new_headers, unit)
-                return new_xdata, flag
+                new_xdata = Xdata(self.name, new_data, new_headers, unit,
+                                  self.data_descriptor.calibration)
             except:
                 raise Exception("arguments are not valid")
+            if permuted:
+                self._derive_statistics(new_xdata, flag, list(dim), None)
+            return new_xdata, flag
         # all accepted flags with this method are already taken care of
         # flag argument is either not a flag or not one accepted by this method
         raise Exception("flag must be 'global', 'dim_chg', 'dim_insert', "
                         "'dim_rm', or 'dim_perm'")
         # TODO : notify instead of returns
 
+    @instrumentation.instrumented('Xdata.group_by', 'method')
+    def group_by(self, dim, column, method='mean'):
+        """creates a new Xdata instance in which the lines of dimension dim
+        having the same value in column are merged"""
+        if not isinstance(dim, int):
+            raise Exception("dim is of type int")
+        elif (dim < 0) or (dim >= self.get_n_dimensions()):
+            raise Exception("dim must correspond to an existing dimension")
+        elif not self._headers[dim].is_categorical_with_values:
+            raise Exception("only the lines of categorical headers with "
+                            "values can be grouped")
+        elif method not in ['mean', 'sum', 'min', 'max']:
+            raise Exception("method must be 'mean', 'sum', 'min' or 'max'")
+        groups, new_header = self._headers[dim].group_lines(column)
+        n_group = new_header.n_elem
+
+        # quantized data is reduced without being calibrated, except for the
+        # sum in which the offset would be counted once for each line
+        calibration = self.data_descriptor.calibration
+        data = self._data
+        if calibration is not None:
+            if method == 'sum':
+                if self.is_sparse:
+                    data = data.with_values(
+                        self.data_descriptor.calibrate(data.values))
+                else:
+                    data = self.values
+                calibration = None
+            elif calibration[0] < 0:
+                # a negative scale exchanges the minimum and the maximum
+                method = {'min': 'max', 'max': 'min'}.get(method, method)
+
+        if self.is_sparse:
+            # the missing cells are ignored
+            new_data = data.group(dim, groups, n_group, method)
+        else:
+            new_data = Xdata._reduce_groups(data, dim, groups, n_group,
+                                            method)
+
+        headers = self._headers.copy()
+        headers[dim] = new_header
+        if self.data_descriptor.all_units is None:
+            unit = None
+        else:
+            unit = []
+            for i in self.data_descriptor.all_units:
+                unit.append(i['unit'])
+                unit.append(i['value'])
+        return Xdata(self.name, new_data, headers, unit, calibration)
+
+    @staticmethod
+    def _reduce_groups(data, dim, groups, n_group, method):
+        """reduces together the lines of dimension dim of the numpy array
+        data that belong to the same group"""
+        # sort the lines by group so that each group is a contiguous block,
+        # which is reduced at once by the ufunc
+        if (np.diff(groups) >= 0).all():
+            sorted_groups = groups
+        else:
+            order = np.argsort(groups, kind='stable')
+            sorted_groups = groups[order]
+            data = np.take(data, order, axis=dim)
+        starts = np.flatnonzero(np.concatenate(
+            ([True], sorted_groups[1:] != sorted_groups[:-1])))
+        if method in ['mean', 'sum']:
+            dtype = None
+            if method == 'mean' and np.issubdtype(data.dtype, np.integer):
+                # integers (e.g. int16) would overflow
+                dtype = np.float64
+            new_data = np.add.reduceat(data, starts, axis=dim, dtype=dtype)
+            if method == 'mean':
+                shape = [1] * data.ndim
+                shape[dim] = n_group
+                counts = np.bincount(groups, minlength=n_group)
+                new_data = new_data / counts.reshape(shape)
+        elif method == 'min':
+            new_data = np.minimum.reduceat(data, starts, axis=dim)
+        else:
+            new_data = np.maximum.reduceat(data, starts, axis=dim)
+        return new_data
+
+    def transform(self, fun, dim):
+        """creates a new Xdata instance in which each line of dimension dim
+        has been transformed by fun"""
+        if not isinstance(dim, int):
+            raise Exception("dim is of type int")
+        elif (dim < 0) or (dim >= self.get_n_dimensions()):
+            raise Exception("dim must correspond to an existing dimension")
+        # fun is applied on the calibrated values
+        new_data = parallel.transform(self.values, fun, dim)
+        headers = [h.copy() for h in self._headers]
+        if self.data_descriptor.all_units is None:
+            unit = None
+        else:
+            unit = []
+            for i in self.data_descriptor.all_units:
+                unit.append(i['unit'])
+                unit.append(i['value'])
+        return Xdata(self.name, new_data, headers, unit)
+
 
 def check_bank_unit(unit):
     """The functions checks if this unit is in one of the conversion tables of
     the bank. If so, it returns the conversion table, else, it returns None
 
+    The tables are stored in the bank module, indexed by unit symbol, and
+    they are only loaded the first time a unit is checked.
+
     **Parameters**
 
-    - unit: type str, name of the unit
+    - unit: type str, name of the unit (a list of units and conversion
+      coefficients is already a conversion table: None is returned)
 
     **returns**
-    a conversion table for the given unit if it exists in the bank
+    a conversion table for the given unit if it exists in the bank, the value
+    of the given unit being 1
     """
-    # TODO
-    return []
+    if isinstance(unit, list):
+        return None
+    return bank.get_unit_bank().get_table(unit)
 
 
 def disp(obj):